@@ -1,25 +1,34 @@
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from passlib.hash import argon2
 from fastapi import HTTPException, status
 
 from .config import settings
+from ..services.tokens import revocations
 
 
-# Password hashing context using Argon2
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Password hashing context using Argon2, built on the first auth call
+_pwd_context = None
+
+
+def get_password_context():
+    """Create the passlib context on first use; only auth routes need it"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+    return _pwd_context
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_password_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password using Argon2"""
-    return pwd_context.hash(password)
+    return get_password_context().hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -31,27 +40,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(seconds=settings.JWT_EXPIRES_IN)
     
-    to_encode.update({"exp": expire})
+    # Fractional so a token issued just after a revocation is never mistaken for an earlier one
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm="HS256")
     return encoded_jwt
 
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify a JWT token and return the email if valid"""
+def decode_access_token(token: str) -> Optional[dict]:
+    """
+    Return the claims of a valid, unrevoked access token. Revocations are
+    checked against the in-process index, so this never queries MongoDB.
+    """
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("sub") is None or revocations.is_revoked(payload):
+        return None
+    return payload
+
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify a JWT token and return the email if valid"""
+    payload = decode_access_token(token)
+    return payload["sub"] if payload is not None else None
 
 
-def create_token_response(email: str) -> dict:
-    """Create a token response for successful authentication"""
-    access_token = create_access_token(data={"sub": email})
+def create_token_response(email: str, session_id: str, refresh_token: Optional[str] = None) -> dict:
+    """Create a token response for successful authentication or refresh"""
+    access_token = create_access_token(data={"sub": email, "sid": session_id})
     return {
         "access_token": access_token,
-        "token_type": "bearer"
-    }
\ No newline at end of file
+        "token_type": "bearer",
+        "expires_in": settings.JWT_EXPIRES_IN,
+        "refresh_token": refresh_token
+    }
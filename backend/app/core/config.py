@@ -10,17 +10,95 @@ class Settings:
     APP_ENV: str = os.getenv("APP_ENV", "development")
     PORT: int = int(os.getenv("PORT", "8000"))
     
+    # Logging
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records beyond this are dropped
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")  # e.g. "uvicorn.access=0.1"
+
     # Database
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "mongo")  # mongo or memory (single node, no Atlas)
+    STORAGE_SNAPSHOT_PATH: str = os.getenv("STORAGE_SNAPSHOT_PATH", "")  # memory backend persistence file
+    STORAGE_SNAPSHOT_INTERVAL_SECONDS: float = float(os.getenv("STORAGE_SNAPSHOT_INTERVAL_SECONDS", "60"))
     MONGODB_URI: str = os.getenv("MONGODB_URI", "")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    MONGODB_TLS: bool = os.getenv("MONGODB_TLS", "true").lower() == "true"  # false for a local mongod
+    MONGODB_CONNECT_BACKOFF_INITIAL_SECONDS: float = float(os.getenv("MONGODB_CONNECT_BACKOFF_INITIAL_SECONDS", "0.5"))
+    MONGODB_CONNECT_BACKOFF_MAX_SECONDS: float = float(os.getenv("MONGODB_CONNECT_BACKOFF_MAX_SECONDS", "30"))
+    MONGODB_HEALTH_CHECK_SECONDS: float = float(os.getenv("MONGODB_HEALTH_CHECK_SECONDS", "10"))
+    MONGODB_READ_ROUTING: str = os.getenv("MONGODB_READ_ROUTING", "")  # e.g. "list=secondaryPreferred,search=secondaryPreferred"
+    MONGODB_MAX_STALENESS_SECONDS: int = int(os.getenv("MONGODB_MAX_STALENESS_SECONDS", "90"))  # 90 is the minimum
     
     # JWT settings
     JWT_SECRET: str = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
-    JWT_EXPIRES_IN: int = int(os.getenv("JWT_EXPIRES_IN", "86400"))  # 24 hours
+    JWT_EXPIRES_IN: int = int(os.getenv("JWT_EXPIRES_IN", "900"))  # 15 minutes; clients refresh
+    REFRESH_TOKEN_EXPIRES_IN: int = int(os.getenv("REFRESH_TOKEN_EXPIRES_IN", "2592000"))  # 30 days since the last refresh
+    TOKEN_REVOCATION_SYNC_SECONDS: float = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5"))
     
     # Stripe Settings
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "")
     STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    STRIPE_API_BASE: str = os.getenv("STRIPE_API_BASE", "")  # e.g. a local stripe-mock
+    STRIPE_RECONCILE_REQUESTS_PER_SECOND: float = float(os.getenv("STRIPE_RECONCILE_REQUESTS_PER_SECOND", "20"))
+    SUBSCRIPTION_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("SUBSCRIPTION_RECONCILE_INTERVAL_SECONDS", "86400"))
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
+    CATALOG_REFRESH_SECONDS: int = int(os.getenv("CATALOG_REFRESH_SECONDS", "300"))
+
+    # Autosave settings
+    AUTOSAVE_DEBOUNCE_SECONDS: float = float(os.getenv("AUTOSAVE_DEBOUNCE_SECONDS", "2.0"))
+    AUTOSAVE_MAX_DELAY_SECONDS: float = float(os.getenv("AUTOSAVE_MAX_DELAY_SECONDS", "10.0"))
+    AUTOSAVE_MAX_PENDING_BYTES: int = int(os.getenv("AUTOSAVE_MAX_PENDING_BYTES", "1048576"))  # 1 MB
+
+    # Revision history settings
+    REVISIONS_SNAPSHOT_INTERVAL: int = int(os.getenv("REVISIONS_SNAPSHOT_INTERVAL", "20"))
+    REVISIONS_MAX_PER_NOTE: int = int(os.getenv("REVISIONS_MAX_PER_NOTE", "200"))
+    REVISIONS_MAX_AGE_DAYS: int = int(os.getenv("REVISIONS_MAX_AGE_DAYS", "90"))
+    
+    # Attachment settings
+    ATTACHMENT_MAX_BYTES: int = int(os.getenv("ATTACHMENT_MAX_BYTES", "26214400"))  # 25 MB per file
+    ATTACHMENT_CHUNK_SIZE_BYTES: int = int(os.getenv("ATTACHMENT_CHUNK_SIZE_BYTES", "261120"))  # GridFS default, 255 KB
+    
+    # Plan quotas (0 means unlimited)
+    QUOTA_FREE_MAX_NOTES: int = int(os.getenv("QUOTA_FREE_MAX_NOTES", "100"))
+    QUOTA_FREE_MAX_BYTES: int = int(os.getenv("QUOTA_FREE_MAX_BYTES", "10485760"))  # 10 MB
+    QUOTA_PRO_MAX_NOTES: int = int(os.getenv("QUOTA_PRO_MAX_NOTES", "5000"))
+    QUOTA_PRO_MAX_BYTES: int = int(os.getenv("QUOTA_PRO_MAX_BYTES", "524288000"))  # 500 MB
+    QUOTA_PRO_PLUS_MAX_NOTES: int = int(os.getenv("QUOTA_PRO_PLUS_MAX_NOTES", "0"))
+    QUOTA_PRO_PLUS_MAX_BYTES: int = int(os.getenv("QUOTA_PRO_PLUS_MAX_BYTES", "0"))
+    STATS_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "21600"))  # 6 hours
+    
+    # Background jobs
+    JOB_BATCH_SIZE: int = int(os.getenv("JOB_BATCH_SIZE", "500"))
+    JOB_MAX_DOCS_PER_SECOND: float = float(os.getenv("JOB_MAX_DOCS_PER_SECOND", "2000"))  # 0 disables the throttle
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "5"))  # 0 disables the runner
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # a crashed instance's job resumes after this
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_CONCURRENCY: int = int(os.getenv("JOB_CONCURRENCY", "3"))  # jobs each instance runs at once
+    ADMIN_EMAILS: List[str] = [email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()]
+    
+    # Hot/cold note tiering
+    TIERING_ARCHIVE_AFTER_DAYS: int = int(os.getenv("TIERING_ARCHIVE_AFTER_DAYS", "365"))  # 0 disables
+    TIERING_INTERVAL_SECONDS: int = int(os.getenv("TIERING_INTERVAL_SECONDS", "86400"))
+    TIERING_ARCHIVE_COMPRESSOR: str = os.getenv("TIERING_ARCHIVE_COMPRESSOR", "zstd")  # only applies when the archive is created
+    
+    # Request deadlines
+    REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "10"))  # 0 disables
+    REQUEST_TIMEOUT_MAX_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_MAX_SECONDS", "30"))
+    STRIPE_TIMEOUT_SECONDS: float = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "10"))
+    
+    # Rate limiting (requests per minute per user or client IP; 0 disables a group)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory or mongo
+    RATE_LIMIT_AUTH_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", "10"))
+    RATE_LIMIT_ACCOUNT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_ACCOUNT_PER_MINUTE", "120"))
+    RATE_LIMIT_NOTES_READ_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_NOTES_READ_PER_MINUTE", "300"))
+    RATE_LIMIT_NOTES_WRITE_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_NOTES_WRITE_PER_MINUTE", "120"))
+    RATE_LIMIT_BILLING_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_BILLING_PER_MINUTE", "20"))
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+    
+    # Admission control
+    MAX_CONCURRENT_REQUESTS: int = int(os.getenv("MAX_CONCURRENT_REQUESTS", "200"))  # 0 disables
+    MAX_EVENT_LOOP_LAG_MS: float = float(os.getenv("MAX_EVENT_LOOP_LAG_MS", "500"))  # 0 disables
+    MAX_DB_POOL_UTILIZATION: float = float(os.getenv("MAX_DB_POOL_UTILIZATION", "0.95"))  # 0 disables
     
     # CORS settings
     @property
@@ -0,0 +1,63 @@
+import asyncio
+import contextvars
+import time
+from typing import Optional
+
+from .config import settings
+
+# Monotonic time by which the current request must finish, if any
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+# Counters surfaced by the health check
+deadline_stats = {"exceeded": 0, "client_disconnects": 0}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an outbound call cannot finish before the request deadline"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None without one"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+async def run_stripe(fn, *args, **kwargs):
+    """
+    Run a blocking Stripe call in a worker thread, bounded by the request
+    deadline. The thread itself is bounded by STRIPE_TIMEOUT_SECONDS.
+    """
+    timeout = remaining()
+    if timeout is not None and timeout <= 0:
+        deadline_stats["exceeded"] += 1
+        raise DeadlineExceeded("Request deadline exceeded before calling Stripe")
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), timeout)
+    except asyncio.TimeoutError:
+        deadline_stats["exceeded"] += 1
+        raise DeadlineExceeded("Stripe call exceeded the request deadline")
+
+
+def detached_task(coro) -> asyncio.Task:
+    """
+    Start a task that outlives the current request and is not bound by its
+    deadline, e.g. work shared by several requests or run after the response
+    """
+    return asyncio.create_task(coro, context=contextvars.Context())
+
+
+def request_timeout(header_value: Optional[str]) -> float:
+    """Timeout for a request: the client's X-Request-Timeout if valid, capped by config"""
+    timeout = settings.REQUEST_TIMEOUT_SECONDS
+    if header_value:
+        try:
+            requested = float(header_value)
+        except ValueError:
+            requested = 0
+        if requested > 0:
+            timeout = requested
+    return min(timeout, settings.REQUEST_TIMEOUT_MAX_SECONDS)
@@ -4,8 +4,11 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from bson import ObjectId
 
 from .auth import verify_token
-from ..database.connection import get_database
-from ..models.user import UserInDB
+from .config import settings
+from ..database.connection import get_users_repository
+from ..database.routing import user_last_write
+from ..repositories.base import StorageError
+from ..models.user import UserInDB, UserStats
 
 
 # HTTP Bearer token scheme
@@ -16,7 +19,12 @@ async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> UserInDB:
     """
-    Dependency to get the current authenticated user from JWT token
+    Dependency to get the current authenticated user from JWT token.
+    Verifying the token, including the revocation check, makes no database
+    call, so invalid and revoked tokens are rejected without one. Valid
+    tokens still load the user: quota checks and plan entitlements need
+    the current counters and subscription fields, which change far more
+    often than an access token is reissued.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,21 +32,27 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Verify the token
+    # Verify the token against the in-process revocation index
     email = verify_token(credentials.credentials)
     if email is None:
         raise credentials_exception
     
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get user storage
+    users = await get_users_repository()
+    if users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
-    # Find user in database
-    user_doc = await db.users.find_one({"email": email})
+    # The one database call: the live user document, read through the unique email index
+    try:
+        user_doc = await users.get_by_email(email)
+    except StorageError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
     if user_doc is None:
         raise credentials_exception
     
@@ -48,11 +62,30 @@ async def get_current_user(
         email=user_doc["email"],
         password_hash=user_doc["password_hash"],
         created_at=user_doc["created_at"],
-        updated_at=user_doc["updated_at"]
+        updated_at=user_doc["updated_at"],
+        stripe_customer_id=user_doc.get("stripe_customer_id"),
+        stripe_subscription_id=user_doc.get("stripe_subscription_id"),
+        stripe_price_id=user_doc.get("stripe_price_id"),
+        stripe_subscription_status=user_doc.get("stripe_subscription_status"),
+        stats=UserStats(**user_doc.get("stats", {}))
     )
+    # Lets reads routed to secondaries fall back to the primary after a recent write
+    user_last_write.set(user.stats.last_activity)
     return user
 
 
+async def get_admin_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
+    """
+    Dependency restricting an endpoint to the users listed in ADMIN_EMAILS
+    """
+    if current_user.email.lower() not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
+
+
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
 ) -> Optional[UserInDB]:
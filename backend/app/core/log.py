@@ -0,0 +1,146 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import traceback
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from .config import settings
+
+# Correlates every log line written while handling a request
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Counters surfaced by the health check
+log_stats = {"dropped": 0, "sampled_out": 0}
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id"}
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse "uvicorn.access=0.1,app.services=0.5" into {logger prefix: keep ratio}"""
+    rates = {}
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a configured fraction of records from high-volume loggers. The most
+    specific logger prefix wins; warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest prefix first so "app.services.autosave" beats "app"
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                if random.random() < rate:
+                    return True
+                log_stats["sampled_out"] += 1
+                return False
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without formatting them. The message
+    is only rendered there, so handlers pay nothing for %-style arguments and
+    a full queue drops records instead of blocking the event loop.
+    """
+
+    def prepare(self, record):
+        # Captured here because the writer thread has no request context
+        record.request_id = request_id.get()
+        if record.exc_info and not record.exc_text:
+            # Tracebacks reference live frames; render them before they change
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the request id and any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueWriter(logging.handlers.QueueListener):
+    """Writer thread; on shutdown it waits for room to queue its stop marker"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[QueueWriter] = None
+
+
+def configure_logging():
+    """
+    Route the root logger and uvicorn's loggers through a bounded queue to a
+    background thread that writes JSON lines to stdout. Safe to call again,
+    e.g. from a later lifespan, to restart a stopped writer.
+    """
+    global _listener
+    if _listener is None:
+        records = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+        _listener = QueueWriter(records, stream_handler)
+
+        queue_handler = NonBlockingQueueHandler(records)
+        sample_rates = parse_sample_rates(settings.LOG_SAMPLE_RATES)
+        if sample_rates:
+            queue_handler.addFilter(SamplingFilter(sample_rates))
+
+        root = logging.getLogger()
+        root.handlers = [queue_handler]
+        root.setLevel(settings.LOG_LEVEL.upper())
+        # uvicorn installs its own synchronous handlers; send its records through ours
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers = []
+            uvicorn_logger.propagate = True
+        atexit.register(shutdown_logging)
+
+    if _listener._thread is None:
+        _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
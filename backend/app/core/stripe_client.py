@@ -0,0 +1,22 @@
+from .config import settings
+
+_stripe = None
+
+
+def get_stripe():
+    """
+    Import and configure the Stripe SDK on first use. Importing it costs a
+    few hundred milliseconds, which would otherwise be paid on every cold
+    start whether or not the instance ever serves a billing request.
+    """
+    global _stripe
+    if _stripe is None:
+        import stripe
+
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        if settings.STRIPE_API_BASE:
+            stripe.api_base = settings.STRIPE_API_BASE
+        # Bounds worker threads; requests are additionally bounded by their deadline
+        stripe.default_http_client = stripe.http_client.new_default_http_client(timeout=settings.STRIPE_TIMEOUT_SECONDS)
+        _stripe = stripe
+    return _stripe
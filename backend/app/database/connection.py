@@ -1,53 +1,252 @@
+import asyncio
+import logging
 import os
-import certifi
+import random
+import threading
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo import monitoring
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from ..core.config import settings
+from ..repositories.base import NotesRepository, UsersRepository
+from ..repositories.memory import memory_engine
+from ..repositories.mongo import MongoNotesRepository, MongoUsersRepository
+
+logger = logging.getLogger(__name__)
+
+
+class PoolUsageListener(monitoring.ConnectionPoolListener):
+    """Tracks how many pooled connections are checked out, for load shedding"""
+
+    def __init__(self):
+        self.checked_out = 0
+        self._lock = threading.Lock()
+
+    @property
+    def utilization(self) -> float:
+        return self.checked_out / max(settings.MONGODB_MAX_POOL_SIZE, 1)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+
+class TopologyTracker(monitoring.TopologyListener):
+    """
+    Mirrors the driver's view of the deployment (topology type, members and
+    their roles) and wakes the connection manager whenever a writable server
+    appears or disappears, e.g. on a replica set election.
+    """
+
+    def __init__(self):
+        self.topology_type = "Unknown"
+        self.servers: Dict[str, str] = {}
+        self.writable = False
+        self.changes = 0
+        self._lock = threading.Lock()
+        self._notify: Optional[Callable[[], None]] = None
+
+    def description_changed(self, event):
+        new = event.new_description
+        servers = {
+            f"{host}:{port}": description.server_type_name
+            for (host, port), description in new.server_descriptions().items()
+        }
+        with self._lock:
+            previous_servers = self.servers
+            previous_writable = self.writable
+            self.topology_type = new.topology_type_name
+            self.servers = servers
+            self.writable = new.has_writable_server()
+            self.changes += 1
+
+        if servers != previous_servers:
+            logger.info("MongoDB topology changed (%s): %s", self.topology_type, servers)
+        if self.writable != previous_writable and self._notify is not None:
+            # Called from a driver monitor thread
+            self._notify()
+
+    def opened(self, event): pass
+    def closed(self, event): pass
+
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database = None
+    pool_usage = PoolUsageListener()
+    topology = TopologyTracker()
+
+    # disconnected -> connecting -> connected <-> reconnecting
+    state: str = "disconnected"
+    last_error: Optional[str] = None
+    connected_at: Optional[float] = None
+    reconnects: int = 0
+    _task: Optional[asyncio.Task] = None
+    _wake: Optional[asyncio.Event] = None
+    _on_connect: List[Callable[[object], Awaitable[None]]] = []
 
 db = Database()
 
 async def get_database():
+    # Fail fast while (re)connecting rather than blocking on server selection
+    if db.state != "connected":
+        return None
     return db.database
 
+async def get_notes_repository() -> Optional[NotesRepository]:
+    """Notes storage for the configured backend, or None while MongoDB is unavailable"""
+    if settings.STORAGE_BACKEND == "memory":
+        return memory_engine.notes_repository
+    database = await get_database()
+    return MongoNotesRepository(database) if database is not None else None
+
+async def get_users_repository() -> Optional[UsersRepository]:
+    """Users storage for the configured backend, or None while MongoDB is unavailable"""
+    if settings.STORAGE_BACKEND == "memory":
+        return memory_engine.users_repository
+    database = await get_database()
+    return MongoUsersRepository(database) if database is not None else None
+
+def on_connect(callback: Callable[[object], Awaitable[None]]):
+    """Register a coroutine function run with the database after every (re)connect"""
+    if callback not in db._on_connect:
+        db._on_connect.append(callback)
+
+def client_options() -> dict:
+    """Connection options from config shared by the app and the maintenance scripts"""
+    options = {}
+    if settings.MONGODB_TLS:
+        # Configure MongoDB client with proper SSL certificate bundle
+        import certifi
+        options["tlsCAFile"] = certifi.where()
+    return options
+
+def _create_client(mongodb_uri: str) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        mongodb_uri,
+        serverSelectionTimeoutMS=5000,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        event_listeners=[db.pool_usage, db.topology],
+        **client_options()
+    )
+
+async def _wait(seconds: float):
+    """Sleep, waking early to re-check if the topology gains or loses a writable server"""
+    try:
+        await asyncio.wait_for(db._wake.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+    db._wake.clear()
+
+async def _mark_connected():
+    db.database = db.client.galactic_archives
+    recovering = db.state == "reconnecting"
+    db.state = "connected"
+    db.last_error = None
+    db.connected_at = time.monotonic()
+    if recovering:
+        db.reconnects += 1
+        logger.info("Reconnected to MongoDB")
+    else:
+        logger.info("Successfully connected to MongoDB Atlas")
+
+    for callback in db._on_connect:
+        try:
+            await callback(db.database)
+        except Exception as e:
+            logger.error("MongoDB on-connect hook %s failed: %s", callback.__qualname__, e)
+
+async def _maintain_connection(mongodb_uri: str):
+    """Connect with exponential backoff, then keep checking and recover from outages"""
+    delay = settings.MONGODB_CONNECT_BACKOFF_INITIAL_SECONDS
+    while True:
+        try:
+            if db.client is None:
+                # SRV lookups happen in the constructor; keep them off the event loop
+                db.client = await asyncio.to_thread(_create_client, mongodb_uri)
+            await db.client.admin.command('ping')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if db.state == "connected":
+                db.state = "reconnecting"
+                logger.warning("Lost connection to MongoDB: %s", e)
+            elif db.last_error is None:
+                logger.warning("Failed to connect to MongoDB, retrying in the background: %s", e)
+            db.last_error = str(e)
+            # Full jitter keeps a fleet of instances from reconnecting in lockstep
+            await _wait(random.uniform(0, delay))
+            delay = min(delay * 2, settings.MONGODB_CONNECT_BACKOFF_MAX_SECONDS)
+            continue
+
+        if db.state != "connected":
+            await _mark_connected()
+        delay = settings.MONGODB_CONNECT_BACKOFF_INITIAL_SECONDS
+        await _wait(settings.MONGODB_HEALTH_CHECK_SECONDS)
+
 async def connect_to_mongo():
-    """Create database connection"""
+    """Start connecting in the background; the server does not wait for MongoDB"""
     mongodb_uri = os.getenv("MONGODB_URI")
     if not mongodb_uri:
-        print("Warning: MONGODB_URI environment variable not set")
+        logger.warning("MONGODB_URI environment variable not set")
         return
-    
-    try:
-        # Configure MongoDB client with proper SSL certificate bundle
-        db.client = AsyncIOMotorClient(
-            mongodb_uri,
-            serverSelectionTimeoutMS=5000,
-            tlsCAFile=certifi.where()
-        )
-        db.database = db.client.galactic_archives
-        
-        # Test the connection with a shorter timeout
-        await db.client.admin.command('ping')
-        print("Successfully connected to MongoDB Atlas")
-    except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        print("Server will start without database connectivity")
-        # Don't raise the exception, allow server to start
+    if db._task is not None and not db._task.done():
+        return
+
+    loop = asyncio.get_running_loop()
+    db._wake = asyncio.Event()
+    db.topology._notify = lambda: loop.call_soon_threadsafe(db._wake.set)
+    db.state = "connecting"
+    db._task = asyncio.create_task(_maintain_connection(mongodb_uri))
 
 async def close_mongo_connection():
     """Close database connection"""
+    if db._task is not None:
+        db._task.cancel()
+        try:
+            await db._task
+        except asyncio.CancelledError:
+            pass
+        db._task = None
+    db.topology._notify = None
+    db.state = "disconnected"
     if db.client:
         db.client.close()
-        print("Disconnected from MongoDB")
+        db.client = None
+        db.database = None
+        logger.info("Disconnected from MongoDB")
 
 async def ping_database() -> bool:
     """Test database connectivity"""
     try:
-        if db.client:
+        if db.client and db.state == "connected":
             await db.client.admin.command('ping')
             return True
         return False
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+def connection_status() -> dict:
+    """Connection manager and topology state for the health and readiness checks"""
+    return {
+        "state": db.state,
+        "topology": db.topology.topology_type,
+        "servers": db.topology.servers,
+        "reconnects": db.reconnects,
+        "last_error": db.last_error,
+    }
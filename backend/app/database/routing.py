@@ -0,0 +1,151 @@
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from bson import ObjectId
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Operation classes whose reads may be routed away from the primary
+OPERATION_CLASSES = ("list", "search", "stats")
+
+_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# The driver rejects smaller bounds (heartbeat interval plus the idle write period)
+MIN_MAX_STALENESS_SECONDS = 90
+
+# Last write of the authenticated user as recorded on their document; set by get_current_user
+user_last_write: contextvars.ContextVar[Optional[datetime]] = contextvars.ContextVar("user_last_write", default=None)
+
+# Counters surfaced by the health check
+routing_stats = {"primary": 0, "secondary": 0, "causal": 0, "recent_write": 0}
+
+
+class WriteMarker(NamedTuple):
+    """Causal position of a user's latest write through this instance"""
+    cluster_time: dict
+    operation_time: object
+    written_at: datetime
+    expires: float
+
+
+def parse_read_routing(value: str) -> Dict[str, str]:
+    """Parse "list=secondaryPreferred,stats=secondary" into {operation class: read preference mode}"""
+    policies = {}
+    for item in value.split(","):
+        operation, _, mode = (part.strip() for part in item.partition("="))
+        if not operation:
+            continue
+        if operation not in OPERATION_CLASSES or mode not in _MODES:
+            logger.warning("Ignoring read routing entry %r", item)
+            continue
+        policies[operation] = mode
+    return policies
+
+
+class ReadRouter:
+    """
+    Chooses where each class of read is served. Routed reads go to the
+    configured mode with a max staleness bound, except for users who wrote
+    recently: if this instance made their latest write, the read runs in a
+    causally consistent session that waits for the secondary to catch up;
+    otherwise it falls back to the primary.
+    """
+
+    def __init__(self, policies: Dict[str, str], max_staleness: int):
+        max_staleness = int(max(max_staleness, MIN_MAX_STALENESS_SECONDS))
+        self.read_preferences = {
+            operation: ReadPreference.PRIMARY if mode == "primary" else _MODES[mode](max_staleness=max_staleness)
+            for operation, mode in policies.items()
+        }
+        self.recent_write_window = timedelta(seconds=max_staleness)
+        # Insertion order is expiry order
+        self._markers: "OrderedDict[ObjectId, WriteMarker]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return any(pref.mode != ReadPreference.PRIMARY.mode for pref in self.read_preferences.values())
+
+    def read_preference(self, operation: str):
+        return self.read_preferences.get(operation, ReadPreference.PRIMARY)
+
+    def record_write(self, user_id: ObjectId, session):
+        """Remember the causal position of a user's write made in `session`"""
+        if session is None or session.operation_time is None:
+            return
+        now = time.monotonic()
+        self._markers.pop(user_id, None)
+        self._markers[user_id] = WriteMarker(
+            session.cluster_time, session.operation_time, datetime.utcnow(),
+            now + self.recent_write_window.total_seconds(),
+        )
+        while self._markers and next(iter(self._markers.values())).expires <= now:
+            self._markers.popitem(last=False)
+
+    def marker(self, user_id: ObjectId) -> Optional[WriteMarker]:
+        marker = self._markers.get(user_id)
+        if marker is None or marker.expires <= time.monotonic():
+            return None
+        return marker
+
+    @asynccontextmanager
+    async def write_session(self, client):
+        """A causally consistent session for a write, or None when no reads are routed"""
+        if not self.enabled:
+            yield None
+            return
+        async with await client.start_session(causal_consistency=True) as session:
+            yield session
+
+    @asynccontextmanager
+    async def read(self, collection, operation: str, user_id: Optional[ObjectId] = None):
+        """
+        Yield (collection, session) for a read of the given class: the
+        collection carries the read preference, the session is None unless
+        the read must observe the user's recent write.
+        """
+        read_preference = self.read_preference(operation)
+        if read_preference.mode == ReadPreference.PRIMARY.mode:
+            routing_stats["primary"] += 1
+            yield collection, None
+            return
+
+        marker = self.marker(user_id) if user_id is not None else None
+        last_write = user_last_write.get() if user_id is not None else None
+        if marker is not None and (last_write is None or last_write <= marker.written_at):
+            routing_stats["causal"] += 1
+            async with await collection.database.client.start_session(causal_consistency=True) as session:
+                session.advance_cluster_time(marker.cluster_time)
+                session.advance_operation_time(marker.operation_time)
+                # Majority reads make the causal guarantee hold across elections
+                yield collection.with_options(
+                    read_preference=read_preference, read_concern=ReadConcern("majority")
+                ), session
+            return
+
+        if marker is not None or (last_write is not None and datetime.utcnow() - last_write < self.recent_write_window):
+            # Written through another instance: only the primary is known to have it
+            routing_stats["recent_write"] += 1
+            yield collection, None
+            return
+
+        routing_stats["secondary"] += 1
+        yield collection.with_options(read_preference=read_preference), None
+
+
+read_router = ReadRouter(parse_read_routing(settings.MONGODB_READ_ROUTING), settings.MONGODB_MAX_STALENESS_SECONDS)
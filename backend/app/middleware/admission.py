@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Optional
+
+from ..core.config import settings
+from ..database.connection import db
+from .rate_limit import send_error
+
+# Probes and the webhook must keep working while we shed load
+EXEMPT_PATHS = {"/healthz", "/readyz", "/api/v1/billing/webhook"}
+
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up from a short sleep"""
+
+    INTERVAL = 0.1
+
+    def __init__(self):
+        self.lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.INTERVAL)
+            lag = (time.monotonic() - started - self.INTERVAL) * 1000
+            # Smooth so a single slow tick does not trigger shedding
+            self.lag_ms = self.lag_ms * 0.8 + lag * 0.2
+
+    def start(self):
+        """Start measuring event loop lag"""
+        if self._task is None and settings.MAX_EVENT_LOOP_LAG_MS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop measuring event loop lag"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+
+class AdmissionControlMiddleware:
+    """
+    Global concurrency limit that sheds load with 503 once too many requests
+    are in flight, the event loop is lagging, or the MongoDB pool is saturated
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+        self.shed_count = 0
+
+    def _overloaded(self) -> Optional[str]:
+        if settings.MAX_CONCURRENT_REQUESTS > 0 and self.in_flight >= settings.MAX_CONCURRENT_REQUESTS:
+            return "Too many concurrent requests"
+        if settings.MAX_EVENT_LOOP_LAG_MS > 0 and loop_lag_monitor.lag_ms > settings.MAX_EVENT_LOOP_LAG_MS:
+            return "Server is overloaded"
+        if settings.MAX_DB_POOL_UTILIZATION > 0 and db.pool_usage.utilization >= settings.MAX_DB_POOL_UTILIZATION:
+            return "Database is overloaded"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        reason = self._overloaded()
+        if reason:
+            self.shed_count += 1
+            return await send_error(send, 503, reason, 1)
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import re
+import time
+
+import pymongo
+
+from ..core.config import settings
+from ..core.deadline import request_deadline, deadline_stats, request_timeout
+from .rate_limit import header_value
+
+# Attachment transfers are bounded by ATTACHMENT_MAX_BYTES rather than by time
+ATTACHMENT_UPLOAD = re.compile(r"^/api/v1/notes/[^/]+/attachments/?$")
+ATTACHMENT_DOWNLOAD = re.compile(r"^/api/v1/notes/[^/]+/attachments/[^/]+/?$")
+
+
+def is_transfer(method: str, path: str) -> bool:
+    if method == "POST":
+        return ATTACHMENT_UPLOAD.match(path) is not None
+    return method in ("GET", "HEAD") and ATTACHMENT_DOWNLOAD.match(path) is not None
+
+
+def has_body(scope) -> bool:
+    """Whether the request carries a body the app has to read before a disconnect can arrive"""
+    if scope["method"] in ("GET", "HEAD"):
+        return False
+    if header_value(scope, b"transfer-encoding") is not None:
+        return True
+    return (header_value(scope, b"content-length") or "0").strip() != "0"
+
+
+class DeadlineMiddleware:
+    """
+    Gives each request a deadline from config or the X-Request-Timeout header.
+    MongoDB calls inherit it as maxTimeMS through pymongo.timeout, Stripe
+    calls through run_stripe. Handlers still running at the deadline, or
+    whose client has disconnected, are cancelled. Attachment uploads and
+    downloads are exempt; their size limit bounds them instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.REQUEST_TIMEOUT_SECONDS <= 0:
+            return await self.app(scope, receive, send)
+        if is_transfer(scope["method"], scope["path"]):
+            return await self.app(scope, receive, send)
+
+        timeout = request_timeout(header_value(scope, b"x-request-timeout"))
+        deadline = time.monotonic() + timeout
+        body_received = asyncio.Event()
+        if not has_body(scope):
+            body_received.set()
+        response_started = asyncio.Event()
+        # Once the body is drained (at once without one), receive() is owned by
+        # the disconnect watcher and the app reads what it forwards
+        forwarded: asyncio.Queue = asyncio.Queue()
+
+        async def receive_wrapper():
+            if body_received.is_set():
+                return await forwarded.get()
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                body_received.set()
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_started.set()
+            await send(message)
+
+        async def run_app():
+            with pymongo.timeout(timeout):
+                await self.app(scope, receive_wrapper, send_wrapper)
+
+        token = request_deadline.set(deadline)
+        try:
+            app_task = asyncio.create_task(run_app())
+        finally:
+            request_deadline.reset(token)
+
+        async def watch_disconnect():
+            await body_received.wait()
+            while True:
+                message = await receive()
+                forwarded.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    break
+            if not app_task.done():
+                deadline_stats["client_disconnects"] += 1
+                app_task.cancel()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        started = asyncio.create_task(response_started.wait())
+        try:
+            # The deadline covers the work up to the first response byte;
+            # streaming bodies are only cut short by a disconnect
+            await asyncio.wait({app_task, started}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not app_task.done() and not response_started.is_set():
+                app_task.cancel()
+                deadline_stats["exceeded"] += 1
+                try:
+                    await app_task
+                except BaseException:
+                    pass
+                if not response_started.is_set():
+                    await send_timeout(send)
+                return
+
+            try:
+                await app_task
+            except asyncio.CancelledError:
+                # Client went away; there is nobody left to respond to
+                if not watcher.done() or watcher.cancelled():
+                    raise
+            if time.monotonic() > deadline:
+                deadline_stats["exceeded"] += 1
+        finally:
+            watcher.cancel()
+            started.cancel()
+
+
+async def send_timeout(send):
+    body = json.dumps({"detail": "Request deadline exceeded"}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 504,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,196 @@
+import json
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from ..core.auth import verify_token
+from ..core.config import settings
+from ..database.connection import get_database
+
+# Route groups and the setting holding their per-minute budget
+ROUTE_GROUPS = {
+    "auth": "RATE_LIMIT_AUTH_PER_MINUTE",
+    "account": "RATE_LIMIT_ACCOUNT_PER_MINUTE",
+    "notes_read": "RATE_LIMIT_NOTES_READ_PER_MINUTE",
+    "notes_write": "RATE_LIMIT_NOTES_WRITE_PER_MINUTE",
+    "billing": "RATE_LIMIT_BILLING_PER_MINUTE",
+}
+
+# Stripe calls the webhook from a handful of IPs; never throttle it
+EXEMPT_PATHS = {"/api/v1/billing/webhook"}
+
+# Endpoints that check a password get the tight auth budget; /me, /refresh and /logout
+# are called on every page load and token renewal, so they share a looser one
+CREDENTIAL_PATHS = {"/api/v1/auth/login", "/api/v1/auth/register"}
+
+
+def route_group(method: str, path: str) -> Optional[str]:
+    """Classify a request into a rate limit group, or None if it is not limited"""
+    if path in EXEMPT_PATHS:
+        return None
+    if path.startswith("/api/v1/auth"):
+        return "auth" if path.rstrip("/") in CREDENTIAL_PATHS else "account"
+    if path.startswith("/api/v1/notes"):
+        return "notes_read" if method in ("GET", "HEAD") else "notes_write"
+    if path.startswith("/api/v1/billing"):
+        return "billing"
+    return None
+
+
+class MemoryRateLimitBackend:
+    """Token buckets held in process memory; limits apply per instance"""
+
+    MAX_KEYS = 100_000
+
+    def __init__(self):
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / refill_per_second
+
+        # Evict the least recently used buckets; a fresh bucket starts full anyway
+        while len(self._buckets) > self.MAX_KEYS:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class MongoRateLimitBackend:
+    """
+    Token buckets shared by all instances through the rate_limits collection.
+    Each check is a single atomic pipeline update, at the cost of one
+    database round trip per limited request.
+    """
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        db = await get_database()
+        if db is None:
+            return 0.0
+
+        now = datetime.utcnow()
+        refilled = {"$min": [
+            capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", capacity]},
+                {"$multiply": [
+                    {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]},
+                    refill_per_second,
+                ]},
+            ]},
+        ]}
+        try:
+            bucket = await db.rate_limits.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": refilled}},
+                    {"$set": {
+                        "allowed": {"$gte": ["$tokens", 1]},
+                        "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                        "updated_at": now,
+                        # Lets a TTL index clean up idle buckets
+                        "expires_at": {"$add": [now, int(capacity / refill_per_second * 1000)]},
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError:
+            # Fail open: losing rate limiting is better than failing every request
+            return 0.0
+
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / refill_per_second
+
+
+def create_backend():
+    if settings.RATE_LIMIT_BACKEND == "mongo":
+        return MongoRateLimitBackend()
+    return MemoryRateLimitBackend()
+
+
+async def ensure_rate_limit_indexes(db):
+    """Create the TTL index used by the shared rate limit backend"""
+    if db is None or settings.RATE_LIMIT_BACKEND != "mongo":
+        return
+    try:
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+    except PyMongoError:
+        pass
+
+
+def header_value(scope, name: bytes) -> Optional[str]:
+    """Read a request header from an ASGI scope"""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_key(scope) -> str:
+    """Identify the caller by the JWT subject if present, otherwise by client IP"""
+    authorization = header_value(scope, b"authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        subject = verify_token(authorization[7:])
+        if subject:
+            return f"user:{subject}"
+
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = header_value(scope, b"x-forwarded-for")
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Per-user/IP token bucket rate limiting with per-route-group budgets"""
+
+    def __init__(self, app, backend=None):
+        self.app = app
+        self.backend = backend or create_backend()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        group = route_group(scope["method"], scope["path"])
+        per_minute = getattr(settings, ROUTE_GROUPS[group]) if group else 0
+        if per_minute <= 0:
+            return await self.app(scope, receive, send)
+
+        key = f"{group}:{client_key(scope)}"
+        retry_after = await self.backend.take(key, per_minute, per_minute / 60)
+        if retry_after > 0:
+            return await send_error(send, 429, "Rate limit exceeded", retry_after)
+
+        await self.app(scope, receive, send)
+
+
+async def send_error(send, status_code: int, detail: str, retry_after: float):
+    """Send a FastAPI-style JSON error with a Retry-After header"""
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
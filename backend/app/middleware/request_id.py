@@ -0,0 +1,37 @@
+import re
+import uuid
+
+from ..core.log import request_id
+from .rate_limit import header_value
+
+# Accept caller-supplied ids (e.g. from a load balancer) only if they are log-safe
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestIdMiddleware:
+    """
+    Tags each request with an id, taken from X-Request-ID or generated, so
+    every log line written while handling it can be correlated. The id is
+    echoed back in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = header_value(scope, b"x-request-id")
+        current = incoming if incoming and VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", current.encode("latin-1"))]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
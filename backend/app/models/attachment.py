@@ -0,0 +1,20 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from bson import ObjectId
+
+from .user import PyObjectId
+
+
+class AttachmentResponse(BaseModel):
+    """Model for a file attached to a note"""
+    id: PyObjectId = Field(..., alias="_id")
+    note_id: PyObjectId
+    filename: str
+    content_type: str
+    length: int = Field(..., description="File size in bytes")
+    uploaded_at: datetime
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from bson import ObjectId
+
+from .user import PyObjectId
+
+
+class JobThrottle(BaseModel):
+    """Per-job overrides of JOB_BATCH_SIZE and JOB_MAX_DOCS_PER_SECOND"""
+    batch_size: Optional[int] = Field(None, ge=1, le=10000)
+    docs_per_second: Optional[float] = Field(None, ge=0, description="0 runs unthrottled")
+
+
+class JobCreate(BaseModel):
+    """Model for starting a background job"""
+    type: str
+    params: dict = Field(default_factory=dict)
+    throttle: JobThrottle = Field(default_factory=JobThrottle)
+
+
+class JobStepProgress(BaseModel):
+    name: str
+    processed: int
+    total: Optional[int] = Field(None, description="Matching documents when the step started")
+
+
+class JobResponse(BaseModel):
+    """Model for a background job and its progress"""
+    id: PyObjectId = Field(..., alias="_id")
+    type: str
+    params: dict
+    state: str
+    step: int = Field(..., description="Index of the step in progress")
+    progress: List[JobStepProgress]
+    throttle: dict
+    attempts: int
+    error: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
@@ -1,14 +1,39 @@
+import re
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
 from bson import ObjectId
 
 from .user import PyObjectId
 
+MAX_TAGS_PER_NOTE = 20
+# Tags become field names in the per-user counts, so "." and "$" are ruled out
+TAG_PATTERN = re.compile(r"^[\w-]{1,50}$")
+
+
+def normalize_tags(tags: List[str]) -> List[str]:
+    """Lowercase, validate and de-duplicate tags, keeping their order"""
+    normalized = []
+    for tag in tags:
+        tag = tag.strip().lower()
+        if not TAG_PATTERN.match(tag):
+            raise ValueError(f"Invalid tag {tag!r}: use 1-50 letters, digits, '_' or '-'")
+        if tag not in normalized:
+            normalized.append(tag)
+    if len(normalized) > MAX_TAGS_PER_NOTE:
+        raise ValueError(f"A note can have at most {MAX_TAGS_PER_NOTE} tags")
+    return normalized
+
 
 class NoteBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200, description="Note title")
     content: str = Field(..., min_length=1, description="Note content")
+    tags: List[str] = Field(default_factory=list, description="Lowercase tags for filtering")
+
+    @field_validator("tags")
+    @classmethod
+    def check_tags(cls, tags):
+        return normalize_tags(tags)
 
 
 class NoteCreate(NoteBase):
@@ -20,11 +45,56 @@ class NoteUpdate(BaseModel):
     """Model for updating an existing note"""
     title: Optional[str] = Field(None, min_length=1, max_length=200, description="Note title")
     content: Optional[str] = Field(None, min_length=1, description="Note content")
+    tags: Optional[List[str]] = Field(None, description="Replacement tags")
+
+    @field_validator("tags")
+    @classmethod
+    def check_tags(cls, tags):
+        return None if tags is None else normalize_tags(tags)
+
+
+class TextEdit(BaseModel):
+    """A single edit against the base version of a note's content"""
+    op: Literal["insert", "delete", "replace"]
+    offset: int = Field(..., ge=0, description="Character offset into the base content")
+    length: int = Field(0, ge=0, description="Number of characters removed (delete/replace)")
+    text: str = Field("", description="Text inserted (insert/replace)")
+
+
+class NotePatch(BaseModel):
+    """Model for partial updates applied against a known note version"""
+    base_version: int = Field(..., ge=0, description="Version the edits were made against")
+    title: Optional[str] = Field(None, min_length=1, max_length=200, description="Replacement title")
+    tags: Optional[List[str]] = Field(None, description="Replacement tags")
+    edits: Optional[List[TextEdit]] = Field(None, description="Content edits with offsets into the base content")
+    diff: Optional[str] = Field(None, description="Unified diff against the base content")
+
+    @field_validator("tags")
+    @classmethod
+    def check_tags(cls, tags):
+        return None if tags is None else normalize_tags(tags)
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        if self.edits is not None and self.diff is not None:
+            raise ValueError("Provide either edits or diff, not both")
+        if self.title is None and self.tags is None and not self.edits and not self.diff:
+            raise ValueError("At least one change must be provided")
+        return self
+
+
+class NotePatchResponse(BaseModel):
+    """Compact acknowledgement for a patched note"""
+    id: str
+    version: int
+    content_length: int
+    updated_at: datetime
 
 
 class NoteResponse(NoteBase):
     """Model for note responses to the client"""
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    version: int = Field(0, description="Monotonic note version, incremented on every update")
     created_at: datetime
     updated_at: datetime
 
@@ -34,10 +104,43 @@ class NoteResponse(NoteBase):
         json_encoders = {ObjectId: str}
 
 
+class TagCount(BaseModel):
+    """Number of a user's notes carrying a tag"""
+    tag: str
+    count: int
+
+
+class AutosaveResponse(BaseModel):
+    """Acknowledgement for a buffered autosave"""
+    id: str
+    version: int
+    updated_at: datetime
+    buffered: bool = True
+
+
+class NoteRevisionSummary(BaseModel):
+    """Model for an entry in a note's revision history"""
+    version: int
+    title: str
+    kind: Literal["delta", "snapshot"]
+    size: int = Field(..., description="Stored size of the revision payload")
+    updated_at: datetime
+
+
+class NoteRevisionResponse(BaseModel):
+    """Model for a materialized historical version of a note"""
+    id: str
+    version: int
+    title: str
+    content: str
+    updated_at: datetime
+
+
 class NoteInDB(NoteBase):
     """Model for notes stored in the database"""
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     user_id: PyObjectId = Field(..., description="ID of the user who owns this note")
+    version: int = 0
     created_at: datetime
     updated_at: datetime
 
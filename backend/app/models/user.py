@@ -16,9 +16,8 @@ class PyObjectId(ObjectId):
         return ObjectId(v)
 
     @classmethod
-    def __get_pydantic_json_schema__(cls, field_schema):
-        field_schema.update(type="string")
-        return field_schema
+    def __get_pydantic_json_schema__(cls, core_schema, handler):
+        return {"type": "string"}
 
 
 class UserBase(BaseModel):
@@ -45,6 +44,13 @@ class UserResponse(UserBase):
         json_encoders = {ObjectId: str}
 
 
+class UserStats(BaseModel):
+    """Per-user counters maintained on every note write"""
+    note_count: int = 0
+    total_bytes: int = 0
+    last_activity: Optional[datetime] = None
+
+
 class UserInDB(UserBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     password_hash: str
@@ -57,15 +63,34 @@ class UserInDB(UserBase):
     stripe_price_id: Optional[str] = None
     stripe_subscription_status: Optional[str] = None
 
+    # Materialized note statistics
+    stats: UserStats = Field(default_factory=UserStats)
+
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
 
+class UsageResponse(BaseModel):
+    """Current plan, limits and usage for the authenticated user"""
+    plan: str
+    max_notes: Optional[int] = None
+    max_bytes: Optional[int] = None
+    note_count: int
+    total_bytes: int
+    last_activity: Optional[datetime] = None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: int
+    refresh_token: Optional[str] = None  # None when MongoDB is unavailable
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
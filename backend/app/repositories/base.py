@@ -0,0 +1,127 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from bson import ObjectId
+
+class StatsChange(NamedTuple):
+    """Deltas applied to a user's counters in a single write"""
+    user_id: ObjectId
+    notes_delta: int
+    bytes_delta: int
+    now: Optional[datetime] = None  # Activity time; defaults to the time of the write
+    tags_delta: Optional[Dict[str, int]] = None  # Per-tag note count deltas
+
+
+class DeletedNote(NamedTuple):
+    size: int  # Bytes the note counted against the quota
+    tags: List[str]
+
+
+class StorageError(Exception):
+    """The storage engine failed to complete an operation"""
+
+
+class EmailAlreadyExistsError(StorageError):
+    """A user with the same email address already exists"""
+
+
+class NotesRepository(ABC):
+    """
+    Storage for notes. Documents are plain dicts shaped like the MongoDB
+    documents: _id, user_id, title, content, tags, version, created_at, updated_at.
+    Every lookup is scoped to the owning user.
+    """
+
+    @abstractmethod
+    async def ensure_indexes(self):
+        """Create whatever indexes the engine needs"""
+
+    @abstractmethod
+    async def insert(self, note: dict) -> dict:
+        """Store a new note and return it with its assigned _id"""
+
+    @abstractmethod
+    async def get(self, user_id: ObjectId, note_id: ObjectId) -> Optional[dict]:
+        """Fetch a note owned by the user"""
+
+    @abstractmethod
+    async def get_many(self, note_ids: List[ObjectId]) -> List[dict]:
+        """Fetch several notes by id regardless of owner, in no particular order"""
+
+    @abstractmethod
+    async def list_for_user(self, user_id: ObjectId, search: Optional[str] = None,
+                            tags: Optional[List[str]] = None, match_all_tags: bool = True,
+                            limit: Optional[int] = None, before: Optional[datetime] = None) -> List[dict]:
+        """
+        A user's notes, most recently updated first. `search` is a
+        case-insensitive regular expression matched against title and content.
+        `tags` keeps notes carrying all of them, or any of them when
+        match_all_tags is False. `limit` and `before` page the list: at most
+        `limit` notes updated strictly before `before`, so the next page
+        starts before the last note's updated_at.
+        """
+
+    @abstractmethod
+    async def update(self, user_id: ObjectId, note_id: ObjectId, fields: dict,
+                     expected_version: Optional[int] = None) -> Optional[dict]:
+        """
+        Set fields and increment the version, optionally only if the note is
+        still at expected_version. Returns the updated note, or None if no
+        note matched.
+        """
+
+    @abstractmethod
+    async def apply_autosaves(self, writes: List[Tuple[ObjectId, ObjectId, int, dict]]) -> List[Tuple[ObjectId, ObjectId]]:
+        """
+        Set (user_id, note_id, base_version, fields) for many notes at once;
+        fields carry their own version. A write only applies if the note is
+        still at base_version. Returns (user_id, note_id) of the notes that
+        were written since, which were left untouched.
+        """
+
+    @abstractmethod
+    async def field_sizes(self, user_id: ObjectId, note_id: ObjectId) -> Optional[Tuple[int, Dict[str, int]]]:
+        """The note's version and the UTF-8 byte size of its title and content"""
+
+    @abstractmethod
+    async def delete(self, user_id: ObjectId, note_id: ObjectId) -> Optional[DeletedNote]:
+        """Delete a note and return what it counted against the user, or None if not found"""
+
+
+class UsersRepository(ABC):
+    """Storage for user accounts, looked up by id or email"""
+
+    @abstractmethod
+    async def ensure_indexes(self):
+        """Create whatever indexes the engine needs"""
+
+    @abstractmethod
+    async def create(self, user: dict) -> ObjectId:
+        """Store a new user; raises EmailAlreadyExistsError if the email is taken"""
+
+    @abstractmethod
+    async def get(self, user_id: ObjectId) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def apply_stats(self, changes: List[StatsChange]):
+        """
+        Add deltas to users' note counters and per-tag note counts and
+        advance their last activity, one atomic write per user
+        """
+
+    @abstractmethod
+    async def tag_counts(self, user_id: ObjectId) -> Dict[str, int]:
+        """The user's tags in use and how many notes carry each"""
+
+    @abstractmethod
+    async def set_stripe_customer_id(self, user_id: ObjectId, customer_id: str) -> Optional[str]:
+        """
+        Store the customer id unless the user already has one. Returns the
+        id stored on the user afterwards, or None if the user does not exist.
+        """
@@ -0,0 +1,173 @@
+"""
+Behaviour every storage engine must share, run against a live repository
+pair by scripts/check_repositories.py. The repositories should be empty.
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from .base import EmailAlreadyExistsError, NotesRepository, StorageError, UsersRepository
+
+
+class ConformanceError(Exception):
+    """A repository behaved differently from the contract"""
+
+
+def expect(condition: bool, message: str):
+    if not condition:
+        raise ConformanceError(message)
+
+
+def _same_time(a: datetime, b: datetime) -> bool:
+    # MongoDB stores datetimes with millisecond precision
+    return abs(a - b) < timedelta(milliseconds=1)
+
+
+def _note(user_id: ObjectId, title: str, content: str, updated_at: datetime, tags=()) -> dict:
+    return {
+        "user_id": user_id,
+        "title": title,
+        "content": content,
+        "tags": list(tags),
+        "version": 1,
+        "created_at": updated_at,
+        "updated_at": updated_at,
+    }
+
+
+async def check_notes(notes: NotesRepository):
+    await notes.ensure_indexes()
+    owner, other = ObjectId(), ObjectId()
+    start = datetime.utcnow()
+
+    first = await notes.insert(_note(owner, "Hoth", "Echo base", start, ["ice", "rebels"]))
+    second = await notes.insert(_note(owner, "Endor", "Forest moon ünïcode", start + timedelta(seconds=1), ["rebels"]))
+    await notes.insert(_note(other, "Tatooine", "Echo of twin suns", start, ["rebels"]))
+    expect(isinstance(first["_id"], ObjectId), "insert must assign an ObjectId")
+
+    fetched = await notes.get(owner, first["_id"])
+    expect(fetched is not None and fetched["title"] == "Hoth", "get must return the stored note")
+    expect(await notes.get(other, first["_id"]) is None, "get must be scoped to the owner")
+
+    listed = await notes.list_for_user(owner)
+    expect([n["_id"] for n in listed] == [second["_id"], first["_id"]], "list must be most recently updated first")
+    page = await notes.list_for_user(owner, limit=1)
+    expect([n["_id"] for n in page] == [second["_id"]], "limit must keep the most recent notes")
+    page = await notes.list_for_user(owner, limit=1, before=page[-1]["updated_at"])
+    expect([n["_id"] for n in page] == [first["_id"]], "before must continue the list after the previous page")
+    found = await notes.list_for_user(owner, "echo")
+    expect([n["_id"] for n in found] == [first["_id"]], "search must be case-insensitive and scoped")
+    found = await notes.list_for_user(owner, "^forest")
+    expect([n["_id"] for n in found] == [second["_id"]], "search must match content as a regular expression")
+
+    tagged = await notes.list_for_user(owner, tags=["rebels"])
+    expect([n["_id"] for n in tagged] == [second["_id"], first["_id"]], "tag filters must keep list order")
+    tagged = await notes.list_for_user(owner, tags=["rebels", "ice"])
+    expect([n["_id"] for n in tagged] == [first["_id"]], "tag filters must match all tags by default")
+    tagged = await notes.list_for_user(owner, tags=["ice", "forest"], match_all_tags=False)
+    expect([n["_id"] for n in tagged] == [first["_id"]], "tag filters must match any tag on request")
+    tagged = await notes.list_for_user(owner, "moon", tags=["rebels"])
+    expect([n["_id"] for n in tagged] == [second["_id"]], "tag filters must combine with search")
+
+    many = await notes.get_many([first["_id"], second["_id"], ObjectId()])
+    expect({n["_id"] for n in many} == {first["_id"], second["_id"]}, "get_many must skip unknown ids")
+
+    later = start + timedelta(seconds=2)
+    updated = await notes.update(owner, first["_id"], {"content": "Echo base evacuated", "updated_at": later})
+    expect(updated is not None and updated["version"] == 2, "update must increment the version")
+    expect(updated["content"] == "Echo base evacuated", "update must return the updated note")
+    listed = await notes.list_for_user(owner)
+    expect(listed[0]["_id"] == first["_id"], "update must move the note to the front of the list")
+    await notes.update(owner, first["_id"], {"tags": ["ice"]})
+    tagged = await notes.list_for_user(owner, tags=["rebels"])
+    expect([n["_id"] for n in tagged] == [second["_id"]], "updated tags must leave the old tag's listing")
+
+    stale = await notes.update(owner, first["_id"], {"title": "stale"}, expected_version=1)
+    expect(stale is None, "update must refuse a stale expected_version")
+    current = await notes.update(owner, first["_id"], {"title": "Hoth II"}, expected_version=3)
+    expect(current is not None and current["version"] == 4, "update must apply at the expected version")
+    expect(await notes.update(other, first["_id"], {"title": "stolen"}) is None, "update must be scoped to the owner")
+
+    autosaved_at = start + timedelta(seconds=3)
+    conflicts = await notes.apply_autosaves([
+        (owner, second["_id"], 1, {"content": "Forest moon", "version": 7, "updated_at": autosaved_at}),
+        (other, first["_id"], 4, {"content": "not yours", "version": 9, "updated_at": autosaved_at}),
+        (owner, first["_id"], 2, {"content": "stale", "version": 5, "updated_at": autosaved_at}),
+    ])
+    expect(conflicts == [(owner, first["_id"])], f"autosaves must refuse a stale base version, got {conflicts}")
+    autosaved = await notes.get(owner, second["_id"])
+    expect(autosaved["version"] == 7 and autosaved["content"] == "Forest moon", "autosaves must set their fields")
+    expect(_same_time(autosaved["updated_at"], autosaved_at), "autosaves must set updated_at")
+    untouched = await notes.get(owner, first["_id"])
+    expect(untouched["content"] == "Echo base evacuated" and untouched["version"] == 4,
+           "autosaves must be scoped to the owner and never overwrite a newer version")
+    listed = await notes.list_for_user(owner)
+    expect(listed[0]["_id"] == second["_id"], "autosaves must reorder the list")
+
+    sizes = await notes.field_sizes(owner, second["_id"])
+    expect(sizes == (7, {"title": 5, "content": 11}), f"field_sizes returned {sizes}")
+    expect(await notes.field_sizes(other, second["_id"]) is None, "field_sizes must be scoped to the owner")
+
+    expect(await notes.delete(other, second["_id"]) is None, "delete must be scoped to the owner")
+    deleted = await notes.delete(owner, second["_id"])
+    expect(deleted == (16, ["rebels"]), f"delete must return the freed bytes and tags, got {deleted}")
+    expect(await notes.get(owner, second["_id"]) is None, "deleted notes must be gone")
+    expect(await notes.delete(owner, second["_id"]) is None, "deleting twice must report not found")
+    expect(len(await notes.list_for_user(owner)) == 1, "deleted notes must leave the list")
+    expect(await notes.list_for_user(owner, tags=["rebels"]) == [], "deleted notes must leave tag listings")
+
+
+async def check_users(users: UsersRepository):
+    await users.ensure_indexes()
+    now = datetime.utcnow()
+    user = {"email": "rebel@example.com", "hashed_password": "x", "created_at": now, "updated_at": now,
+            "stats": {"note_count": 0, "total_bytes": 0, "last_activity": None}}
+
+    user_id = await users.create(dict(user))
+    expect(isinstance(user_id, ObjectId), "create must return the new id")
+    try:
+        await users.create(dict(user))
+    except EmailAlreadyExistsError:
+        pass
+    else:
+        raise ConformanceError("create must reject a duplicate email")
+
+    by_email = await users.get_by_email("rebel@example.com")
+    expect(by_email is not None and by_email["_id"] == user_id, "get_by_email must find the user")
+    expect(await users.get_by_email("nobody@example.com") is None, "get_by_email must return None when missing")
+    expect(await users.get(ObjectId()) is None, "get must return None when missing")
+
+    later = now + timedelta(seconds=5)
+    await users.apply_stats([(user_id, 2, 300, later)])
+    await users.apply_stats([(user_id, -1, -100, now), (ObjectId(), 1, 1, now)])
+    stats = (await users.get(user_id))["stats"]
+    expect(stats["note_count"] == 1 and stats["total_bytes"] == 200, f"apply_stats must add deltas, got {stats}")
+    expect(_same_time(stats["last_activity"], later), "apply_stats must never move last_activity backwards")
+
+    await users.apply_stats([(user_id, 0, 0, None, {"ice": 1, "rebels": 2})])
+    await users.apply_stats([(user_id, 1, 10, None, {"ice": -1, "endor": 1})])
+    stats = (await users.get(user_id))["stats"]
+    expect(stats["note_count"] == 2 and stats["total_bytes"] == 210, "tag deltas must apply alongside the counters")
+    counts = await users.tag_counts(user_id)
+    expect(counts == {"rebels": 2, "endor": 1}, f"tag counts must add deltas and hide unused tags, got {counts}")
+    expect(await users.tag_counts(ObjectId()) == {}, "unknown users must have no tag counts")
+
+    expect(await users.set_stripe_customer_id(user_id, "cus_first") == "cus_first", "first customer id must be stored")
+    expect(await users.set_stripe_customer_id(user_id, "cus_second") == "cus_first", "later writers must adopt the stored id")
+    expect((await users.get(user_id))["stripe_customer_id"] == "cus_first", "the stored id must not change")
+    expect(await users.set_stripe_customer_id(ObjectId(), "cus_x") is None, "unknown users must return None")
+
+
+async def check_search_errors(notes: NotesRepository):
+    try:
+        await notes.list_for_user(ObjectId(), "(")
+    except StorageError:
+        return
+    raise ConformanceError("an invalid search pattern must raise StorageError")
+
+
+CHECKS = [
+    ("notes", lambda notes, users: check_notes(notes)),
+    ("users", lambda notes, users: check_users(users)),
+    ("search errors", lambda notes, users: check_search_errors(notes)),
+]
@@ -0,0 +1,317 @@
+import asyncio
+import bisect
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import bson
+from bson import ObjectId
+
+from ..core.config import settings
+from .base import DeletedNote, EmailAlreadyExistsError, NotesRepository, StatsChange, StorageError, UsersRepository
+
+logger = logging.getLogger(__name__)
+
+# Position of a note in its owner's index: ordered by last update, ties by id
+IndexKey = Tuple[datetime, ObjectId]
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+class MemoryEngine:
+    """
+    Process-local storage for single-node deployments and benchmarks.
+    Documents are never mutated in place: every write swaps in a new dict,
+    so a snapshot only has to copy the top-level maps. Each user's notes are
+    kept in a list sorted by updated_at, so listing needs no sort, and in
+    per-tag sets, so tag filters only touch matching notes.
+    """
+
+    def __init__(self, snapshot_path: str = ""):
+        self.snapshot_path = snapshot_path
+        self.notes: Dict[ObjectId, dict] = {}
+        self.users: Dict[ObjectId, dict] = {}
+        self.user_notes: Dict[ObjectId, List[IndexKey]] = {}
+        self.user_tags: Dict[ObjectId, Dict[str, Set[ObjectId]]] = {}
+        self.users_by_email: Dict[str, ObjectId] = {}
+        self.changes = 0
+        self._snapshot_changes = 0
+        self._task: Optional[asyncio.Task] = None
+        self.notes_repository = MemoryNotesRepository(self)
+        self.users_repository = MemoryUsersRepository(self)
+
+    # Index maintenance
+
+    def index_note(self, note: dict):
+        bisect.insort(self.user_notes.setdefault(note["user_id"], []), (note["updated_at"], note["_id"]))
+
+    def unindex_note(self, note: dict):
+        keys = self.user_notes.get(note["user_id"], [])
+        position = bisect.bisect_left(keys, (note["updated_at"], note["_id"]))
+        if position < len(keys) and keys[position] == (note["updated_at"], note["_id"]):
+            del keys[position]
+
+    def tag_note(self, note: dict, tags: Set[str]):
+        user_tags = self.user_tags.setdefault(note["user_id"], {})
+        for tag in tags:
+            user_tags.setdefault(tag, set()).add(note["_id"])
+
+    def untag_note(self, note: dict, tags: Set[str]):
+        user_tags = self.user_tags.get(note["user_id"], {})
+        for tag in tags:
+            tagged = user_tags.get(tag)
+            if tagged is not None:
+                tagged.discard(note["_id"])
+                if not tagged:
+                    del user_tags[tag]
+
+    def put_note(self, note: dict):
+        previous = self.notes.get(note["_id"])
+        if previous is not None and previous["updated_at"] != note["updated_at"]:
+            self.unindex_note(previous)
+        self.notes[note["_id"]] = note
+        if previous is None or previous["updated_at"] != note["updated_at"]:
+            self.index_note(note)
+        old_tags = set(previous.get("tags", [])) if previous is not None else set()
+        new_tags = set(note.get("tags", []))
+        self.untag_note(note, old_tags - new_tags)
+        self.tag_note(note, new_tags - old_tags)
+        self.changes += 1
+
+    def remove_note(self, note: dict):
+        del self.notes[note["_id"]]
+        self.unindex_note(note)
+        self.untag_note(note, set(note.get("tags", [])))
+        self.changes += 1
+
+    def put_user(self, user: dict):
+        self.users[user["_id"]] = user
+        self.users_by_email[user["email"]] = user["_id"]
+        self.changes += 1
+
+    # Snapshots
+
+    def load(self):
+        """Replace the contents with the snapshot on disk, if there is one"""
+        self.notes.clear()
+        self.users.clear()
+        self.user_notes.clear()
+        self.user_tags.clear()
+        self.users_by_email.clear()
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path, "rb") as f:
+            for record in bson.decode_file_iter(f):
+                if record["kind"] == "user":
+                    self.put_user(record["doc"])
+                else:
+                    self.put_note(record["doc"])
+        self._snapshot_changes = self.changes
+
+    def _write_snapshot(self, users: List[dict], notes: List[dict]):
+        temporary = f"{self.snapshot_path}.tmp"
+        with open(temporary, "wb") as f:
+            for doc in users:
+                f.write(bson.encode({"kind": "user", "doc": doc}))
+            for doc in notes:
+                f.write(bson.encode({"kind": "note", "doc": doc}))
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers only ever see a complete snapshot
+        os.replace(temporary, self.snapshot_path)
+
+    async def snapshot(self) -> bool:
+        """Write the current contents to disk if anything changed since the last snapshot"""
+        if not self.snapshot_path or self.changes == self._snapshot_changes:
+            return False
+        changes = self.changes
+        # Copying the maps is enough because documents are replaced, never mutated
+        users, notes = list(self.users.values()), list(self.notes.values())
+        await asyncio.to_thread(self._write_snapshot, users, notes)
+        self._snapshot_changes = changes
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.STORAGE_SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                await self.snapshot()
+            except OSError as e:
+                logger.error("Failed to write storage snapshot: %s", e)
+
+    def start(self):
+        """Start periodic snapshots"""
+        if self._task is None and self.snapshot_path and settings.STORAGE_SNAPSHOT_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop periodic snapshots and write a final one"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.snapshot()
+        except OSError as e:
+            logger.error("Failed to write storage snapshot: %s", e)
+
+
+class MemoryNotesRepository(NotesRepository):
+    def __init__(self, engine: MemoryEngine):
+        self.engine = engine
+
+    async def ensure_indexes(self):
+        pass
+
+    async def insert(self, note: dict) -> dict:
+        note = {**note, "_id": note.get("_id") or ObjectId()}
+        if note["_id"] in self.engine.notes:
+            raise StorageError(f"Duplicate note id {note['_id']}")
+        self.engine.put_note(note)
+        return dict(note)
+
+    async def get(self, user_id: ObjectId, note_id: ObjectId) -> Optional[dict]:
+        note = self.engine.notes.get(note_id)
+        if note is None or note["user_id"] != user_id:
+            return None
+        return dict(note)
+
+    async def get_many(self, note_ids: List[ObjectId]) -> List[dict]:
+        return [dict(self.engine.notes[note_id]) for note_id in note_ids if note_id in self.engine.notes]
+
+    def _tagged(self, user_id: ObjectId, tags: List[str], match_all_tags: bool) -> List[IndexKey]:
+        user_tags = self.engine.user_tags.get(user_id, {})
+        tagged = [user_tags.get(tag, set()) for tag in tags]
+        note_ids = set.intersection(*tagged) if match_all_tags else set.union(*tagged)
+        return sorted((self.engine.notes[note_id]["updated_at"], note_id) for note_id in note_ids)
+
+    async def list_for_user(self, user_id: ObjectId, search: Optional[str] = None,
+                            tags: Optional[List[str]] = None, match_all_tags: bool = True,
+                            limit: Optional[int] = None, before: Optional[datetime] = None) -> List[dict]:
+        pattern = None
+        if search:
+            try:
+                pattern = re.compile(search, re.IGNORECASE)
+            except re.error as e:
+                raise StorageError(f"Invalid search pattern: {e}")
+
+        if tags:
+            keys = self._tagged(user_id, tags, match_all_tags)
+        else:
+            keys = self.engine.user_notes.get(user_id, [])
+        if before is not None:
+            keys = keys[:bisect.bisect_left(keys, (before,))]
+
+        notes = []
+        for _, note_id in reversed(keys):
+            if limit is not None and len(notes) >= limit:
+                break
+            note = self.engine.notes[note_id]
+            if pattern is None or pattern.search(note["title"]) or pattern.search(note["content"]):
+                notes.append(dict(note))
+        return notes
+
+    async def update(self, user_id: ObjectId, note_id: ObjectId, fields: dict,
+                     expected_version: Optional[int] = None) -> Optional[dict]:
+        note = self.engine.notes.get(note_id)
+        if note is None or note["user_id"] != user_id:
+            return None
+        if expected_version is not None and (note.get("version") or 0) != expected_version:
+            return None
+        updated = {**note, **fields, "version": (note.get("version") or 0) + 1}
+        self.engine.put_note(updated)
+        return dict(updated)
+
+    async def apply_autosaves(self, writes: List[Tuple[ObjectId, ObjectId, int, dict]]) -> List[Tuple[ObjectId, ObjectId]]:
+        conflicts = []
+        for user_id, note_id, base_version, fields in writes:
+            note = self.engine.notes.get(note_id)
+            if note is None or note["user_id"] != user_id:
+                continue
+            if (note.get("version") or 0) != base_version:
+                conflicts.append((user_id, note_id))
+                continue
+            self.engine.put_note({**note, **fields})
+        return conflicts
+
+    async def field_sizes(self, user_id: ObjectId, note_id: ObjectId) -> Optional[Tuple[int, Dict[str, int]]]:
+        note = self.engine.notes.get(note_id)
+        if note is None or note["user_id"] != user_id:
+            return None
+        return note.get("version", 0), {"title": _size(note["title"]), "content": _size(note["content"])}
+
+    async def delete(self, user_id: ObjectId, note_id: ObjectId) -> Optional[DeletedNote]:
+        note = self.engine.notes.get(note_id)
+        if note is None or note["user_id"] != user_id:
+            return None
+        self.engine.remove_note(note)
+        return DeletedNote(_size(note["title"]) + _size(note["content"]), list(note.get("tags", [])))
+
+
+class MemoryUsersRepository(UsersRepository):
+    def __init__(self, engine: MemoryEngine):
+        self.engine = engine
+
+    async def ensure_indexes(self):
+        pass
+
+    async def create(self, user: dict) -> ObjectId:
+        if user["email"] in self.engine.users_by_email:
+            raise EmailAlreadyExistsError(user["email"])
+        user = {**user, "_id": user.get("_id") or ObjectId()}
+        self.engine.put_user(user)
+        return user["_id"]
+
+    def _copy(self, user: Optional[dict]) -> Optional[dict]:
+        if user is None:
+            return None
+        user = dict(user)
+        if "stats" in user:
+            user["stats"] = dict(user["stats"])
+        return user
+
+    async def get(self, user_id: ObjectId) -> Optional[dict]:
+        return self._copy(self.engine.users.get(user_id))
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        user_id = self.engine.users_by_email.get(email)
+        return self._copy(self.engine.users.get(user_id)) if user_id else None
+
+    async def apply_stats(self, changes: List[StatsChange]):
+        for user_id, notes_delta, bytes_delta, now, tags_delta in (StatsChange(*change) for change in changes):
+            user = self.engine.users.get(user_id)
+            if user is None:
+                continue
+            stats = dict(user.get("stats") or {})
+            stats["note_count"] = stats.get("note_count", 0) + notes_delta
+            stats["total_bytes"] = stats.get("total_bytes", 0) + bytes_delta
+            now = now or datetime.utcnow()
+            if stats.get("last_activity") is None or stats["last_activity"] < now:
+                stats["last_activity"] = now
+            counts = dict(user.get("tag_counts") or {})
+            for tag, delta in (tags_delta or {}).items():
+                counts[tag] = counts.get(tag, 0) + delta
+            self.engine.put_user({**user, "stats": stats, "tag_counts": counts})
+
+    async def tag_counts(self, user_id: ObjectId) -> Dict[str, int]:
+        user = self.engine.users.get(user_id) or {}
+        return {tag: count for tag, count in (user.get("tag_counts") or {}).items() if count > 0}
+
+    async def set_stripe_customer_id(self, user_id: ObjectId, customer_id: str) -> Optional[str]:
+        user = self.engine.users.get(user_id)
+        if user is None:
+            return None
+        if user.get("stripe_customer_id") is None:
+            self.engine.put_user({**user, "stripe_customer_id": customer_id})
+            return customer_id
+        return user["stripe_customer_id"]
+
+
+memory_engine = MemoryEngine(settings.STORAGE_SNAPSHOT_PATH)
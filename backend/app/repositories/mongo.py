@@ -0,0 +1,331 @@
+import functools
+import heapq
+import itertools
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, PyMongoError
+
+from ..core.config import settings
+from ..database.routing import read_router
+from .base import DeletedNote, EmailAlreadyExistsError, NotesRepository, StatsChange, StorageError, UsersRepository
+
+# Compressed collection holding notes the tiering job moved out of `notes`
+ARCHIVE_COLLECTION = "notes_archive"
+
+# Counters surfaced by the health check
+tiering_stats = {"archived": 0, "promoted": 0, "archive_reads": 0}
+
+
+def _storage_errors(method):
+    """Surface driver failures as StorageError so callers stay engine-agnostic"""
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await method(*args, **kwargs)
+        except PyMongoError as e:
+            raise StorageError(str(e)) from e
+    return wrapper
+
+
+def _version_filter(version: int) -> dict:
+    """Match a note at the given version; notes created before versioning count as version 0"""
+    if version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": version}
+
+
+def stats_update(notes_delta: int, bytes_delta: int, now: Optional[datetime] = None,
+                 tags_delta: Optional[Dict[str, int]] = None) -> dict:
+    """Update document applying a change to a user's note counters and tag counts"""
+    return {
+        "$inc": {
+            "stats.note_count": notes_delta,
+            "stats.total_bytes": bytes_delta,
+            **{f"tag_counts.{tag}": delta for tag, delta in (tags_delta or {}).items()},
+        },
+        "$max": {"stats.last_activity": now or datetime.utcnow()},
+    }
+
+
+class MongoNotesRepository(NotesRepository):
+    """
+    Notes stored in the `notes` collection. Writes record the user's causal
+    position so listings routed to secondaries still read the user's writes.
+
+    Notes left untouched for TIERING_ARCHIVE_AFTER_DAYS are moved by the
+    tiering job into `notes_archive`, a compressed collection indexed only
+    for listing. Lookups and writes fall through to it and promote the note
+    back into `notes`; listings and searches read both tiers in order.
+    """
+
+    def __init__(self, db):
+        self.collection = db.notes
+        self.archive = db[ARCHIVE_COLLECTION]
+        self.client = db.client
+
+    @_storage_errors
+    async def ensure_indexes(self):
+        await self.collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
+        # Multikey: one entry per tag, already in list order for tag-filtered listings
+        await self.collection.create_index([("user_id", ASCENDING), ("tags", ASCENDING), ("updated_at", DESCENDING)])
+        # Lets the tiering job page through the cold range instead of scanning the collection
+        await self.collection.create_index([("updated_at", ASCENDING), ("_id", ASCENDING)])
+        try:
+            await self.collection.database.create_collection(ARCHIVE_COLLECTION, storageEngine={
+                "wiredTiger": {"configString": f"block_compressor={settings.TIERING_ARCHIVE_COMPRESSOR}"},
+            })
+        except CollectionInvalid:
+            pass
+        # Cold notes are rarely read, so the archive keeps a single index
+        await self.archive.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
+
+    async def _promote(self, user_id: ObjectId, note_id: ObjectId) -> bool:
+        """Move an archived note back into the hot collection; False if it is in neither"""
+        note = await self.archive.find_one({"_id": note_id, "user_id": user_id})
+        if note is None:
+            return False
+        # Keeps the tiering job from archiving it again before it has had time to be used
+        note["promoted_at"] = datetime.utcnow()
+        async with read_router.write_session(self.client) as session:
+            try:
+                await self.collection.insert_one(note, session=session)
+                tiering_stats["promoted"] += 1
+            except DuplicateKeyError:
+                pass  # Promoted concurrently; the hot copy wins
+            await self.archive.delete_one({"_id": note_id}, session=session)
+            read_router.record_write(user_id, session)
+        return True
+
+    @_storage_errors
+    async def insert(self, note: dict) -> dict:
+        async with read_router.write_session(self.client) as session:
+            result = await self.collection.insert_one(note, session=session)
+            read_router.record_write(note["user_id"], session)
+        return {**note, "_id": result.inserted_id}
+
+    @_storage_errors
+    async def get(self, user_id: ObjectId, note_id: ObjectId) -> Optional[dict]:
+        note = await self.collection.find_one({"_id": note_id, "user_id": user_id})
+        if note is None and await self._promote(user_id, note_id):
+            note = await self.collection.find_one({"_id": note_id, "user_id": user_id})
+        return note
+
+    @_storage_errors
+    async def get_many(self, note_ids: List[ObjectId]) -> List[dict]:
+        notes = await self.collection.find({"_id": {"$in": note_ids}}).to_list(length=None)
+        missing = set(note_ids) - {note["_id"] for note in notes}
+        if missing:
+            notes += await self.archive.find({"_id": {"$in": list(missing)}}).to_list(length=None)
+        return notes
+
+    @_storage_errors
+    async def list_for_user(self, user_id: ObjectId, search: Optional[str] = None,
+                            tags: Optional[List[str]] = None, match_all_tags: bool = True,
+                            limit: Optional[int] = None, before: Optional[datetime] = None) -> List[dict]:
+        query_filter = {"user_id": user_id}
+        if tags:
+            query_filter["tags"] = {"$all" if match_all_tags else "$in": tags}
+        if search:
+            search_regex = {"$regex": search, "$options": "i"}  # Case-insensitive search
+            query_filter["$or"] = [{"title": search_regex}, {"content": search_regex}]
+        if before is not None:
+            query_filter["updated_at"] = {"$lt": before}
+        async with read_router.read(self.collection, "search" if search else "list", user_id) as (collection, session):
+            archive = self.archive.with_options(
+                read_preference=collection.read_preference, read_concern=collection.read_concern
+            )
+            cursor = collection.find(query_filter, session=session).sort("updated_at", DESCENDING)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            hot = await cursor.to_list(length=None)
+
+            if limit is not None and len(hot) == limit:
+                # A full page newer than anything archived needs nothing from the archive;
+                # the probe is covered by the archive's only index
+                probe = {"user_id": user_id}
+                if before is not None:
+                    probe["updated_at"] = {"$lt": before}
+                newest = await archive.find_one(
+                    probe, projection={"_id": 0, "updated_at": 1},
+                    sort=[("updated_at", DESCENDING)], session=session,
+                )
+                if newest is None or newest["updated_at"] < hot[-1]["updated_at"]:
+                    return hot
+
+            cursor = archive.find(query_filter, session=session).sort("updated_at", DESCENDING)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            archived = await cursor.to_list(length=None)
+
+        if archived:
+            tiering_stats["archive_reads"] += 1
+        # A note caught mid-move can be in both tiers; the hot copy wins
+        hot_ids = {note["_id"] for note in hot}
+        merged = heapq.merge(
+            hot, (note for note in archived if note["_id"] not in hot_ids),
+            key=lambda note: note["updated_at"], reverse=True,
+        )
+        return list(itertools.islice(merged, limit))
+
+    @_storage_errors
+    async def update(self, user_id: ObjectId, note_id: ObjectId, fields: dict,
+                     expected_version: Optional[int] = None) -> Optional[dict]:
+        query_filter = {"_id": note_id, "user_id": user_id}
+        if expected_version is not None:
+            query_filter.update(_version_filter(expected_version))
+        for attempt in range(2):
+            async with read_router.write_session(self.client) as session:
+                updated = await self.collection.find_one_and_update(
+                    query_filter,
+                    {"$set": fields, "$inc": {"version": 1}},
+                    return_document=ReturnDocument.AFTER,
+                    session=session,
+                )
+                read_router.record_write(user_id, session)
+            # Archived notes keep their version, so a version check still applies after promotion
+            if updated is not None or attempt or not await self._promote(user_id, note_id):
+                return updated
+
+    @_storage_errors
+    async def apply_autosaves(self, writes: List[Tuple[ObjectId, ObjectId, int, dict]]) -> List[Tuple[ObjectId, ObjectId]]:
+        if not writes:
+            return []
+        async with read_router.write_session(self.client) as session:
+            result = await self.collection.bulk_write(
+                [UpdateOne({"_id": note_id, "user_id": user_id, **_version_filter(base_version)}, {"$set": fields})
+                 for user_id, note_id, base_version, fields in writes],
+                ordered=False,
+                session=session,
+            )
+            for user_id in {write[0] for write in writes}:
+                read_router.record_write(user_id, session)
+        if result.matched_count == len(writes):
+            return []
+
+        # Unordered bulk writes do not say which updates matched; the ones that did are at their new version
+        versions = {
+            note["_id"]: note.get("version", 0)
+            async for note in self.collection.find(
+                {"_id": {"$in": [write[1] for write in writes]}}, projection={"version": 1}
+            )
+        }
+        missed = [write for write in writes if versions.get(write[1]) != write[3]["version"]]
+        conflicts = [(user_id, note_id) for user_id, note_id, _, _ in missed if note_id in versions]
+        # Notes archived since they were opened: promote them and write again
+        promoted = [write for write in missed if write[1] not in versions and await self._promote(write[0], write[1])]
+        if promoted:
+            conflicts += await self.apply_autosaves(promoted)
+        return conflicts
+
+    @_storage_errors
+    async def field_sizes(self, user_id: ObjectId, note_id: ObjectId) -> Optional[Tuple[int, Dict[str, int]]]:
+        for attempt in range(2):
+            # Sizes are computed server-side so the content never crosses the network
+            note = await self.collection.find_one(
+                {"_id": note_id, "user_id": user_id},
+                projection={
+                    "version": 1,
+                    "title": {"$strLenBytes": "$title"},
+                    "content": {"$strLenBytes": "$content"},
+                },
+            )
+            if note is not None:
+                return note.get("version", 0), {"title": note["title"], "content": note["content"]}
+            # Sizes are asked for just before an edit, so the note is promoted ahead of it
+            if attempt or not await self._promote(user_id, note_id):
+                return None
+
+    @_storage_errors
+    async def delete(self, user_id: ObjectId, note_id: ObjectId) -> Optional[DeletedNote]:
+        projection = {"size": {"$add": [{"$strLenBytes": "$title"}, {"$strLenBytes": "$content"}]}, "tags": 1}
+        async with read_router.write_session(self.client) as session:
+            deleted = await self.collection.find_one_and_delete(
+                {"_id": note_id, "user_id": user_id}, projection=projection, session=session,
+            )
+            # A note caught mid-move may have copies in both tiers
+            archived = await self.archive.find_one_and_delete(
+                {"_id": note_id, "user_id": user_id}, projection=projection, session=session,
+            )
+            read_router.record_write(user_id, session)
+        deleted = deleted or archived
+        return None if deleted is None else DeletedNote(deleted["size"], deleted.get("tags", []))
+
+
+class MongoUsersRepository(UsersRepository):
+    """Users stored in the `users` collection"""
+
+    def __init__(self, db):
+        self.collection = db.users
+        self.client = db.client
+
+    @_storage_errors
+    async def ensure_indexes(self):
+        await self.collection.create_index("email", unique=True)
+
+    @_storage_errors
+    async def create(self, user: dict) -> ObjectId:
+        try:
+            result = await self.collection.insert_one(user)
+        except DuplicateKeyError:
+            raise EmailAlreadyExistsError(user["email"])
+        return result.inserted_id
+
+    @_storage_errors
+    async def get(self, user_id: ObjectId) -> Optional[dict]:
+        return await self.collection.find_one({"_id": user_id})
+
+    @_storage_errors
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self.collection.find_one({"email": email})
+
+    @_storage_errors
+    async def apply_stats(self, changes: List[StatsChange]):
+        if not changes:
+            return
+        changes = [StatsChange(*change) for change in changes]
+        async with read_router.write_session(self.client) as session:
+            if len(changes) == 1:
+                user_id, *deltas = changes[0]
+                await self.collection.update_one({"_id": user_id}, stats_update(*deltas), session=session)
+            else:
+                await self.collection.bulk_write(
+                    [UpdateOne({"_id": user_id}, stats_update(*deltas)) for user_id, *deltas in changes],
+                    ordered=False,
+                    session=session,
+                )
+            # Later than the activity time just written, so the user's reads can stay causal
+            for user_id in {change[0] for change in changes}:
+                read_router.record_write(user_id, session)
+
+    @_storage_errors
+    async def tag_counts(self, user_id: ObjectId) -> Dict[str, int]:
+        async with read_router.read(self.collection, "stats", user_id) as (collection, session):
+            user = await collection.find_one({"_id": user_id}, projection={"tag_counts": 1}, session=session)
+        # Tags drop to zero rather than being unset, so removals need no extra write
+        return {tag: count for tag, count in ((user or {}).get("tag_counts") or {}).items() if count > 0}
+
+    @_storage_errors
+    async def set_stripe_customer_id(self, user_id: ObjectId, customer_id: str) -> Optional[str]:
+        # Only the first writer wins; everyone else adopts the stored id
+        updated = await self.collection.find_one_and_update(
+            {"_id": user_id, "stripe_customer_id": None},
+            {"$set": {"stripe_customer_id": customer_id}},
+            projection={"stripe_customer_id": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is not None:
+            return updated["stripe_customer_id"]
+        stored = await self.collection.find_one({"_id": user_id}, projection={"stripe_customer_id": 1})
+        return stored.get("stripe_customer_id") if stored else None
+
+
+async def ensure_repository_indexes(db):
+    """On-connect hook creating the indexes for the MongoDB repositories"""
+    for repository in (MongoNotesRepository(db), MongoUsersRepository(db)):
+        try:
+            await repository.ensure_indexes()
+        except StorageError:
+            pass
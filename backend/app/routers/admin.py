@@ -0,0 +1,163 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from ..core.dependencies import get_admin_user
+from ..database.connection import get_database
+from ..models.user import UserInDB
+from ..models.job import JobCreate, JobResponse, JobThrottle
+from ..services.jobs import (
+    InvalidJobParamsError, UnknownJobTypeError, cancel_job, enqueue_job, get_job, list_jobs, set_job_throttle
+)
+
+
+router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
+
+
+async def _database():
+    # Jobs and their checkpoints live in MongoDB whatever the storage backend
+    db = await get_database()
+    if db is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    return db
+
+
+def _job_id(job_id: str) -> ObjectId:
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID format"
+        )
+    return ObjectId(job_id)
+
+
+def _job_response(job: dict) -> JobResponse:
+    return JobResponse(**job)
+
+
+@router.get("/jobs", response_model=List[JobResponse])
+async def get_jobs(
+    state: Optional[Literal["pending", "running", "completed", "failed", "cancelled"]] = None,
+    limit: int = Query(50, ge=1, le=500),
+    admin: UserInDB = Depends(get_admin_user)
+):
+    """
+    List background jobs, most recent first
+    """
+    db = await _database()
+    try:
+        return [_job_response(job) for job in await list_jobs(db, state, limit)]
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve jobs"
+        )
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job_data: JobCreate,
+    admin: UserInDB = Depends(get_admin_user)
+):
+    """
+    Start a background job of a registered type
+    """
+    db = await _database()
+    try:
+        job = await enqueue_job(
+            db, job_data.type, job_data.params,
+            throttle=job_data.throttle.model_dump(exclude_none=True), created_by=admin.email
+        )
+        return _job_response(job)
+    except UnknownJobTypeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job type {job_data.type!r}"
+        )
+    except InvalidJobParamsError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create job"
+        )
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_progress(
+    job_id: str,
+    admin: UserInDB = Depends(get_admin_user)
+):
+    """
+    A job's state and per-step progress
+    """
+    db = await _database()
+    try:
+        job = await get_job(db, _job_id(job_id))
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve job"
+        )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return _job_response(job)
+
+
+@router.patch("/jobs/{job_id}/throttle", response_model=JobResponse)
+async def update_job_throttle(
+    job_id: str,
+    throttle: JobThrottle,
+    admin: UserInDB = Depends(get_admin_user)
+):
+    """
+    Change how fast an active job runs; applies from its next batch
+    """
+    db = await _database()
+    try:
+        job = await set_job_throttle(db, _job_id(job_id), throttle.model_dump(exclude_none=True))
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update job"
+        )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Active job not found"
+        )
+    return _job_response(job)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_active_job(
+    job_id: str,
+    admin: UserInDB = Depends(get_admin_user)
+):
+    """
+    Cancel an active job; it stops after the batch in progress
+    """
+    db = await _database()
+    try:
+        job = await cancel_job(db, _job_id(job_id))
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to cancel job"
+        )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Active job not found"
+        )
+    return _job_response(job)
@@ -0,0 +1,269 @@
+from typing import List
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from starlette.requests import ClientDisconnect
+
+from ..core.config import settings
+from ..core.dependencies import get_current_user
+from ..database.connection import get_database, get_notes_repository, get_users_repository
+from ..repositories.base import StorageError
+from ..models.user import UserInDB
+from ..models.attachment import AttachmentResponse
+from ..services.quotas import enforce_quota, record_note_activity
+from ..services.attachments import (
+    AttachmentTooLargeError, RangeNotSatisfiableError, clean_filename, delete_attachment, etag,
+    find_attachment, list_attachments, parse_range, store_attachment, stream_attachment
+)
+
+
+router = APIRouter(prefix="/api/v1/notes", tags=["attachments"])
+
+
+def _attachment_response(file_doc: dict) -> AttachmentResponse:
+    metadata = file_doc["metadata"]
+    return AttachmentResponse(
+        _id=file_doc["_id"],
+        note_id=metadata["note_id"],
+        filename=file_doc["filename"],
+        content_type=metadata["content_type"],
+        length=file_doc["length"],
+        uploaded_at=file_doc["uploadDate"]
+    )
+
+
+async def _owned_note(note_id: str, current_user: UserInDB):
+    """Validate the note id and return the database once the user is known to own the note"""
+    if not ObjectId.is_valid(note_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid note ID format"
+        )
+
+    # Attachments are stored in GridFS, so MongoDB is required even with in-memory notes
+    db = await get_database()
+    notes = await get_notes_repository()
+    if db is None or notes is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+
+    try:
+        note = await notes.get(current_user.id, ObjectId(note_id))
+    except StorageError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve note"
+        )
+    if not note:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+    return db
+
+
+def _attachment_id(attachment_id: str) -> ObjectId:
+    if not ObjectId.is_valid(attachment_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid attachment ID format"
+        )
+    return ObjectId(attachment_id)
+
+
+@router.post("/{note_id}/attachments", response_model=AttachmentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_attachment(
+    note_id: str,
+    request: Request,
+    filename: str = Query(..., min_length=1, description="Name of the uploaded file"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Attach a file to a note. The request body is the raw file content and
+    its Content-Type is stored with it. The body is streamed into GridFS
+    as it arrives, so uploads are never buffered whole.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > settings.ATTACHMENT_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Attachments are limited to {settings.ATTACHMENT_MAX_BYTES} bytes"
+            )
+        # Attachments count against the storage quota like note text
+        enforce_quota(current_user, added_bytes=int(content_length))
+
+    db = await _owned_note(note_id, current_user)
+    content_type = request.headers.get("content-type") or "application/octet-stream"
+
+    try:
+        file_doc = await store_attachment(
+            db, current_user.id, ObjectId(note_id), clean_filename(filename), content_type, request.stream()
+        )
+
+        # The note may have been deleted while the upload was in flight
+        if await (await get_notes_repository()).get(current_user.id, ObjectId(note_id)) is None:
+            await delete_attachment(db, current_user.id, ObjectId(note_id), file_doc["_id"])
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Note not found"
+            )
+
+        # Chunked uploads carry no length up front, so check what was actually stored
+        try:
+            enforce_quota(current_user, added_bytes=file_doc["length"])
+        except HTTPException:
+            await delete_attachment(db, current_user.id, ObjectId(note_id), file_doc["_id"])
+            raise
+        users = await get_users_repository()
+        if users is not None:
+            await record_note_activity(users, current_user.id, bytes_delta=file_doc["length"])
+
+        return _attachment_response(file_doc)
+
+    except AttachmentTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Attachments are limited to {settings.ATTACHMENT_MAX_BYTES} bytes"
+        )
+    except ClientDisconnect:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload was interrupted"
+        )
+    except (StorageError, PyMongoError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to store attachment"
+        )
+
+
+@router.get("/{note_id}/attachments", response_model=List[AttachmentResponse])
+async def get_attachments(
+    note_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    List the files attached to a note, oldest first
+    """
+    db = await _owned_note(note_id, current_user)
+
+    try:
+        attachments = await list_attachments(db, current_user.id, ObjectId(note_id))
+        return [_attachment_response(file_doc) for file_doc in attachments]
+
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve attachments"
+        )
+
+
+@router.get("/{note_id}/attachments/{attachment_id}")
+@router.head("/{note_id}/attachments/{attachment_id}")
+async def download_attachment(
+    note_id: str,
+    attachment_id: str,
+    request: Request,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Download an attachment. Supports a single byte range via Range (with
+    If-Range) and conditional requests via If-None-Match. The file is
+    streamed one GridFS chunk at a time.
+    """
+    file_id = _attachment_id(attachment_id)
+    db = await _owned_note(note_id, current_user)
+
+    try:
+        file_doc = await find_attachment(db, current_user.id, ObjectId(note_id), file_id)
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve attachment"
+        )
+    if file_doc is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment not found"
+        )
+
+    tag = etag(file_doc)
+    length = file_doc["length"]
+    headers = {
+        "ETag": tag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_doc['filename'])}",
+        # Uploaded content is served as data, never rendered as a page
+        "X-Content-Type-Options": "nosniff",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or tag in [value.strip() for value in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == tag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), length)
+        except RangeNotSatisfiableError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{length}"}
+            )
+
+    status_code = status.HTTP_200_OK
+    start, end = 0, length - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    media_type = file_doc["metadata"]["content_type"]
+    if request.method == "HEAD" or length == 0:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        stream_attachment(db, file_doc, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
+
+
+@router.delete("/{note_id}/attachments/{attachment_id}")
+async def remove_attachment(
+    note_id: str,
+    attachment_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Delete a file attached to a note
+    """
+    file_id = _attachment_id(attachment_id)
+    db = await _owned_note(note_id, current_user)
+
+    try:
+        deleted = await delete_attachment(db, current_user.id, ObjectId(note_id), file_id)
+    except PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete attachment"
+        )
+    if deleted is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment not found"
+        )
+
+    users = await get_users_repository()
+    if users is not None:
+        await record_note_activity(users, current_user.id, bytes_delta=-deleted["length"])
+
+    return {"message": "Attachment deleted successfully"}
@@ -1,12 +1,17 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import PyMongoError
 
-from ..core.auth import get_password_hash, verify_password, create_token_response
+from ..core.auth import get_password_hash, verify_password, create_token_response, decode_access_token
+from ..core.config import settings
 from ..core.dependencies import get_current_user
-from ..database.connection import get_database
-from ..models.user import UserCreate, UserLogin, UserResponse, UserInDB, Token
+from ..database.connection import get_database, get_users_repository
+from ..repositories.base import EmailAlreadyExistsError, StorageError
+from ..services.accounts import BILLABLE_STATUSES, enqueue_account_deletion
+from ..services.customers import provision_customer_in_background
+from ..services.tokens import issue_refresh_token, new_session_id, revoke_session, revoke_user, rotate_refresh_token
+from ..models.user import UserCreate, UserLogin, UserResponse, UserInDB, Token, RefreshRequest
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
@@ -16,20 +21,26 @@ router = APIRouter(prefix="/api/v1/auth", tags=["authentication"])
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register_user(user_data: UserCreate):
+async def register_user(user_data: UserCreate, background_tasks: BackgroundTasks):
     """
     Register a new user account
     """
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get user storage
+    users = await get_users_repository()
+    if users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
     # Check if user already exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    try:
+        existing_user = await users.get_by_email(user_data.email)
+    except StorageError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create user"
+        )
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -44,20 +55,21 @@ async def register_user(user_data: UserCreate):
     user_doc = {
         "email": user_data.email,
         "password_hash": password_hash,
+        "stats": {"note_count": 0, "total_bytes": 0, "last_activity": None},
         "created_at": now,
         "updated_at": now
     }
     
     try:
-        # Insert user into database
-        result = await db.users.insert_one(user_doc)
+        # Insert user into database; the unique email index is created on connect
+        user_id = await users.create(user_doc)
         
-        # Create index on email field for uniqueness (if not exists)
-        await db.users.create_index("email", unique=True)
+        # Create the Stripe customer up front so the first checkout skips it
+        background_tasks.add_task(provision_customer_in_background, user_id, user_data.email)
         
         return {"message": "User created successfully"}
         
-    except DuplicateKeyError:
+    except EmailAlreadyExistsError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -74,16 +86,22 @@ async def login_user(user_credentials: UserLogin):
     """
     Authenticate user and return JWT token
     """
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get user storage
+    users = await get_users_repository()
+    if users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
     # Find user by email
-    user_doc = await db.users.find_one({"email": user_credentials.email})
+    try:
+        user_doc = await users.get_by_email(user_credentials.email)
+    except StorageError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
     if not user_doc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -97,11 +115,86 @@ async def login_user(user_credentials: UserLogin):
             detail="Invalid email or password"
         )
     
+    # Refresh tokens live in MongoDB; without it the client logs in again when the access token expires
+    session_id = new_session_id()
+    refresh_token = None
+    db = await get_database()
+    if db is not None:
+        try:
+            refresh_token = await issue_refresh_token(db, user_doc["_id"], user_doc["email"], session_id)
+        except PyMongoError:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create session"
+            )
+    
     # Create and return token
-    token_response = create_token_response(user_credentials.email)
+    token_response = create_token_response(user_doc["email"], session_id, refresh_token)
     return token_response
 
 
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(request: RefreshRequest):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    Each refresh token works once; reusing one ends its session.
+    """
+    db = await get_database()
+    if db is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    try:
+        refreshed = await rotate_refresh_token(db, request.refresh_token)
+    except PyMongoError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    if refreshed is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+    
+    return create_token_response(refreshed.email, refreshed.session_id, refreshed.refresh_token)
+
+
+@router.post("/logout")
+async def logout_user(
+    all_sessions: bool = Query(False, description="End every session of the user, not just this one"),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """
+    End the session of the presented access token, or every session of the
+    user. Access and refresh tokens of ended sessions stop working at once
+    on this instance and within TOKEN_REVOCATION_SYNC_SECONDS on the others.
+    """
+    claims = decode_access_token(credentials.credentials)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+    
+    db = await get_database()
+    try:
+        if all_sessions or "sid" not in claims:
+            # Tokens from before sessions existed can only be ended along with the rest
+            await revoke_user(db, claims["sub"])
+        else:
+            await revoke_session(db, claims["sid"])
+    except PyMongoError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to end session"
+        )
+    
+    return {"message": "Logged out successfully"}
+
+
 @router.get("/me")
 async def get_current_user_info(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
@@ -118,16 +211,22 @@ async def get_current_user_info(credentials: HTTPAuthorizationCredentials = Depe
             detail="Could not validate credentials"
         )
     
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get user storage
+    users = await get_users_repository()
+    if users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
     # Find user in database
-    user_doc = await db.users.find_one({"email": email})
+    try:
+        user_doc = await users.get_by_email(email)
+    except StorageError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
     if user_doc is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -140,4 +239,36 @@ async def get_current_user_info(credentials: HTTPAuthorizationCredentials = Depe
         "email": user_doc["email"],
         "created_at": user_doc["created_at"].isoformat(),
         "updated_at": user_doc["updated_at"].isoformat()
-    }
\ No newline at end of file
+    }
+
+
+@router.delete("/me", status_code=status.HTTP_202_ACCEPTED)
+async def delete_account(current_user: UserInDB = Depends(get_current_user)):
+    """
+    Delete the authenticated user's account. Every session ends at once;
+    the account, notes, revisions and attachments are removed by a
+    background job in throttled batches.
+    """
+    if current_user.stripe_subscription_status in BILLABLE_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Cancel your subscription before deleting your account"
+        )
+    
+    # The deletion job works on MongoDB collections
+    db = await get_database()
+    if db is None or settings.STORAGE_BACKEND != "mongo":
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    try:
+        job = await enqueue_account_deletion(db, current_user.id, current_user.email)
+    except PyMongoError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete account"
+        )
+    
+    return {"message": "Account deletion started", "job_id": str(job["_id"])}
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Header
 from app.core.dependencies import get_current_user
-from app.models.user import UserInDB
+from app.models.user import UserInDB, UsageResponse
 from app.core.config import settings
 from app.database.connection import get_database
-import stripe
+from app.services.quotas import entitlements, plan_limits
+from app.services.catalog import catalog, apply_catalog_event
+from app.services.customers import ensure_customer
+from app.core.deadline import run_stripe, DeadlineExceeded
+from app.core.stripe_client import get_stripe
 import logging
 from datetime import datetime
 from pydantic import BaseModel
 
-logger = logging.getLogger("uvicorn.error")
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/v1/billing",
@@ -16,36 +20,17 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
-
 async def get_or_create_customer(user: UserInDB, db):
     """Get or create a Stripe customer for the user"""
     if user.stripe_customer_id:
         return user.stripe_customer_id
 
     try:
-        # Check if customer already exists in Stripe
-        existing_customers = stripe.Customer.list(email=user.email, limit=1)
-        if existing_customers.data:
-            customer = existing_customers.data[0]
-            customer_id = customer.id
-        else:
-            # Create new customer
-            customer = stripe.Customer.create(
-                email=user.email,
-                metadata={"user_id": str(user.id)},
-            )
-            customer_id = customer.id
-
-        # Save customer ID to database
-        await db.users.update_one(
-            {"_id": user.id},
-            {"$set": {"stripe_customer_id": customer_id}},
-        )
-        return customer_id
+        return await ensure_customer(user.id, user.email)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
-        logger.error(f"Stripe customer creation failed: {str(e)}")
+        logger.error("Stripe customer creation failed: %s", e)
         raise HTTPException(status_code=500, detail="Failed to initialize billing account")
 
 
@@ -60,6 +45,7 @@ async def create_checkout_session(
     user: UserInDB = Depends(get_current_user),
 ):
     """Create a Stripe Checkout Session for subscription"""
+    stripe = get_stripe()
     price_id = request_data.price_id
     lookup_key = request_data.lookup_key
 
@@ -69,25 +55,28 @@ async def create_checkout_session(
     try:
         # Resolve price_id from lookup_key if needed
         if lookup_key and not price_id:
-            # First try MongoDB products collection
-            product = await db.products.find_one({"lookup_key": lookup_key})
-            if product and "price_id" in product:
+            # First try the in-memory price catalog
+            product = catalog.get_by_lookup_key(lookup_key)
+            if product:
                 price_id = product["price_id"]
             else:
-                # Fallback to Stripe API
-                prices = stripe.Price.list(
+                # Fallback to Stripe API for prices the catalog has not seen yet
+                prices = await run_stripe(
+                    stripe.Price.list,
                     lookup_keys=[lookup_key],
-                    expand=["data.product"],
+                    limit=1,
                 )
                 if not prices.data:
                     raise HTTPException(status_code=400, detail="Invalid price lookup key")
                 price_id = prices.data[0].id
+                catalog.schedule_refresh()
 
         if not price_id:
             raise HTTPException(status_code=400, detail="Missing price_id or lookup_key")
 
         # Create Checkout Session
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = await run_stripe(
+            stripe.checkout.Session.create,
             customer=customer_id,
             line_items=[{"price": price_id, "quantity": 1}],
             mode="subscription",
@@ -96,34 +85,67 @@ async def create_checkout_session(
             metadata={"user_id": str(user.id)},
         )
         return {"url": checkout_session.url}
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except stripe.error.StripeError as e:
-        logger.error(f"Stripe Checkout Error: {str(e)}")
+        logger.error("Stripe Checkout Error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Checkout Session creation failed: {str(e)}")
+        logger.error("Checkout Session creation failed: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @router.post("/create-portal-session")
 async def customer_portal(user: UserInDB = Depends(get_current_user)):
     """Create a Stripe Customer Portal session"""
+    stripe = get_stripe()
     db = await get_database()
     customer_id = await get_or_create_customer(user, db)
 
     try:
-        portal_session = stripe.billing_portal.Session.create(
+        portal_session = await run_stripe(
+            stripe.billing_portal.Session.create,
             customer=customer_id,
             return_url=settings.FRONTEND_URL,
         )
         return {"url": portal_session.url}
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
-        logger.error(f"Portal Session Error: {str(e)}")
+        logger.error("Portal Session Error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create portal session")
 
 
+@router.get("/prices")
+async def list_prices(request: Request, response: Response):
+    """List the available subscription prices from the in-memory catalog"""
+    headers = {"Cache-Control": "public, max-age=300", "ETag": catalog.etag}
+    if request.headers.get("if-none-match") == catalog.etag:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return {"prices": catalog.public_prices()}
+
+
+@router.get("/usage", response_model=UsageResponse)
+async def get_usage(user: UserInDB = Depends(get_current_user)):
+    """Get the current plan, its limits and the user's usage"""
+    plan = entitlements.plan_for(user)
+    limits = plan_limits(plan)
+    return UsageResponse(
+        plan=plan,
+        max_notes=limits.max_notes,
+        max_bytes=limits.max_bytes,
+        note_count=user.stats.note_count,
+        total_bytes=user.stats.total_bytes,
+        last_activity=user.stats.last_activity,
+    )
+
+
 @router.post("/webhook")
 async def stripe_webhook(request: Request, stripe_signature: str = Header(None)):
     """Handle Stripe webhook events"""
+    stripe = get_stripe()
     payload = await request.body()
     sig_header = stripe_signature
     event = None
@@ -133,10 +155,10 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
         )
     except ValueError as e:
-        logger.error(f"Webhook Error: Invalid payload - {str(e)}")
+        logger.error("Webhook Error: Invalid payload - %s", e)
         raise HTTPException(status_code=400, detail="Invalid payload")
     except stripe.error.SignatureVerificationError as e:
-        logger.error(f"Webhook Error: Invalid signature - {str(e)}")
+        logger.error("Webhook Error: Invalid signature - %s", e)
         raise HTTPException(status_code=400, detail="Invalid signature")
 
     try:
@@ -165,16 +187,21 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
                 },
             )
             logger.info(
-                f"Subscription update for customer {customer_id}: {status} "
-                f"(Modified: {result.modified_count})"
+                "Subscription update for customer %s: %s (Modified: %d)",
+                customer_id, status, result.modified_count,
             )
 
+        elif event["type"].startswith(("price.", "product.")):
+            await apply_catalog_event(db, event)
+            await catalog.load(db)
+            logger.info("Price catalog refreshed after %s", event["type"])
+
         elif event["type"] == "invoice.payment_succeeded":
             # Optional: additional logic for successful payments
             pass
 
     except Exception as e:
-        logger.error(f"Webhook Processing Error: {str(e)}")
+        logger.error("Webhook Processing Error: %s", e)
         return {"status": "error", "detail": str(e)}
 
     return {"status": "success"}
\ No newline at end of file
@@ -1,17 +1,29 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from bson import ObjectId
 from pymongo.errors import PyMongoError
 
 from ..core.dependencies import get_current_user
-from ..database.connection import get_database
+from ..database.connection import get_database, get_notes_repository, get_users_repository
+from ..repositories.base import StorageError
 from ..models.user import UserInDB
-from ..models.note import NoteCreate, NoteUpdate, NoteResponse, NoteInDB
+from ..models.note import (
+    NoteCreate, NoteUpdate, NoteResponse, NoteInDB, AutosaveResponse, NotePatch, NotePatchResponse,
+    NoteRevisionSummary, NoteRevisionResponse, TagCount, normalize_tags
+)
+from ..services.autosave import autosave_buffer, AutosaveConflictError, NoteNotFoundError
+from ..services.textpatch import apply_edits, apply_unified_diff, PatchError
+from ..services.quotas import enforce_quota, note_size, record_note_activity, tag_delta
+from ..services.revisions import record_revision, list_revisions, materialize_revision, delete_revisions
+from ..services.attachments import delete_note_attachments
 
 
 router = APIRouter(prefix="/api/v1/notes", tags=["notes"])
 
+# Times a full update re-reads the note after losing a race with another write
+UPDATE_ATTEMPTS = 3
+
 
 @router.post("/", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
 async def create_note(
@@ -21,46 +33,50 @@ async def create_note(
     """
     Create a new note for the authenticated user
     """
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get storage
+    notes = await get_notes_repository()
+    users = await get_users_repository()
+    if notes is None or users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
+    # Check plan limits against the counters loaded with the user
+    size = note_size(note_data.title, note_data.content)
+    enforce_quota(current_user, added_notes=1, added_bytes=size)
+    
     # Create note document
     now = datetime.utcnow()
     note_doc = {
         "user_id": current_user.id,
         "title": note_data.title,
         "content": note_data.content,
+        "tags": note_data.tags,
+        "version": 1,
         "created_at": now,
         "updated_at": now
     }
     
     try:
-        # Insert note into database
-        result = await db.notes.insert_one(note_doc)
-        
-        # Retrieve the created note
-        created_note = await db.notes.find_one({"_id": result.inserted_id})
-        if not created_note:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to retrieve created note"
-            )
+        # Insert note into storage
+        created_note = await notes.insert(note_doc)
+        await record_note_activity(
+            users, current_user.id, notes_delta=1, bytes_delta=size, tags_delta=tag_delta([], note_data.tags)
+        )
         
         # Return note response
         return NoteResponse(
             _id=created_note["_id"],
             title=created_note["title"],
             content=created_note["content"],
+            tags=created_note.get("tags", []),
+            version=created_note.get("version", 0),
             created_at=created_note["created_at"],
             updated_at=created_note["updated_at"]
         )
         
-    except PyMongoError as e:
+    except StorageError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create note"
@@ -70,55 +86,93 @@ async def create_note(
 @router.get("/", response_model=List[NoteResponse])
 async def get_notes(
     search: Optional[str] = Query(None, description="Search term for title and content"),
+    tags: Optional[List[str]] = Query(None, description="Only notes carrying these tags"),
+    tag_match: Literal["all", "any"] = Query("all", description="Require all of the tags or any of them"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Return at most this many notes"),
+    before: Optional[datetime] = Query(None, description="Only notes updated before this; the last note's updated_at fetches the next page"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
-    Get all notes for the authenticated user, with optional search
+    Get the notes of the authenticated user, with optional search and tag filters,
+    a page at a time when a limit is given
     """
-    # Get database
-    db = await get_database()
-    if db is None:
+    if tags:
+        try:
+            tags = normalize_tags(tags)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    
+    # Get storage
+    notes = await get_notes_repository()
+    if notes is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
     try:
-        # Build query filter
-        query_filter = {"user_id": current_user.id}
-        
-        # Add search filter if provided
-        if search:
-            search_regex = {"$regex": search, "$options": "i"}  # Case-insensitive search
-            query_filter["$or"] = [
-                {"title": search_regex},
-                {"content": search_regex}
-            ]
-        
-        # Find notes for the user
-        cursor = db.notes.find(query_filter).sort("updated_at", -1)  # Sort by most recently updated
-        notes = await cursor.to_list(length=None)
+        # Find notes for the user, most recently updated first
+        user_notes = await notes.list_for_user(
+            current_user.id, search, tags=tags, match_all_tags=tag_match == "all",
+            limit=limit, before=before
+        )
         
         # Convert to response models
         note_responses = []
-        for note in notes:
+        for note in user_notes:
+            autosave_buffer.overlay(note)
             note_responses.append(NoteResponse(
                 _id=note["_id"],
                 title=note["title"],
                 content=note["content"],
+                tags=note.get("tags", []),
+                version=note.get("version", 0),
                 created_at=note["created_at"],
                 updated_at=note["updated_at"]
             ))
         
         return note_responses
         
-    except PyMongoError as e:
+    except StorageError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve notes"
         )
 
 
+@router.get("/tags", response_model=List[TagCount])
+async def get_tag_counts(
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Get the authenticated user's tags with the number of notes carrying each, most used first
+    """
+    # Get storage
+    users = await get_users_repository()
+    if users is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    try:
+        # Counts are maintained on every note write, so this is a single document read
+        counts = await users.tag_counts(current_user.id)
+        return [
+            TagCount(tag=tag, count=count)
+            for tag, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        ]
+        
+    except StorageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve tags"
+        )
+
+
 @router.get("/{note_id}", response_model=NoteResponse)
 async def get_note(
     note_id: str,
@@ -134,9 +188,9 @@ async def get_note(
             detail="Invalid note ID format"
         )
     
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get storage
+    notes = await get_notes_repository()
+    if notes is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
@@ -144,10 +198,7 @@ async def get_note(
     
     try:
         # Find note by ID and user_id to ensure ownership
-        note = await db.notes.find_one({
-            "_id": ObjectId(note_id),
-            "user_id": current_user.id
-        })
+        note = await notes.get(current_user.id, ObjectId(note_id))
         
         if not note:
             raise HTTPException(
@@ -155,16 +206,21 @@ async def get_note(
                 detail="Note not found"
             )
         
+        # Include autosaved changes that have not been flushed yet
+        autosave_buffer.overlay(note)
+        
         # Return note response
         return NoteResponse(
             _id=note["_id"],
             title=note["title"],
             content=note["content"],
+            tags=note.get("tags", []),
+            version=note.get("version", 0),
             created_at=note["created_at"],
             updated_at=note["updated_at"]
         )
         
-    except PyMongoError as e:
+    except StorageError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve note"
@@ -195,66 +251,348 @@ async def update_note(
             detail="At least one field must be provided for update"
         )
     
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get storage
+    notes = await get_notes_repository()
+    users = await get_users_repository()
+    if notes is None or users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
     try:
-        # First, verify the note exists and belongs to the user
-        existing_note = await db.notes.find_one({
-            "_id": ObjectId(note_id),
-            "user_id": current_user.id
-        })
-        
-        if not existing_note:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Note not found"
-            )
+        # Persist buffered autosaves first so they cannot overwrite this update later
+        await autosave_buffer.flush(current_user.id, ObjectId(note_id))
         
         # Add updated_at timestamp
         update_data["updated_at"] = datetime.utcnow()
         
-        # Update the note
-        result = await db.notes.update_one(
-            {"_id": ObjectId(note_id), "user_id": current_user.id},
-            {"$set": update_data}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update note"
+        # The revision is a delta from the state this update replaces, so the update
+        # only applies on top of the version that was read; a concurrent write re-reads
+        for attempt in range(UPDATE_ATTEMPTS):
+            # Verify the note exists and belongs to the user
+            existing_note = await notes.get(current_user.id, ObjectId(note_id))
+            if not existing_note:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Note not found"
+                )
+            
+            # Check plan limits for the size change
+            bytes_delta = note_size(
+                update_data.get("title", existing_note["title"]),
+                update_data.get("content", existing_note["content"])
+            ) - note_size(existing_note["title"], existing_note["content"])
+            enforce_quota(current_user, added_bytes=bytes_delta)
+            
+            updated_note = await notes.update(
+                current_user.id, ObjectId(note_id), update_data,
+                expected_version=existing_note.get("version", 0)
             )
-        
-        # Retrieve the updated note
-        updated_note = await db.notes.find_one({"_id": ObjectId(note_id)})
-        if not updated_note:
+            if updated_note is not None:
+                break
+        else:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to retrieve updated note"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Note was modified concurrently, retry the update"
             )
         
+        # Keep the previous state as a revision; history is only kept in MongoDB
+        db = await get_database()
+        if db is not None:
+            await record_revision(db, existing_note, updated_note["content"])
+        await record_note_activity(
+            users, current_user.id, bytes_delta=bytes_delta,
+            tags_delta=tag_delta(existing_note.get("tags", []), updated_note.get("tags", []))
+        )
+        
         # Return updated note response
         return NoteResponse(
             _id=updated_note["_id"],
             title=updated_note["title"],
             content=updated_note["content"],
+            tags=updated_note.get("tags", []),
+            version=updated_note.get("version", 0),
             created_at=updated_note["created_at"],
             updated_at=updated_note["updated_at"]
         )
         
-    except PyMongoError as e:
+    except (StorageError, PyMongoError) as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update note"
         )
 
 
+@router.patch("/{note_id}", response_model=NotePatchResponse)
+async def patch_note(
+    note_id: str,
+    note_patch: NotePatch,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Apply text edits or a unified diff to a note's content against a base version.
+    Returns 409 if the note has changed since the base version.
+    """
+    # Validate ObjectId format
+    if not ObjectId.is_valid(note_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid note ID format"
+        )
+    
+    # Get storage
+    notes = await get_notes_repository()
+    users = await get_users_repository()
+    if notes is None or users is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    try:
+        # Persist buffered autosaves so the version check sees the latest state
+        await autosave_buffer.flush(current_user.id, ObjectId(note_id))
+        
+        existing_note = await notes.get(current_user.id, ObjectId(note_id))
+        if not existing_note:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Note not found"
+            )
+        
+        current_version = existing_note.get("version", 0)
+        if current_version != note_patch.base_version:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Note is at version {current_version}, patch was based on {note_patch.base_version}"
+            )
+        
+        # Apply the edits server-side
+        update_data = {}
+        content = existing_note["content"]
+        try:
+            if note_patch.edits:
+                content = apply_edits(content, note_patch.edits)
+            elif note_patch.diff:
+                content = apply_unified_diff(content, note_patch.diff)
+        except PatchError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e)
+            )
+        
+        if not content:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Note content cannot be empty"
+            )
+        if content != existing_note["content"]:
+            update_data["content"] = content
+        if note_patch.title is not None:
+            update_data["title"] = note_patch.title
+        if note_patch.tags is not None:
+            update_data["tags"] = note_patch.tags
+        update_data["updated_at"] = datetime.utcnow()
+        
+        # Check plan limits for the size change
+        bytes_delta = note_size(
+            update_data.get("title", existing_note["title"]), content
+        ) - note_size(existing_note["title"], existing_note["content"])
+        enforce_quota(current_user, added_bytes=bytes_delta)
+        
+        # Only apply if nobody else has written since we read the note
+        updated_note = await notes.update(
+            current_user.id, ObjectId(note_id), update_data, expected_version=current_version
+        )
+        if updated_note is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Note was modified concurrently, retry against the latest version"
+            )
+        
+        # Keep the previous state as a revision; history is only kept in MongoDB
+        db = await get_database()
+        if db is not None:
+            await record_revision(db, existing_note, content)
+        await record_note_activity(
+            users, current_user.id, bytes_delta=bytes_delta,
+            tags_delta=tag_delta(existing_note.get("tags", []), updated_note.get("tags", []))
+        )
+        
+        return NotePatchResponse(
+            id=note_id,
+            version=current_version + 1,
+            content_length=len(content),
+            updated_at=update_data["updated_at"]
+        )
+        
+    except (StorageError, PyMongoError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to patch note"
+        )
+
+
+@router.get("/{note_id}/revisions", response_model=List[NoteRevisionSummary])
+async def get_note_revisions(
+    note_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    List the stored revisions of a note, newest first
+    """
+    # Validate ObjectId format
+    if not ObjectId.is_valid(note_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid note ID format"
+        )
+    
+    # Get storage; revision history lives in MongoDB
+    notes = await get_notes_repository()
+    db = await get_database()
+    if notes is None or db is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    try:
+        # Verify ownership before exposing history; archived notes are found too
+        note = await notes.get(current_user.id, ObjectId(note_id))
+        if not note:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Note not found"
+            )
+        
+        revisions = await list_revisions(db, ObjectId(note_id))
+        return [NoteRevisionSummary(**revision) for revision in revisions]
+        
+    except (StorageError, PyMongoError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve revisions"
+        )
+
+
+@router.get("/{note_id}/revisions/{version}", response_model=NoteRevisionResponse)
+async def get_note_revision(
+    note_id: str,
+    version: int,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Materialize a historical version of a note
+    """
+    # Validate ObjectId format
+    if not ObjectId.is_valid(note_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid note ID format"
+        )
+    
+    # Get storage; revision history lives in MongoDB
+    notes = await get_notes_repository()
+    db = await get_database()
+    if notes is None or db is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    try:
+        # Reconstruction walks back from the persisted state
+        await autosave_buffer.flush(current_user.id, ObjectId(note_id))
+        
+        note = await notes.get(current_user.id, ObjectId(note_id))
+        if not note:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Note not found"
+            )
+        
+        if version == note.get("version", 0):
+            revision = {
+                "version": version,
+                "title": note["title"],
+                "content": note["content"],
+                "updated_at": note["updated_at"],
+            }
+        else:
+            revision = await materialize_revision(db, note, version)
+            if revision is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Revision not found"
+                )
+        
+        return NoteRevisionResponse(id=note_id, **revision)
+        
+    except (StorageError, PyMongoError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve revision"
+        )
+
+
+@router.put("/{note_id}/autosave", response_model=AutosaveResponse, status_code=status.HTTP_202_ACCEPTED)
+async def autosave_note(
+    note_id: str,
+    note_update: NoteUpdate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Buffer an editor autosave for a note and acknowledge it immediately.
+    Rapid successive autosaves are coalesced and only the latest state is
+    written to the database once the editor goes quiet.
+    """
+    # Validate ObjectId format
+    if not ObjectId.is_valid(note_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid note ID format"
+        )
+    
+    # Check if at least one field is provided for update
+    update_data = note_update.dict(exclude_unset=True)
+    if not update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one field must be provided for update"
+        )
+    if "tags" in update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tags cannot be autosaved, use PUT or PATCH"
+        )
+    
+    try:
+        entry = await autosave_buffer.buffer_update(current_user, ObjectId(note_id), update_data)
+    except NoteNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+    except AutosaveConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Note was modified elsewhere and the previous autosave was not saved, reload it"
+        )
+    except StorageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection unavailable"
+        )
+    
+    return AutosaveResponse(
+        id=note_id,
+        version=entry.version,
+        updated_at=entry.updated_at
+    )
+
+
 @router.delete("/{note_id}")
 async def delete_note(
     note_id: str,
@@ -270,30 +608,40 @@ async def delete_note(
             detail="Invalid note ID format"
         )
     
-    # Get database
-    db = await get_database()
-    if db is None:
+    # Get storage
+    notes = await get_notes_repository()
+    users = await get_users_repository()
+    if notes is None or users is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database connection unavailable"
         )
     
     try:
-        # Delete the note (only if it belongs to the user)
-        result = await db.notes.delete_one({
-            "_id": ObjectId(note_id),
-            "user_id": current_user.id
-        })
+        # Delete the note (only if it belongs to the user), returning its size for the counters
+        deleted_note = await notes.delete(current_user.id, ObjectId(note_id))
         
-        if result.deleted_count == 0:
+        if deleted_note is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Note not found"
             )
         
+        # Drop any autosaves still waiting to be flushed, the note's history and its files
+        autosave_buffer.discard(current_user.id, ObjectId(note_id))
+        db = await get_database()
+        attachment_bytes = 0
+        if db is not None:
+            await delete_revisions(db, ObjectId(note_id))
+            attachment_bytes = await delete_note_attachments(db, current_user.id, ObjectId(note_id))
+        await record_note_activity(
+            users, current_user.id, notes_delta=-1, bytes_delta=-(deleted_note.size + attachment_bytes),
+            tags_delta=tag_delta(deleted_note.tags, [])
+        )
+        
         return {"message": "Note deleted successfully"}
         
-    except PyMongoError as e:
+    except (StorageError, PyMongoError) as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete note"
@@ -0,0 +1,63 @@
+from typing import List
+
+from bson import ObjectId
+
+from ..repositories.mongo import ARCHIVE_COLLECTION
+from .attachments import BUCKET_NAME, delete_files, delete_notes_attachments
+from .jobs import JobDefinition, JobStep, enqueue_job, object_id_param, register_job, string_param
+from .tokens import revoke_user
+
+# Subscriptions Stripe would keep billing after the account is gone
+BILLABLE_STATUSES = ("active", "trialing", "past_due")
+
+
+async def _delete_user(db, params: dict, users: List[dict]):
+    await db.users.delete_many({"_id": {"$in": [user["_id"] for user in users]}})
+    await db.refresh_tokens.delete_many({"email": params["email"]})
+
+
+def _delete_notes(collection: str):
+    async def delete(db, params: dict, notes: List[dict]):
+        # History and files first, so a retried batch still finds the notes that own them
+        user_id = ObjectId(params["user_id"])
+        note_ids = [note["_id"] for note in notes]
+        await db.note_revisions.delete_many({"note_id": {"$in": note_ids}})
+        await delete_notes_attachments(db, user_id, note_ids)
+        await db[collection].delete_many({"_id": {"$in": note_ids}, "user_id": user_id})
+    return delete
+
+
+async def _delete_attachments(db, params: dict, files: List[dict]):
+    await delete_files(db, [file_doc["_id"] for file_doc in files])
+
+
+register_job(JobDefinition(
+    type="delete_account",
+    description="Delete a user, then their notes with revisions and attachments, in throttled batches",
+    params={"user_id": object_id_param, "email": string_param},
+    steps=[
+        # The user goes first so no new notes can appear while the rest is removed
+        JobStep("user", "users", lambda params: {"_id": ObjectId(params["user_id"])},
+                _delete_user, projection={"_id": 1}, consumes=True),
+        JobStep("notes", "notes", lambda params: {"user_id": ObjectId(params["user_id"])},
+                _delete_notes("notes"), projection={"_id": 1}, consumes=True),
+        JobStep("archived notes", ARCHIVE_COLLECTION, lambda params: {"user_id": ObjectId(params["user_id"])},
+                _delete_notes(ARCHIVE_COLLECTION), projection={"_id": 1}, consumes=True),
+        # Uploads that finished after their note was deleted
+        JobStep("attachments", f"{BUCKET_NAME}.files", lambda params: {"metadata.user_id": ObjectId(params["user_id"])},
+                _delete_attachments, projection={"_id": 1}, consumes=True),
+    ],
+))
+
+
+async def enqueue_account_deletion(db, user_id: ObjectId, email: str) -> dict:
+    """
+    End every session of the user at once and queue the deletion of their
+    data. Requesting it again while it runs returns the same job.
+    """
+    job = await enqueue_job(
+        db, "delete_account", {"user_id": str(user_id), "email": email},
+        key=f"delete_account:{user_id}", created_by=email,
+    )
+    await revoke_user(db, email)
+    return job
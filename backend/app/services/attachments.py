@@ -0,0 +1,181 @@
+import logging
+import os
+import re
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Files live in attachments.files / attachments.chunks
+BUCKET_NAME = "attachments"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class AttachmentTooLargeError(Exception):
+    """The upload exceeded ATTACHMENT_MAX_BYTES"""
+
+
+class RangeNotSatisfiableError(Exception):
+    """The requested byte range lies outside the file"""
+
+
+def get_bucket(db) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(
+        db, bucket_name=BUCKET_NAME, chunk_size_bytes=settings.ATTACHMENT_CHUNK_SIZE_BYTES
+    )
+
+
+async def ensure_attachment_indexes(db):
+    """Create the index used to look up a note's attachments"""
+    if db is None:
+        return
+    try:
+        await db[f"{BUCKET_NAME}.files"].create_index(
+            [("metadata.user_id", ASCENDING), ("metadata.note_id", ASCENDING)]
+        )
+    except PyMongoError as e:
+        logger.error("Failed to create attachment indexes: %s", e)
+
+
+def clean_filename(filename: str) -> str:
+    """Drop any client-side directory and control characters from an uploaded file name"""
+    filename = os.path.basename(filename.replace("\\", "/"))
+    filename = "".join(ch for ch in filename if ch.isprintable()).strip()
+    return filename[:255] or "attachment"
+
+
+async def store_attachment(db, user_id: ObjectId, note_id: ObjectId, filename: str, content_type: str,
+                           chunks: AsyncIterator[bytes]) -> dict:
+    """
+    Stream an upload into GridFS as it arrives. Only the chunk being
+    assembled is held in memory, so file size does not affect worker memory.
+    A failed or oversized upload leaves nothing behind.
+    """
+    grid_in = get_bucket(db).open_upload_stream(
+        filename,
+        metadata={"user_id": user_id, "note_id": note_id, "content_type": content_type},
+    )
+    length = 0
+    try:
+        async for chunk in chunks:
+            length += len(chunk)
+            if length > settings.ATTACHMENT_MAX_BYTES:
+                raise AttachmentTooLargeError(filename)
+            if chunk:
+                await grid_in.write(chunk)
+        await grid_in.close()
+    except BaseException:
+        # Also covers client disconnects and cancellation
+        await grid_in.abort()
+        raise
+
+    return await db[f"{BUCKET_NAME}.files"].find_one({"_id": grid_in._id})
+
+
+async def find_attachment(db, user_id: ObjectId, note_id: ObjectId, attachment_id: ObjectId) -> Optional[dict]:
+    """The file document of an attachment, scoped to the owning user and note"""
+    return await db[f"{BUCKET_NAME}.files"].find_one({
+        "_id": attachment_id,
+        "metadata.user_id": user_id,
+        "metadata.note_id": note_id,
+    })
+
+
+async def list_attachments(db, user_id: ObjectId, note_id: ObjectId) -> List[dict]:
+    cursor = db[f"{BUCKET_NAME}.files"].find(
+        {"metadata.user_id": user_id, "metadata.note_id": note_id}
+    ).sort("uploadDate", ASCENDING)
+    return await cursor.to_list(length=None)
+
+
+async def delete_attachment(db, user_id: ObjectId, note_id: ObjectId, attachment_id: ObjectId) -> Optional[dict]:
+    """Delete an attachment and return its file document, or None if not found"""
+    file_doc = await find_attachment(db, user_id, note_id, attachment_id)
+    if file_doc is None:
+        return None
+    await get_bucket(db).delete(attachment_id)
+    return file_doc
+
+
+async def delete_files(db, file_ids: List[ObjectId]):
+    """Remove attachments by id without fetching them first"""
+    if not file_ids:
+        return
+    # File documents first so a partial cleanup never exposes a file with missing chunks
+    await db[f"{BUCKET_NAME}.files"].delete_many({"_id": {"$in": file_ids}})
+    await db[f"{BUCKET_NAME}.chunks"].delete_many({"files_id": {"$in": file_ids}})
+
+
+async def delete_notes_attachments(db, user_id: ObjectId, note_ids: List[ObjectId]) -> int:
+    """Remove every attachment of the given notes of a user and return the bytes freed"""
+    files = db[f"{BUCKET_NAME}.files"]
+    query = {"metadata.user_id": user_id, "metadata.note_id": {"$in": note_ids}}
+    found = [doc async for doc in files.find(query, projection={"_id": 1, "length": 1})]
+    await delete_files(db, [doc["_id"] for doc in found])
+    return sum(doc.get("length", 0) for doc in found)
+
+
+async def delete_note_attachments(db, user_id: ObjectId, note_id: ObjectId) -> int:
+    """
+    Remove every attachment of a deleted note and return the bytes freed.
+    Failures are logged and never fail the delete.
+    """
+    try:
+        return await delete_notes_attachments(db, user_id, [note_id])
+    except PyMongoError as e:
+        logger.error("Failed to delete attachments of note %s: %s", note_id, e)
+        return 0
+
+
+def etag(file_doc: dict) -> str:
+    # Stored files never change, so the id identifies the content
+    return f'"{file_doc["_id"]}"'
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    The inclusive (start, end) byte range requested by a Range header, or
+    None to send the whole file. Multiple or malformed ranges are ignored,
+    as HTTP allows; ranges entirely past the end are not satisfiable.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        # Suffix range: the final N bytes
+        start, end = max(length - int(last), 0), length - 1
+        if int(last) == 0:
+            raise RangeNotSatisfiableError(header)
+    else:
+        return None
+    if start >= length:
+        raise RangeNotSatisfiableError(header)
+    return start, end
+
+
+async def stream_attachment(db, file_doc: dict, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes start..end of a file one GridFS chunk at a time"""
+    grid_out = AsyncIOMotorGridOut(db[BUCKET_NAME], file_document=file_doc)
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(remaining, file_doc["chunkSize"]))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+
+from ..core.config import settings
+from ..database.connection import get_database, get_notes_repository, get_users_repository
+from ..repositories.base import StorageError
+from ..models.user import UserInDB
+from .quotas import enforce_quota, note_size
+from .revisions import record_revision
+
+logger = logging.getLogger(__name__)
+
+BufferKey = Tuple[ObjectId, ObjectId]
+
+# How long a conflicted autosave is remembered for the editor's next autosave to report it
+CONFLICT_RETENTION_SECONDS = 600
+
+# Revisions recorded at once after a flush, so a large batch never holds most of the connection pool
+REVISION_CONCURRENCY = 20
+
+
+class NoteNotFoundError(Exception):
+    """Raised when an autosave targets a note the user does not own"""
+
+
+class AutosaveConflictError(Exception):
+    """Raised when the note's previous autosave was dropped because it was written elsewhere"""
+
+
+class PendingWrite:
+    """Latest buffered state for a single (user, note) pair"""
+
+    __slots__ = ("user_id", "note_id", "fields", "base_version", "version", "updated_at",
+                 "first_buffered", "last_buffered", "size", "base_sizes")
+
+    def __init__(self, user_id: ObjectId, note_id: ObjectId, version: int, base_sizes: Dict[str, int]):
+        self.user_id = user_id
+        self.note_id = note_id
+        self.fields: dict = {}
+        # The persisted version the fields apply to; the flush only writes if the note is still there
+        self.base_version = version
+        self.version = version
+        self.updated_at = datetime.utcnow()
+        self.first_buffered = time.monotonic()
+        self.last_buffered = self.first_buffered
+        self.size = 0
+        # Persisted byte size of each field, used for quota checks without a read
+        self.base_sizes = base_sizes
+
+    def merge(self, fields: dict):
+        self.fields.update(fields)
+        self.version += 1
+        self.updated_at = datetime.utcnow()
+        self.last_buffered = time.monotonic()
+        self.size = sum(len(v) for v in self.fields.values() if isinstance(v, str))
+
+    def bytes_delta(self, fields: dict) -> int:
+        """Growth in stored bytes if `fields` were applied on top of the persisted note"""
+        merged = {**self.fields, **fields}
+        return sum(len(value.encode("utf-8")) - self.base_sizes.get(name, 0) for name, value in merged.items())
+
+    def persisted_sizes(self) -> Dict[str, int]:
+        """Field sizes once this entry has been flushed"""
+        sizes = dict(self.base_sizes)
+        sizes.update({name: len(value.encode("utf-8")) for name, value in self.fields.items()})
+        return sizes
+
+
+class AutosaveBuffer:
+    """
+    Coalesces rapid autosave updates per (user, note) in memory and flushes
+    only the latest state to MongoDB once the editor goes quiet, the entry
+    gets too old, or its buffered content grows past the size threshold
+    """
+
+    def __init__(self):
+        self._pending: Dict[BufferKey, PendingWrite] = {}
+        self._inflight: Dict[BufferKey, PendingWrite] = {}
+        # Notes whose buffered autosave lost to another write, with when it was dropped
+        self._conflicts: Dict[BufferKey, float] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def buffer_update(self, user: UserInDB, note_id: ObjectId, fields: dict) -> PendingWrite:
+        """Buffer an update and return the pending entry holding the new version"""
+        key = (user.id, note_id)
+        dropped_at = self._conflicts.pop(key, None)
+        if dropped_at is not None and time.monotonic() - dropped_at < CONFLICT_RETENTION_SECONDS:
+            # The editor's state is based on a version that was overwritten; it must reload first
+            raise AutosaveConflictError(str(note_id))
+        entry = self._pending.get(key)
+
+        if entry is None:
+            # Only the first update of a burst needs to hit MongoDB to check ownership
+            base = self._inflight.get(key)
+            if base is not None:
+                version, base_sizes = base.version, base.persisted_sizes()
+            else:
+                version, base_sizes = await self._load_version(user.id, note_id)
+            entry = PendingWrite(user.id, note_id, version, base_sizes)
+
+        enforce_quota(user, added_bytes=entry.bytes_delta(fields))
+
+        # Another request may have buffered while we were awaiting MongoDB
+        entry = self._pending.setdefault(key, entry)
+        entry.merge(fields)
+        if entry.size >= settings.AUTOSAVE_MAX_PENDING_BYTES:
+            self._wakeup.set()
+        return entry
+
+    async def _load_version(self, user_id: ObjectId, note_id: ObjectId) -> Tuple[int, Dict[str, int]]:
+        notes = await get_notes_repository()
+        if notes is None:
+            raise StorageError("Database connection unavailable")
+
+        sizes = await notes.field_sizes(user_id, note_id)
+        if sizes is None:
+            raise NoteNotFoundError(str(note_id))
+        return sizes
+
+    def overlay(self, note: dict) -> dict:
+        """Apply any buffered, not yet persisted fields on top of a note document"""
+        key = (note.get("user_id"), note.get("_id"))
+        for source in (self._inflight.get(key), self._pending.get(key)):
+            if source is not None:
+                note.update(source.fields)
+                note["version"] = source.version
+                note["updated_at"] = source.updated_at
+        return note
+
+    def discard(self, user_id: ObjectId, note_id: ObjectId):
+        """Drop buffered and in-flight state for a note, e.g. after it has been deleted"""
+        key = (user_id, note_id)
+        self._pending.pop(key, None)
+        # A failing flush only requeues entries still in flight, so this one is not resurrected
+        self._inflight.pop(key, None)
+        self._conflicts.pop(key, None)
+
+    def _drop_conflicted(self, key: BufferKey):
+        """
+        Forget a write that lost to a newer one made elsewhere, together with
+        anything buffered on top of it, and report it on the next autosave
+        """
+        if self._inflight.get(key) is None:
+            return  # Discarded while in flight
+        now = time.monotonic()
+        self._pending.pop(key, None)
+        self._conflicts = {k: t for k, t in self._conflicts.items() if now - t < CONFLICT_RETENTION_SECONDS}
+        self._conflicts[key] = now
+        logger.warning("Autosave of note %s conflicted with a newer write; dropped", key[1])
+
+    def _due_keys(self, force: bool = False):
+        now = time.monotonic()
+        due = []
+        for key, entry in self._pending.items():
+            if (
+                force
+                or now - entry.last_buffered >= settings.AUTOSAVE_DEBOUNCE_SECONDS
+                or now - entry.first_buffered >= settings.AUTOSAVE_MAX_DELAY_SECONDS
+                or entry.size >= settings.AUTOSAVE_MAX_PENDING_BYTES
+            ):
+                due.append(key)
+        return due
+
+    async def flush(self, user_id: Optional[ObjectId] = None, note_id: Optional[ObjectId] = None,
+                    force: bool = False) -> int:
+        """
+        Persist due buffered entries with a single bulk write.
+        Passing user_id and note_id flushes just that note regardless of age.
+        """
+        async with self._flush_lock:
+            flushed, revisions = await self._flush_batch(user_id, note_id, force)
+
+        # Revision history lives in MongoDB only, and is written without holding up the next flush
+        db = await get_database()
+        if db is not None:
+            for start in range(0, len(revisions), REVISION_CONCURRENCY):
+                await asyncio.gather(*(
+                    record_revision(db, note, new_content)
+                    for note, new_content in revisions[start:start + REVISION_CONCURRENCY]
+                ))
+        return flushed
+
+    async def _flush_batch(self, user_id: Optional[ObjectId], note_id: Optional[ObjectId],
+                           force: bool) -> Tuple[int, list]:
+        """Write one batch; returns how many notes were written and the revisions to record"""
+        if note_id is not None:
+            keys = [(user_id, note_id)] if (user_id, note_id) in self._pending else []
+        else:
+            keys = self._due_keys(force)
+        if not keys:
+            return 0, []
+
+        batch = {key: self._pending.pop(key) for key in keys}
+        self._inflight.update(batch)
+
+        try:
+            notes = await get_notes_repository()
+            users = await get_users_repository()
+            if notes is None or users is None:
+                raise StorageError("Database connection unavailable")
+
+            # One read for the whole batch so the replaced states land in revision history
+            previous = {
+                (note["user_id"], note["_id"]): note
+                for note in await notes.get_many([entry.note_id for entry in batch.values()])
+            }
+
+            conflicts = set(await notes.apply_autosaves([
+                (entry.user_id, entry.note_id, entry.base_version, {
+                    **entry.fields,
+                    "version": entry.version,
+                    "updated_at": entry.updated_at,
+                })
+                for entry in batch.values()
+            ]))
+
+            revisions = []
+            stats_changes = []
+            for key, entry in batch.items():
+                note = previous.get(key)
+                if note is None or key in conflicts:
+                    continue
+                new_title = entry.fields.get("title", note["title"])
+                new_content = entry.fields.get("content", note["content"])
+                bytes_delta = note_size(new_title, new_content) - note_size(note["title"], note["content"])
+                stats_changes.append((entry.user_id, 0, bytes_delta, entry.updated_at))
+                revisions.append((note, new_content))
+            if stats_changes:
+                try:
+                    await users.apply_stats(stats_changes)
+                except StorageError as e:
+                    # The notes are persisted; the reconciler will correct the counters
+                    logger.error("Autosave stats update failed: %s", e)
+            for key in conflicts:
+                self._drop_conflicted(key)
+            return len(batch) - len(conflicts), revisions
+        except StorageError as e:
+            logger.error("Autosave flush failed for %d notes: %s", len(batch), e)
+            # Requeue unless a newer update has superseded the failed entry
+            for key, entry in batch.items():
+                if self._inflight.get(key) is not entry:
+                    continue  # Discarded while in flight
+                newer = self._pending.get(key)
+                if newer is None:
+                    self._pending[key] = entry
+                else:
+                    entry.fields.update(newer.fields)
+                    newer.fields = entry.fields
+                    newer.first_buffered = entry.first_buffered
+            return 0, []
+        finally:
+            for key in batch:
+                self._inflight.pop(key, None)
+
+    async def _run(self):
+        tick = max(min(settings.AUTOSAVE_DEBOUNCE_SECONDS / 2, 1.0), 0.05)
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Autosave flusher error: %s", e)
+
+    def start(self):
+        """Start the background flusher task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and persist everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(force=True)
+        if self._pending:
+            logger.error("Autosave shutdown left %d notes unflushed", len(self._pending))
+
+
+autosave_buffer = AutosaveBuffer()
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from pymongo.errors import PyMongoError
+
+from ..core.config import settings
+from ..core.deadline import detached_task
+from ..database.connection import get_database
+
+logger = logging.getLogger(__name__)
+
+# Fields of a products document that are safe to show on the pricing page
+PUBLIC_FIELDS = ("lookup_key", "price_id", "name", "description", "amount", "currency", "interval")
+
+
+def plan_for_lookup_key(lookup_key: str) -> str:
+    """Derive the plan name from a price lookup key, e.g. pro_plus_monthly -> pro_plus"""
+    for suffix in ("_monthly", "_yearly", "_annual"):
+        if lookup_key.endswith(suffix):
+            return lookup_key[: -len(suffix)]
+    return lookup_key
+
+
+class PriceCatalog:
+    """
+    In-memory copy of the products collection written by scripts/seed_stripe.py.
+    Loaded at startup, refreshed periodically and on Stripe price/product
+    webhooks, so checkout never has to query MongoDB or Stripe for prices.
+    Archived and replaced prices stay in the collection with `active: false`:
+    checkout no longer offers them, but subscribers still on them keep the
+    plan they pay for.
+    """
+
+    def __init__(self):
+        self._by_lookup_key: Dict[str, dict] = {}
+        self._by_price_id: Dict[str, dict] = {}
+        self._public: List[dict] = []
+        self.etag: str = '"empty"'
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def load(self, db) -> bool:
+        """Replace the catalog with the current contents of the products collection"""
+        if db is None:
+            return False
+        try:
+            products = await db.products.find({}, projection={"_id": 0}).to_list(length=None)
+        except PyMongoError as e:
+            logger.error("Failed to load price catalog: %s", e)
+            return False
+
+        products = [p for p in products if p.get("lookup_key") and p.get("price_id")]
+        products.sort(key=lambda p: (p.get("amount", 0), p["lookup_key"]))
+        active = [p for p in products if p.get("active", True)]
+
+        public = [{field: p.get(field) for field in PUBLIC_FIELDS} for p in active]
+        # Swap in fully built maps so readers never see a partial catalog
+        self._by_lookup_key = {p["lookup_key"]: p for p in active}
+        self._by_price_id = {p["price_id"]: p for p in products}
+        self._public = public
+        self.etag = '"' + hashlib.sha1(
+            json.dumps(public, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest() + '"'
+        self.loaded_at = time.monotonic()
+        return True
+
+    def get_by_lookup_key(self, lookup_key: str) -> Optional[dict]:
+        """Active price for a lookup key, the only kind checkout may use"""
+        return self._by_lookup_key.get(lookup_key)
+
+    def get_by_price_id(self, price_id: str) -> Optional[dict]:
+        return self._by_price_id.get(price_id)
+
+    def plan_for_price(self, price_id: str) -> Optional[str]:
+        """Plan of any price the catalog has seen, archived ones included; None if unknown"""
+        product = self._by_price_id.get(price_id)
+        return plan_for_lookup_key(product["lookup_key"]) if product else None
+
+    def public_prices(self) -> List[dict]:
+        return self._public
+
+    def schedule_refresh(self):
+        """Reload the catalog in the background, coalescing concurrent requests"""
+        if self._refresh is None or self._refresh.done():
+            async def refresh():
+                await self.load(await get_database())
+            self._refresh = detached_task(refresh())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.CATALOG_REFRESH_SECONDS)
+            await self.load(await get_database())
+
+    def start(self):
+        """Start the periodic refresh task"""
+        if self._task is None and settings.CATALOG_REFRESH_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic refresh task"""
+        for task in (self._task, self._refresh):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._refresh = None
+
+
+async def apply_catalog_event(db, event: dict):
+    """
+    Mirror a Stripe price.* or product.* webhook event into the products
+    collection. Rows are never deleted, only marked inactive, so existing
+    subscriptions on an archived price still resolve to their plan.
+    """
+    event_type = event["type"]
+    obj = event["data"]["object"]
+
+    if event_type.startswith("price."):
+        if event_type == "price.deleted" or not obj.get("active", True):
+            await db.products.update_many({"price_id": obj["id"]}, {"$set": {"active": False}})
+        elif obj.get("lookup_key"):
+            recurring = obj.get("recurring") or {}
+            product_id = obj["product"] if isinstance(obj["product"], str) else obj["product"]["id"]
+            # The lookup key moved to this price: the one it replaces stays as an inactive row
+            await db.products.update_many(
+                {"lookup_key": obj["lookup_key"], "price_id": {"$ne": obj["id"]}},
+                {"$set": {"active": False}},
+            )
+            await db.products.update_one(
+                {"price_id": obj["id"]},
+                {"$set": {
+                    "price_id": obj["id"],
+                    "lookup_key": obj["lookup_key"],
+                    "product_id": product_id,
+                    "amount": obj.get("unit_amount"),
+                    "currency": obj.get("currency"),
+                    "interval": recurring.get("interval"),
+                    "active": True,
+                }},
+                upsert=True,
+            )
+    elif event_type.startswith("product."):
+        if event_type == "product.deleted" or not obj.get("active", True):
+            await db.products.update_many({"product_id": obj["id"]}, {"$set": {"active": False}})
+        else:
+            await db.products.update_many(
+                {"product_id": obj["id"]},
+                {"$set": {"name": obj.get("name"), "description": obj.get("description")}},
+            )
+
+
+catalog = PriceCatalog()
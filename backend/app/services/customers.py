@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Dict
+
+from bson import ObjectId
+
+from ..core.config import settings
+from ..core.deadline import detached_task
+from ..core.stripe_client import get_stripe
+from ..database.connection import get_users_repository
+
+logger = logging.getLogger(__name__)
+
+# One provisioning task per user; concurrent callers await the same task
+_inflight: Dict[ObjectId, asyncio.Task] = {}
+
+
+async def _provision(user_id: ObjectId, email: str) -> str:
+    users = await get_users_repository()
+    if users is None:
+        raise RuntimeError("Database connection unavailable")
+
+    # Another instance may have finished provisioning since the user was loaded
+    user_doc = await users.get(user_id)
+    if user_doc and user_doc.get("stripe_customer_id"):
+        return user_doc["stripe_customer_id"]
+
+    stripe = get_stripe()
+    # Reuse a customer created for this email before the id was stored
+    existing_customers = await asyncio.to_thread(stripe.Customer.list, email=email, limit=1)
+    if existing_customers.data:
+        customer_id = existing_customers.data[0].id
+    else:
+        # The idempotency key makes retries and racing instances return the same customer
+        customer = await asyncio.to_thread(
+            stripe.Customer.create,
+            email=email,
+            metadata={"user_id": str(user_id)},
+            idempotency_key=f"customer-create-{user_id}",
+        )
+        customer_id = customer.id
+
+    # Only the first writer wins; everyone else adopts the stored id
+    stored = await users.set_stripe_customer_id(user_id, customer_id)
+    return stored or customer_id
+
+
+async def ensure_customer(user_id: ObjectId, email: str) -> str:
+    """
+    Return the user's Stripe customer id, creating the customer if needed.
+    Concurrent calls for the same user share a single provisioning run.
+    """
+    task = _inflight.get(user_id)
+    if task is None:
+        # Detached so one caller's deadline does not govern the shared run
+        task = detached_task(_provision(user_id, email))
+        _inflight[user_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(user_id, None))
+    # Shield so a cancelled request does not abort provisioning for the others
+    return await asyncio.shield(task)
+
+
+async def provision_customer_in_background(user_id: ObjectId, email: str):
+    """Eagerly provision a customer after registration so the first checkout skips Stripe"""
+    if not settings.STRIPE_SECRET_KEY:
+        return
+    try:
+        await ensure_customer(user_id, email)
+    except Exception as e:
+        # Checkout will retry provisioning on demand
+        logger.error("Background Stripe customer provisioning failed for %s: %s", user_id, e)
@@ -0,0 +1,414 @@
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from ..core.config import settings
+from ..database.connection import get_database
+
+logger = logging.getLogger(__name__)
+
+# pending -> running -> completed | failed | cancelled
+ACTIVE_STATES = ("pending", "running")
+
+# Counters surfaced by the health check
+job_stats = {"claimed": 0, "completed": 0, "failed": 0, "retried": 0, "documents": 0}
+
+
+class JobStep(NamedTuple):
+    """
+    One pass over a collection. Documents matching `query(params)` are
+    fetched in _id order, `batch_size` at a time, and handed to `apply`,
+    which must be idempotent: a batch interrupted by a crash runs again.
+    Steps whose `apply` removes the documents from the query (deletions)
+    set `consumes`, so every batch starts from the top and needs no sort.
+    Steps whose query ranges over an indexed field can walk in (`sort`, _id)
+    order instead, so each batch is an index range rather than a scan.
+    """
+    name: str
+    collection: str
+    query: Callable[[dict], dict]
+    apply: Callable[[object, dict, List[dict]], Awaitable[None]]
+    projection: Optional[dict] = None
+    consumes: bool = False
+    sort: str = "_id"
+
+
+class JobDefinition(NamedTuple):
+    type: str
+    steps: List[JobStep]
+    description: str = ""
+    # Required params and the converter each value must pass
+    params: Dict[str, Callable[[Any], Any]] = {}
+
+
+class UnknownJobTypeError(Exception):
+    """No job definition is registered under the requested type"""
+
+
+class InvalidJobParamsError(ValueError):
+    """The params are missing a value the job type requires, or hold one it cannot use"""
+
+
+def object_id_param(value) -> str:
+    if not isinstance(value, str) or not ObjectId.is_valid(value):
+        raise ValueError("must be an ObjectId string")
+    return value
+
+
+def string_param(value) -> str:
+    if not isinstance(value, str) or not value:
+        raise ValueError("must be a non-empty string")
+    return value
+
+
+def positive_int_param(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError("must be a positive integer")
+    return value
+
+
+def validate_params(definition: JobDefinition, params: dict) -> dict:
+    """Check params against the job type before it is persisted, so a bad job never starts"""
+    validated = dict(params)
+    for name, convert in definition.params.items():
+        if name not in params:
+            raise InvalidJobParamsError(f"Missing param {name!r}")
+        try:
+            validated[name] = convert(params[name])
+        except (TypeError, ValueError, InvalidId) as e:
+            raise InvalidJobParamsError(f"Param {name!r} {e}")
+    return validated
+
+
+JOB_TYPES: Dict[str, JobDefinition] = {}
+
+
+def register_job(definition: JobDefinition):
+    JOB_TYPES[definition.type] = definition
+
+
+async def ensure_job_indexes(db):
+    """Create the indexes used to claim and look up jobs"""
+    if db is None:
+        return
+    try:
+        await db.jobs.create_index([("state", ASCENDING), ("created_at", ASCENDING)])
+        # Held only while a job is active, so at most one active job per key
+        await db.jobs.create_index("key", unique=True, sparse=True)
+    except PyMongoError as e:
+        logger.error("Failed to create job indexes: %s", e)
+
+
+async def enqueue_job(db, job_type: str, params: dict, key: Optional[str] = None,
+                      throttle: Optional[dict] = None, created_by: Optional[str] = None) -> dict:
+    """
+    Persist a new job for the runner. With a key, an active job holding the
+    same key is returned instead of starting a second one.
+    """
+    definition = JOB_TYPES.get(job_type)
+    if definition is None:
+        raise UnknownJobTypeError(job_type)
+    params = validate_params(definition, params)
+
+    now = datetime.utcnow()
+    job = {
+        "type": job_type,
+        "params": params,
+        "state": "pending",
+        "step": 0,
+        "checkpoint": None,
+        "progress": [{"name": step.name, "processed": 0, "total": None} for step in definition.steps],
+        "throttle": throttle or {},
+        "attempts": 0,
+        "error": None,
+        "owner": None,
+        "lease_expires_at": None,
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+    if key is not None:
+        job["key"] = key
+    try:
+        result = await db.jobs.insert_one(job)
+    except DuplicateKeyError:
+        existing = await db.jobs.find_one({"key": key})
+        if existing is not None:
+            return existing
+        raise
+    job_runner.wake()
+    return {**job, "_id": result.inserted_id}
+
+
+async def get_job(db, job_id: ObjectId) -> Optional[dict]:
+    return await db.jobs.find_one({"_id": job_id})
+
+
+async def list_jobs(db, state: Optional[str] = None, limit: int = 50) -> List[dict]:
+    query = {"state": state} if state else {}
+    return await db.jobs.find(query).sort("created_at", DESCENDING).limit(limit).to_list(length=None)
+
+
+async def cancel_job(db, job_id: ObjectId) -> Optional[dict]:
+    """Stop an active job; the runner notices at its next checkpoint"""
+    now = datetime.utcnow()
+    return await db.jobs.find_one_and_update(
+        {"_id": job_id, "state": {"$in": list(ACTIVE_STATES)}},
+        {"$set": {"state": "cancelled", "finished_at": now, "updated_at": now}, "$unset": {"key": ""}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def set_job_throttle(db, job_id: ObjectId, throttle: dict) -> Optional[dict]:
+    """Change an active job's throttle; the runner applies it from the next batch"""
+    return await db.jobs.find_one_and_update(
+        {"_id": job_id, "state": {"$in": list(ACTIVE_STATES)}},
+        {"$set": {**{f"throttle.{field}": value for field, value in throttle.items()}, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+class JobRunner:
+    """
+    Runs persisted jobs one batch at a time. A job is leased by one instance;
+    every batch records its checkpoint and renews the lease, so a job whose
+    instance crashed is resumed by any instance once the lease runs out.
+    Batches are spaced to stay under the job's documents-per-second limit.
+    Each instance runs up to JOB_CONCURRENCY jobs at once, so a long pass
+    does not hold up the jobs queued behind it.
+    """
+
+    def __init__(self):
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def wake(self):
+        """Look for work now rather than at the next poll"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _claim(self, db) -> Optional[dict]:
+        now = datetime.utcnow()
+        job = await db.jobs.find_one_and_update(
+            {
+                "state": {"$in": list(ACTIVE_STATES)},
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            [{"$set": {
+                "state": "running",
+                "owner": self.instance_id,
+                "lease_expires_at": now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                "updated_at": now,
+                "started_at": {"$ifNull": ["$started_at", now]},
+            }}],
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            job_stats["claimed"] += 1
+        return job
+
+    async def _update(self, db, job: dict, update: dict, lease_seconds: float = 0) -> Optional[dict]:
+        """Apply an update while still holding the lease; None once the job was cancelled or taken over"""
+        now = datetime.utcnow()
+        update.setdefault("$set", {}).update({
+            "lease_expires_at": now + timedelta(seconds=settings.JOB_LEASE_SECONDS + lease_seconds),
+            "updated_at": now,
+        })
+        return await db.jobs.find_one_and_update(
+            {"_id": job["_id"], "owner": self.instance_id, "state": "running"},
+            update,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _fetch(self, db, step: JobStep, query: dict, checkpoint, batch_size: int) -> List[dict]:
+        if step.consumes:
+            cursor = db[step.collection].find(query, projection=step.projection)
+        elif step.sort == "_id":
+            if checkpoint is not None:
+                query = {**query, "_id": {"$gt": checkpoint}}
+            cursor = db[step.collection].find(query, projection=step.projection).sort("_id", ASCENDING)
+        else:
+            if checkpoint is not None:
+                value, last_id = checkpoint
+                query = {"$and": [query, {"$or": [
+                    {step.sort: {"$gt": value}},
+                    {step.sort: value, "_id": {"$gt": last_id}},
+                ]}]}
+            cursor = db[step.collection].find(query, projection=step.projection).sort(
+                [(step.sort, ASCENDING), ("_id", ASCENDING)]
+            )
+        return await cursor.limit(batch_size).to_list(length=None)
+
+    @staticmethod
+    def _checkpoint(step: JobStep, last: dict):
+        return last["_id"] if step.sort == "_id" else [last[step.sort], last["_id"]]
+
+    async def _execute(self, db, job: dict):
+        definition = JOB_TYPES.get(job["type"])
+        if definition is None:
+            raise UnknownJobTypeError(job["type"])
+        params = job["params"]
+
+        while job["step"] < len(definition.steps):
+            index = job["step"]
+            step = definition.steps[index]
+            query = step.query(params)
+
+            if job["progress"][index]["total"] is None:
+                total = await db[step.collection].count_documents(query)
+                job = await self._update(db, job, {"$set": {f"progress.{index}.total": total}})
+                if job is None:
+                    return
+
+            while True:
+                throttle = job.get("throttle") or {}
+                batch_size = throttle.get("batch_size") or settings.JOB_BATCH_SIZE
+                rate = throttle.get("docs_per_second", settings.JOB_MAX_DOCS_PER_SECOND)
+                started = time.monotonic()
+
+                batch = await self._fetch(db, step, query, job.get("checkpoint"), batch_size)
+                if not batch:
+                    break
+                await step.apply(db, params, batch)
+                job_stats["documents"] += len(batch)
+
+                pause = max(len(batch) / rate - (time.monotonic() - started), 0) if rate > 0 else 0
+                job = await self._update(db, job, {
+                    "$set": {"checkpoint": self._checkpoint(step, batch[-1])},
+                    "$inc": {f"progress.{index}.processed": len(batch)},
+                }, lease_seconds=pause)
+                if job is None:
+                    return
+                if pause:
+                    await asyncio.sleep(pause)
+
+            job = await self._update(db, job, {"$set": {"step": index + 1, "checkpoint": None}})
+            if job is None:
+                return
+
+        now = datetime.utcnow()
+        await self._update(db, job, {
+            "$set": {"state": "completed", "finished_at": now, "owner": None, "error": None},
+            "$unset": {"key": ""},
+        })
+        job_stats["completed"] += 1
+        logger.info("Job %s (%s) completed", job["_id"], job["type"])
+
+    async def _failed(self, db, job: dict, error: Exception):
+        """Retry from the last checkpoint after a backoff, or give up after JOB_MAX_ATTEMPTS"""
+        attempts = job.get("attempts", 0) + 1
+        now = datetime.utcnow()
+        if attempts >= settings.JOB_MAX_ATTEMPTS or isinstance(error, UnknownJobTypeError):
+            job_stats["failed"] += 1
+            logger.error("Job %s (%s) failed: %s", job["_id"], job["type"], error)
+            update = {
+                "$set": {"state": "failed", "attempts": attempts, "error": str(error),
+                         "owner": None, "finished_at": now, "updated_at": now},
+                "$unset": {"key": ""},
+            }
+        else:
+            job_stats["retried"] += 1
+            logger.warning("Job %s (%s) will retry after error: %s", job["_id"], job["type"], error)
+            update = {"$set": {
+                "attempts": attempts, "error": str(error), "owner": None, "updated_at": now,
+                "lease_expires_at": now + timedelta(seconds=min(5 * 2 ** attempts, 300)),
+            }}
+        try:
+            await db.jobs.update_one({"_id": job["_id"], "owner": self.instance_id}, update)
+        except PyMongoError as e:
+            logger.error("Failed to record failure of job %s: %s", job["_id"], e)
+
+    async def _run_job(self, db, job: dict):
+        try:
+            await self._execute(db, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._failed(db, job, e)
+
+    async def run_once(self, db) -> bool:
+        """Claim and run one job to its end; False when there was nothing to run"""
+        job = await self._claim(db)
+        if job is None:
+            return False
+        await self._run_job(db, job)
+        return True
+
+    def _finished(self, task: asyncio.Task):
+        self._running.discard(task)
+        # A slot is free for the next queued job
+        self.wake()
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    db = await get_database()
+                    while db is not None and len(self._running) < max(settings.JOB_CONCURRENCY, 1):
+                        job = await self._claim(db)
+                        if job is None:
+                            break
+                        task = asyncio.create_task(self._run_job(db, job))
+                        self._running.add(task)
+                        task.add_done_callback(self._finished)
+                except PyMongoError as e:
+                    logger.error("Job runner failed to claim work: %s", e)
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            for task in list(self._running):
+                task.cancel()
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def start(self):
+        """Start the background runner"""
+        if self._task is None and settings.JOB_POLL_SECONDS > 0:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background runner. An interrupted job keeps its checkpoint
+        and is resumed once its lease expires.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+
+        # Hand interrupted jobs over at once instead of waiting out the lease
+        db = await get_database()
+        if db is not None:
+            try:
+                await db.jobs.update_many(
+                    {"owner": self.instance_id, "state": "running"},
+                    {"$set": {"owner": None, "lease_expires_at": None}},
+                )
+            except PyMongoError as e:
+                logger.error("Failed to release job leases: %s", e)
+
+
+job_runner = JobRunner()
@@ -0,0 +1,271 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ReadPreference, UpdateOne
+
+from ..core.config import settings
+from ..database.connection import get_database
+from ..models.user import UserInDB
+from ..repositories.base import StatsChange, StorageError, UsersRepository
+from ..repositories.mongo import ARCHIVE_COLLECTION
+from .attachments import BUCKET_NAME
+from .catalog import catalog
+
+logger = logging.getLogger(__name__)
+
+# Subscription statuses that still grant the paid plan
+ACTIVE_SUBSCRIPTION_STATUSES = {"active", "trialing", "past_due"}
+
+RECONCILE_BATCH_SIZE = 500
+
+
+class PlanLimits(NamedTuple):
+    max_notes: Optional[int]
+    max_bytes: Optional[int]
+
+
+def _limit(value: int) -> Optional[int]:
+    return value if value > 0 else None
+
+
+def plan_limits(plan: str) -> PlanLimits:
+    """Limits configured for a plan; None means unlimited"""
+    if plan == "pro_plus":
+        return PlanLimits(_limit(settings.QUOTA_PRO_PLUS_MAX_NOTES), _limit(settings.QUOTA_PRO_PLUS_MAX_BYTES))
+    if plan == "pro":
+        return PlanLimits(_limit(settings.QUOTA_PRO_MAX_NOTES), _limit(settings.QUOTA_PRO_MAX_BYTES))
+    return PlanLimits(_limit(settings.QUOTA_FREE_MAX_NOTES), _limit(settings.QUOTA_FREE_MAX_BYTES))
+
+
+def note_size(title: str, content: str) -> int:
+    """Bytes a note counts against the storage quota"""
+    return len(title.encode("utf-8")) + len(content.encode("utf-8"))
+
+
+def tag_delta(before: List[str], after: List[str]) -> Dict[str, int]:
+    """Changes to the per-tag counts when a note's tags go from before to after"""
+    delta = {tag: -1 for tag in set(before) - set(after)}
+    delta.update({tag: 1 for tag in set(after) - set(before)})
+    return delta
+
+
+class EntitlementCache:
+    """
+    Resolves a user's plan from the subscription fields already loaded by
+    get_current_user and the in-memory price catalog, so quota checks
+    never query the database
+    """
+
+    def __init__(self):
+        self._entitlements: Dict[tuple, str] = {}
+        self._catalog_loaded_at: Optional[float] = None
+
+    def plan_for(self, user: UserInDB) -> str:
+        """Plan the user is currently entitled to"""
+        if self._catalog_loaded_at != catalog.loaded_at:
+            # Catalog was reloaded, prices may map to different plans now
+            self._entitlements.clear()
+            self._catalog_loaded_at = catalog.loaded_at
+
+        key = (user.stripe_price_id, user.stripe_subscription_status)
+        plan = self._entitlements.get(key)
+        if plan is not None:
+            return plan
+
+        if not user.stripe_price_id or user.stripe_subscription_status not in ACTIVE_SUBSCRIPTION_STATUSES:
+            plan = "free"
+        else:
+            plan = catalog.plan_for_price(user.stripe_price_id)
+            if plan is None:
+                # Archived prices stay in the catalog, so this one has never been seen: grant no
+                # paid limits for it, refresh in the background and leave it uncached
+                catalog.schedule_refresh()
+                return "free"
+
+        self._entitlements[key] = plan
+        return plan
+
+
+entitlements = EntitlementCache()
+
+
+def enforce_quota(user: UserInDB, added_notes: int = 0, added_bytes: int = 0):
+    """
+    Reject a write that would take the user over their plan limits.
+    Reads only the counters on the already loaded user document.
+    """
+    limits = plan_limits(entitlements.plan_for(user))
+
+    if added_notes > 0 and limits.max_notes is not None:
+        if user.stats.note_count + added_notes > limits.max_notes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Note limit of {limits.max_notes} reached for your plan"
+            )
+
+    if added_bytes > 0 and limits.max_bytes is not None:
+        if user.stats.total_bytes + added_bytes > limits.max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Storage limit reached for your plan"
+            )
+
+
+async def record_note_activity(users: UsersRepository, user_id: ObjectId, notes_delta: int = 0, bytes_delta: int = 0,
+                               tags_delta: Optional[Dict[str, int]] = None):
+    """Atomically apply a note write to the user's counters and tag counts"""
+    try:
+        await users.apply_stats([StatsChange(user_id, notes_delta, bytes_delta, tags_delta=tags_delta)])
+    except StorageError as e:
+        # The reconciler will correct the drift
+        logger.error("Failed to update stats for user %s: %s", user_id, e)
+
+
+def _stats_source(db):
+    """
+    The notes collection read from the primary. The reconcilers write their
+    results back as absolute values, so a lagging secondary would undo every
+    counter increment made within its staleness window.
+    """
+    return db.notes.with_options(read_preference=ReadPreference.PRIMARY)
+
+
+# Archived notes still count against their owner
+_BOTH_TIERS = {"$unionWith": {"coll": ARCHIVE_COLLECTION}}
+
+# One row per note or attachment with what it counts against the user
+_NOTE_USAGE = {"$project": {
+    "user_id": 1,
+    "updated_at": 1,
+    "notes": {"$literal": 1},
+    "bytes": {"$add": [{"$strLenBytes": "$title"}, {"$strLenBytes": "$content"}]},
+}}
+_ATTACHMENT_USAGE = {"$project": {"user_id": "$metadata.user_id", "notes": {"$literal": 0}, "bytes": "$length"}}
+
+
+async def reconcile_user_stats(db) -> int:
+    """Recompute every user's counters from both tiers of notes and their attachments"""
+    started = datetime.utcnow()
+    pipeline = [
+        _NOTE_USAGE,
+        {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [_NOTE_USAGE]}},
+        {"$unionWith": {"coll": f"{BUCKET_NAME}.files", "pipeline": [_ATTACHMENT_USAGE]}},
+        {"$group": {
+            "_id": "$user_id",
+            "note_count": {"$sum": "$notes"},
+            "total_bytes": {"$sum": "$bytes"},
+            "last_activity": {"$max": "$updated_at"},
+        }},
+    ]
+
+    reconciled = 0
+    operations = []
+    async for row in _stats_source(db).aggregate(pipeline, allowDiskUse=True):
+        operations.append(UpdateOne(
+            {"_id": row["_id"]},
+            {
+                "$set": {
+                    "stats.note_count": row["note_count"],
+                    "stats.total_bytes": row["total_bytes"],
+                    "stats.reconciled_at": started,
+                },
+                "$max": {"stats.last_activity": row["last_activity"]},
+            },
+        ))
+        if len(operations) >= RECONCILE_BATCH_SIZE:
+            await db.users.bulk_write(operations, ordered=False)
+            reconciled += len(operations)
+            operations = []
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        reconciled += len(operations)
+
+    # Users without any notes were not part of the aggregation
+    result = await db.users.update_many(
+        {"$or": [
+            {"stats.reconciled_at": {"$lt": started}},
+            {"stats.reconciled_at": {"$exists": False}},
+        ]},
+        {"$set": {"stats.note_count": 0, "stats.total_bytes": 0, "stats.reconciled_at": started}},
+    )
+    return reconciled + result.modified_count
+
+
+async def reconcile_tag_counts(db) -> int:
+    """Recompute every user's per-tag note counts from both tiers of notes"""
+    started = datetime.utcnow()
+    pipeline = [
+        _BOTH_TIERS,
+        {"$match": {"tags.0": {"$exists": True}}},
+        {"$unwind": "$tags"},
+        {"$group": {"_id": {"user_id": "$user_id", "tag": "$tags"}, "count": {"$sum": 1}}},
+        {"$group": {"_id": "$_id.user_id", "counts": {"$push": {"k": "$_id.tag", "v": "$count"}}}},
+        {"$project": {"tag_counts": {"$arrayToObject": "$counts"}}},
+    ]
+
+    reconciled = 0
+    operations = []
+    async for row in _stats_source(db).aggregate(pipeline, allowDiskUse=True):
+        operations.append(UpdateOne(
+            {"_id": row["_id"]},
+            {"$set": {"tag_counts": row["tag_counts"], "stats.tags_reconciled_at": started}},
+        ))
+        if len(operations) >= RECONCILE_BATCH_SIZE:
+            await db.users.bulk_write(operations, ordered=False)
+            reconciled += len(operations)
+            operations = []
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+        reconciled += len(operations)
+
+    # Users without tagged notes were not part of the aggregation
+    result = await db.users.update_many(
+        {"$or": [
+            {"stats.tags_reconciled_at": {"$lt": started}},
+            {"stats.tags_reconciled_at": {"$exists": False}},
+        ]},
+        {"$set": {"tag_counts": {}, "stats.tags_reconciled_at": started}},
+    )
+    return reconciled + result.modified_count
+
+
+class StatsReconciler:
+    """Background job that periodically corrects drift in the user counters"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                db = await get_database()
+                if db is not None:
+                    count = await reconcile_user_stats(db)
+                    logger.info("Reconciled note statistics for %d users", count)
+                    count = await reconcile_tag_counts(db)
+                    logger.info("Reconciled tag counts for %d users", count)
+            except Exception as e:
+                logger.error("Stats reconciliation failed: %s", e)
+            await asyncio.sleep(settings.STATS_RECONCILE_INTERVAL_SECONDS)
+
+    def start(self):
+        """Start the background reconciliation task"""
+        if self._task is None and settings.STATS_RECONCILE_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background reconciliation task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+stats_reconciler = StatsReconciler()
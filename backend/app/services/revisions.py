@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A reverse delta is a list of [start_line, end_line, replacement] entries that
+# turn the newer content back into the older one when applied to its lines.
+Delta = List[list]
+
+
+def compute_reverse_delta(old: str, new: str) -> Delta:
+    """Compute the line-level delta that rebuilds `old` from `new`"""
+    new_lines = new.splitlines(keepends=True)
+    old_lines = old.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, new_lines, old_lines, autojunk=False)
+
+    delta = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            delta.append([i1, i2, "".join(old_lines[j1:j2])])
+    return delta
+
+
+def apply_reverse_delta(content: str, delta: Delta) -> str:
+    """Rebuild an older version of the content from a newer one"""
+    lines = content.splitlines(keepends=True)
+    # Apply from the end so earlier line indexes stay valid
+    for start, end, replacement in reversed(delta):
+        lines[start:end] = [replacement]
+    return "".join(lines)
+
+
+def delta_size(delta: Delta) -> int:
+    return sum(len(replacement) for _, _, replacement in delta) + 16 * len(delta)
+
+
+async def ensure_revision_indexes(db):
+    """Create the indexes used by the revisions collection"""
+    if db is None:
+        return
+    try:
+        await db.note_revisions.create_index(
+            [("note_id", ASCENDING), ("version", DESCENDING)], unique=True
+        )
+        if settings.REVISIONS_MAX_AGE_DAYS > 0:
+            await db.note_revisions.create_index(
+                "recorded_at", expireAfterSeconds=settings.REVISIONS_MAX_AGE_DAYS * 86400
+            )
+    except PyMongoError as e:
+        logger.error("Failed to create revision indexes: %s", e)
+
+
+async def record_revision(db, previous: dict, new_content: str):
+    """
+    Store the note state in `previous` as a revision of the note whose
+    content is now `new_content`. Most revisions are reverse deltas; a
+    full snapshot is stored every REVISIONS_SNAPSHOT_INTERVAL revisions,
+    or whenever the delta would not be smaller than the content itself.
+    Failures are logged and never fail the update that triggered them.
+    """
+    try:
+        version = previous.get("version", 0)
+        old_content = previous["content"]
+
+        last = await db.note_revisions.find_one(
+            {"note_id": previous["_id"]},
+            projection={"chain": 1},
+            sort=[("version", DESCENDING)],
+        )
+        chain = (last["chain"] + 1) if last else settings.REVISIONS_SNAPSHOT_INTERVAL
+
+        revision = {
+            "note_id": previous["_id"],
+            "user_id": previous["user_id"],
+            "version": version,
+            "title": previous["title"],
+            "updated_at": previous["updated_at"],
+            "recorded_at": datetime.utcnow(),
+        }
+
+        delta = None
+        if chain < settings.REVISIONS_SNAPSHOT_INTERVAL:
+            # Diffing large notes is CPU heavy, keep it off the event loop
+            delta = await asyncio.to_thread(compute_reverse_delta, old_content, new_content)
+            if delta_size(delta) >= len(old_content):
+                delta = None
+
+        if delta is None:
+            revision.update(kind="snapshot", chain=0, content=old_content, size=len(old_content))
+        else:
+            revision.update(kind="delta", chain=chain, delta=delta, size=delta_size(delta))
+
+        await db.note_revisions.update_one(
+            {"note_id": previous["_id"], "version": version},
+            {"$setOnInsert": revision},
+            upsert=True,
+        )
+        if revision["kind"] == "snapshot":
+            # Prune once per snapshot interval to keep the write path cheap
+            await _enforce_retention(db, previous["_id"])
+    except PyMongoError as e:
+        logger.error("Failed to record revision for note %s: %s", previous.get("_id"), e)
+
+
+async def _enforce_retention(db, note_id: ObjectId):
+    """
+    Drop the oldest revisions beyond REVISIONS_MAX_PER_NOTE. Reverse deltas
+    only depend on newer revisions, so pruning from the old end never
+    breaks reconstruction of the revisions that remain.
+    """
+    limit = settings.REVISIONS_MAX_PER_NOTE
+    if limit <= 0:
+        return
+
+    cutoff = await db.note_revisions.find_one(
+        {"note_id": note_id},
+        projection={"version": 1},
+        sort=[("version", DESCENDING)],
+        skip=limit - 1,
+    )
+    if cutoff:
+        await db.note_revisions.delete_many(
+            {"note_id": note_id, "version": {"$lt": cutoff["version"]}}
+        )
+
+
+async def list_revisions(db, note_id: ObjectId) -> List[dict]:
+    """List stored revisions of a note, newest first, without their payloads"""
+    cursor = db.note_revisions.find(
+        {"note_id": note_id},
+        projection={"version": 1, "title": 1, "kind": 1, "size": 1, "updated_at": 1},
+    ).sort("version", DESCENDING)
+    return await cursor.to_list(length=None)
+
+
+async def materialize_revision(db, note: dict, version: int) -> Optional[dict]:
+    """
+    Rebuild the title and content of a historical version of `note`.
+    Starts from the nearest snapshot at or above the target version (or the
+    current content) and walks reverse deltas down to it.
+    """
+    target = await db.note_revisions.find_one(
+        {"note_id": note["_id"], "version": version},
+        projection={"delta": 0, "content": 0},
+    )
+    if target is None:
+        return None
+
+    snapshot = await db.note_revisions.find_one(
+        {"note_id": note["_id"], "kind": "snapshot", "version": {"$gte": version}},
+        sort=[("version", ASCENDING)],
+    )
+    if snapshot is not None:
+        content = snapshot["content"]
+        upper = snapshot["version"]
+    else:
+        content = note["content"]
+        upper = note.get("version", 0) + 1
+
+    if upper > version:
+        cursor = db.note_revisions.find(
+            {"note_id": note["_id"], "version": {"$gte": version, "$lt": upper}},
+            projection={"delta": 1, "kind": 1, "version": 1},
+        ).sort("version", DESCENDING)
+        async for revision in cursor:
+            content = apply_reverse_delta(content, revision["delta"])
+
+    return {
+        "version": version,
+        "title": target["title"],
+        "content": content,
+        "updated_at": target["updated_at"],
+    }
+
+
+async def delete_revisions(db, note_id: ObjectId):
+    """Remove all revisions of a deleted note"""
+    try:
+        await db.note_revisions.delete_many({"note_id": note_id})
+    except PyMongoError as e:
+        logger.error("Failed to delete revisions for note %s: %s", note_id, e)
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from ..core.config import settings
+from ..core.stripe_client import get_stripe
+from ..database.connection import get_database
+
+logger = logging.getLogger(__name__)
+
+STRIPE_PAGE_SIZE = 100
+USER_BATCH_SIZE = 1000
+REPORT_SAMPLE_SIZE = 50
+
+# Higher wins when a customer has several subscriptions
+STATUS_PRIORITY = {
+    "active": 5,
+    "trialing": 4,
+    "past_due": 3,
+    "unpaid": 2,
+    "incomplete": 1,
+}
+
+# User fields mirrored from Stripe
+SUBSCRIPTION_FIELDS = ("stripe_subscription_id", "stripe_subscription_status", "stripe_price_id")
+
+# (status, price_id, subscription_id, created)
+SubscriptionState = Tuple[str, Optional[str], str, int]
+
+
+class RateLimiter:
+    """Spaces out calls so at most `rate` happen per second"""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self._interval
+
+
+def _better(candidate: SubscriptionState, current: Optional[SubscriptionState]) -> bool:
+    if current is None:
+        return True
+    return (STATUS_PRIORITY.get(candidate[0], 0), candidate[3]) > (STATUS_PRIORITY.get(current[0], 0), current[3])
+
+
+async def _list_page(limiter: RateLimiter, starting_after: Optional[str]):
+    """Fetch one page of subscriptions, backing off when Stripe rate limits us"""
+    params = {"status": "all", "limit": STRIPE_PAGE_SIZE}
+    if starting_after:
+        params["starting_after"] = starting_after
+
+    stripe = get_stripe()
+    for attempt in range(5):
+        await limiter.wait()
+        try:
+            return await asyncio.to_thread(stripe.Subscription.list, **params)
+        except stripe.error.RateLimitError:
+            await asyncio.sleep(2 ** attempt)
+    raise RuntimeError("Stripe rate limit persisted while listing subscriptions")
+
+
+async def fetch_subscription_states(limiter: RateLimiter) -> Tuple[Dict[str, SubscriptionState], int]:
+    """Page through every Stripe subscription and keep the most relevant one per customer"""
+    states: Dict[str, SubscriptionState] = {}
+    scanned = 0
+    starting_after = None
+
+    while True:
+        page = await _list_page(limiter, starting_after)
+        for subscription in page.data:
+            scanned += 1
+            items = subscription["items"]["data"]
+            state = (
+                subscription["status"],
+                items[0]["price"]["id"] if items else None,
+                subscription["id"],
+                subscription.get("created", 0),
+            )
+            customer_id = subscription["customer"]
+            if _better(state, states.get(customer_id)):
+                states[customer_id] = state
+        if not page.has_more or not page.data:
+            break
+        starting_after = page.data[-1]["id"]
+
+    return states, scanned
+
+
+def _correction(user: dict, state: Optional[SubscriptionState]) -> Optional[dict]:
+    """Fields that must change for the user to match Stripe, or None if in sync"""
+    if state is None:
+        expected = {"stripe_subscription_status": "canceled"}
+    else:
+        status, price_id, subscription_id, _ = state
+        expected = {
+            "stripe_subscription_id": subscription_id,
+            "stripe_subscription_status": status,
+            "stripe_price_id": price_id,
+        }
+    changes = {field: value for field, value in expected.items() if user.get(field) != value}
+    return changes or None
+
+
+async def reconcile_subscriptions(db, dry_run: bool = False) -> dict:
+    """
+    Compare every user's subscription fields with Stripe and correct drift
+    in batched bulk writes. With dry_run, only report what would change.
+    """
+    started = time.monotonic()
+    # Users written after this (by webhooks) are newer than the Stripe snapshot
+    snapshot_at = datetime.utcnow()
+    limiter = RateLimiter(settings.STRIPE_RECONCILE_REQUESTS_PER_SECOND)
+    states, scanned = await fetch_subscription_states(limiter)
+
+    report = {
+        "dry_run": dry_run,
+        "subscriptions_scanned": scanned,
+        "customers": len(states),
+        "users_checked": 0,
+        "corrections": 0,
+        "applied": 0,
+        "skipped_newer": 0,
+        "sample": [],
+    }
+    operations: List[UpdateOne] = []
+
+    async def flush():
+        if operations and not dry_run:
+            result = await db.users.bulk_write(operations, ordered=False)
+            report["applied"] += result.modified_count
+        operations.clear()
+
+    def check(user: dict, state: Optional[SubscriptionState]):
+        report["users_checked"] += 1
+        if user.get("updated_at") is not None and user["updated_at"] >= snapshot_at:
+            report["skipped_newer"] += 1
+            return
+        changes = _correction(user, state)
+        if not changes:
+            return
+        report["corrections"] += 1
+        if len(report["sample"]) < REPORT_SAMPLE_SIZE:
+            report["sample"].append({
+                "user_id": str(user["_id"]),
+                "stripe_customer_id": user["stripe_customer_id"],
+                "before": {field: user.get(field) for field in changes},
+                "after": changes,
+            })
+        # Only if the user still holds what was read, so a webhook landing mid-scan is never reverted
+        operations.append(UpdateOne(
+            {
+                "_id": user["_id"],
+                **{field: user.get(field) for field in SUBSCRIPTION_FIELDS},
+                "$or": [{"updated_at": {"$lt": snapshot_at}}, {"updated_at": None}],
+            },
+            {"$set": {**changes, "updated_at": datetime.utcnow()}},
+        ))
+
+    projection = {"stripe_customer_id": 1, "updated_at": 1, **{field: 1 for field in SUBSCRIPTION_FIELDS}}
+
+    # Customers Stripe knows about, matched against users in chunks
+    customer_ids = list(states)
+    for offset in range(0, len(customer_ids), USER_BATCH_SIZE):
+        chunk = customer_ids[offset:offset + USER_BATCH_SIZE]
+        async for user in db.users.find({"stripe_customer_id": {"$in": chunk}}, projection=projection):
+            check(user, states[user["stripe_customer_id"]])
+        if len(operations) >= USER_BATCH_SIZE:
+            await flush()
+
+    # Users that still look subscribed but have no subscription left in Stripe
+    cursor = db.users.find(
+        {
+            "stripe_customer_id": {"$ne": None},
+            "stripe_subscription_status": {"$nin": [None, "canceled"]},
+        },
+        projection=projection,
+    )
+    async for user in cursor:
+        if user["stripe_customer_id"] not in states:
+            check(user, None)
+            if len(operations) >= USER_BATCH_SIZE:
+                await flush()
+
+    await flush()
+    report["duration_seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+class SubscriptionReconciler:
+    """Background job that periodically reconciles subscriptions with Stripe"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.SUBSCRIPTION_RECONCILE_INTERVAL_SECONDS)
+            try:
+                db = await get_database()
+                if db is not None:
+                    report = await reconcile_subscriptions(db)
+                    logger.info(
+                        "Subscription reconciliation: %d corrections, %d applied across %d users",
+                        report["corrections"], report["applied"], report["users_checked"],
+                    )
+            except Exception as e:
+                logger.error("Subscription reconciliation failed: %s", e)
+
+    def start(self):
+        """Start the background reconciliation task"""
+        if (
+            self._task is None
+            and settings.STRIPE_SECRET_KEY
+            and settings.SUBSCRIPTION_RECONCILE_INTERVAL_SECONDS > 0
+        ):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background reconciliation task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+subscription_reconciler = SubscriptionReconciler()
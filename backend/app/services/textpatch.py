@@ -0,0 +1,105 @@
+import re
+from typing import List
+
+from ..models.note import TextEdit
+
+
+class PatchError(ValueError):
+    """Raised when a patch cannot be applied to the base text"""
+
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def apply_edits(text: str, edits: List[TextEdit]) -> str:
+    """
+    Apply insert/delete/replace edits to text.
+    Offsets refer to the base text and edits must not overlap, so they are
+    applied from the end of the text backwards.
+    """
+    ordered = sorted(edits, key=lambda e: e.offset, reverse=True)
+    limit = len(text)
+
+    for edit in ordered:
+        length = 0 if edit.op == "insert" else edit.length
+        end = edit.offset + length
+        if end > limit:
+            raise PatchError(
+                f"Edit at offset {edit.offset} overlaps another edit or runs past the end of the text"
+            )
+        replacement = "" if edit.op == "delete" else edit.text
+        text = text[:edit.offset] + replacement + text[end:]
+        limit = edit.offset
+
+    return text
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """Apply a unified diff to text, verifying every context and removed line"""
+    source = text.splitlines(keepends=True)
+    result: List[str] = []
+    position = 0  # index into source
+    lines = diff.splitlines(keepends=True)
+    i = 0
+    applied = False
+
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith(("---", "+++")) and not applied:
+            i += 1
+            continue
+
+        match = _HUNK_HEADER.match(line)
+        if not match:
+            if line.strip():
+                raise PatchError(f"Unexpected line outside of a hunk: {line.rstrip()!r}")
+            i += 1
+            continue
+
+        start = int(match.group(1))
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        # Line numbers are 1-based; a zero-length hunk inserts after line `start`
+        hunk_start = start if old_count == 0 else start - 1
+        if hunk_start < position or hunk_start > len(source):
+            raise PatchError(f"Hunk at line {start} is out of order or out of range")
+
+        result.extend(source[position:hunk_start])
+        position = hunk_start
+        i += 1
+
+        while i < len(lines) and not lines[i].startswith("@@"):
+            body = lines[i]
+            marker, content = body[:1], body[1:]
+            if marker == "\\":
+                # "\ No newline at end of file" applies to the previous line
+                if result and result[-1].endswith("\n") and lines[i - 1].startswith(("+", " ")):
+                    result[-1] = result[-1][:-1]
+                i += 1
+                continue
+            if marker in (" ", "-"):
+                expected = source[position] if position < len(source) else None
+                if expected is None or expected.rstrip("\r\n") != content.rstrip("\r\n"):
+                    raise PatchError(f"Patch does not apply at line {position + 1}")
+                if marker == " ":
+                    result.append(expected)
+                position += 1
+            elif marker == "+":
+                result.append(content)
+            elif body.strip() == "":
+                # Some tools strip the leading space from empty context lines
+                expected = source[position] if position < len(source) else None
+                if expected is None or expected.strip("\r\n") != "":
+                    raise PatchError(f"Patch does not apply at line {position + 1}")
+                result.append(expected)
+                position += 1
+            else:
+                raise PatchError(f"Malformed hunk line: {body.rstrip()!r}")
+            i += 1
+
+        applied = True
+
+    if not applied:
+        raise PatchError("Diff contains no hunks")
+
+    result.extend(source[position:])
+    return "".join(result)
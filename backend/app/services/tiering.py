@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+
+from ..core.config import settings
+from ..database.connection import get_database
+from ..repositories.mongo import ARCHIVE_COLLECTION, tiering_stats
+from .jobs import JobDefinition, JobStep, enqueue_job, positive_int_param, register_job
+
+logger = logging.getLogger(__name__)
+
+# Concurrent guarded deletes per batch, so a tiering pass never holds most of the connection pool
+DELETE_CONCURRENCY = 50
+
+
+def _cold_notes(params: dict) -> dict:
+    cutoff = datetime.utcnow() - timedelta(days=params["older_than_days"])
+    # Notes promoted on access get a full period in the hot tier before they can be archived again
+    return {"updated_at": {"$lt": cutoff}, "promoted_at": {"$not": {"$gte": cutoff}}}
+
+
+async def _delete_unchanged(db, note: dict) -> bool:
+    deleted = await db.notes.find_one_and_delete(
+        {"_id": note["_id"], "updated_at": note["updated_at"], "version": note.get("version")},
+        projection={"_id": 1},
+    )
+    return deleted is not None
+
+
+async def _archive_notes(db, params: dict, notes: List[dict]):
+    """
+    Copy the batch into the archive, then remove from the hot collection
+    the notes nobody changed in the meantime. The archive copies of notes
+    that were written or deleted concurrently are dropped again, so each
+    note ends up in exactly one tier and a retried batch changes nothing.
+    """
+    archive = db[ARCHIVE_COLLECTION]
+    await archive.bulk_write([ReplaceOne({"_id": note["_id"]}, note, upsert=True) for note in notes], ordered=False)
+
+    moved = []
+    for start in range(0, len(notes), DELETE_CONCURRENCY):
+        chunk = notes[start:start + DELETE_CONCURRENCY]
+        moved += await asyncio.gather(*(_delete_unchanged(db, note) for note in chunk))
+
+    stale = [note["_id"] for note, was_moved in zip(notes, moved) if not was_moved]
+    if stale:
+        await archive.delete_many({"_id": {"$in": stale}})
+    tiering_stats["archived"] += len(notes) - len(stale)
+
+
+register_job(JobDefinition(
+    type="tier_notes",
+    description="Move notes not updated for params.older_than_days into the compressed archive collection",
+    params={"older_than_days": positive_int_param},
+    steps=[
+        # Walks the (updated_at, _id) index, so a pass only reads the cold range
+        JobStep("notes", "notes", _cold_notes, _archive_notes, sort="updated_at"),
+    ],
+))
+
+
+class TieringScheduler:
+    """
+    Background task that queues a tiering job every TIERING_INTERVAL_SECONDS.
+    The job itself runs on whichever instance's job runner claims it, and at
+    most one is active at a time.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            # Waits first, so restarts do not each start a pass over the whole collection
+            await asyncio.sleep(settings.TIERING_INTERVAL_SECONDS)
+            try:
+                db = await get_database()
+                if db is not None:
+                    await enqueue_job(
+                        db, "tier_notes", {"older_than_days": settings.TIERING_ARCHIVE_AFTER_DAYS},
+                        key="tier_notes", created_by="tiering",
+                    )
+            except PyMongoError as e:
+                logger.error("Failed to queue note tiering: %s", e)
+
+    def start(self):
+        """Start the background scheduling task"""
+        if (self._task is None and settings.STORAGE_BACKEND == "mongo"
+                and settings.TIERING_ARCHIVE_AFTER_DAYS > 0 and settings.TIERING_INTERVAL_SECONDS > 0):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background scheduling task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+tiering_scheduler = TieringScheduler()
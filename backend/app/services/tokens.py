@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from ..core.config import settings
+from ..database.connection import get_database
+
+logger = logging.getLogger(__name__)
+
+# Counters surfaced by the health check
+token_stats = {"refreshed": 0, "reuse_detected": 0, "revoked_sessions": 0, "revoked_users": 0, "sync_failures": 0}
+
+
+class RefreshedSession(NamedTuple):
+    user_id: ObjectId
+    email: str
+    session_id: str
+    refresh_token: str
+
+
+def new_session_id() -> str:
+    """Identifies one login; every access and refresh token issued for it carries the id"""
+    return secrets.token_urlsafe(16)
+
+
+def _hash(refresh_token: str) -> str:
+    # Refresh tokens are 256 random bits, so a fast hash is as safe to store as a slow one
+    return hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()
+
+
+async def ensure_token_indexes(db):
+    """Create the indexes used by refresh tokens and revocations"""
+    if db is None:
+        return
+    try:
+        await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+        await db.refresh_tokens.create_index("session_id")
+        await db.refresh_tokens.create_index("email")
+        await db.token_revocations.create_index("expires_at", expireAfterSeconds=0)
+        await db.token_revocations.create_index("revoked_at")
+    except PyMongoError as e:
+        logger.error("Failed to create token indexes: %s", e)
+
+
+async def issue_refresh_token(db, user_id: ObjectId, email: str, session_id: str) -> str:
+    """Store a new refresh token for the session; only its hash is kept"""
+    refresh_token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.refresh_tokens.insert_one({
+        "_id": _hash(refresh_token),
+        "user_id": user_id,
+        "email": email,
+        "session_id": session_id,
+        "used_at": None,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=settings.REFRESH_TOKEN_EXPIRES_IN),
+    })
+    return refresh_token
+
+
+async def rotate_refresh_token(db, refresh_token: str) -> Optional[RefreshedSession]:
+    """
+    Exchange a refresh token for a new one in the same session. Each token
+    works once: presenting a token that was already rotated means it leaked,
+    so the whole session is revoked. Returns None for any unusable token.
+    """
+    token_hash = _hash(refresh_token)
+    now = datetime.utcnow()
+    claimed = await db.refresh_tokens.find_one_and_update(
+        {"_id": token_hash, "used_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"used_at": now}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if claimed is None:
+        # Rotated tokens are kept until they expire so reuse can be detected
+        used = await db.refresh_tokens.find_one({"_id": token_hash, "used_at": {"$ne": None}})
+        if used is not None:
+            token_stats["reuse_detected"] += 1
+            logger.warning("Refresh token reused; revoking session of %s", used["email"])
+            await revoke_session(db, used["session_id"])
+        return None
+
+    token_stats["refreshed"] += 1
+    new_token = await issue_refresh_token(db, claimed["user_id"], claimed["email"], claimed["session_id"])
+    return RefreshedSession(claimed["user_id"], claimed["email"], claimed["session_id"], new_token)
+
+
+async def _record_revocation(db, kind: str, key: str, fields: dict):
+    now = datetime.utcnow()
+    revocation = {
+        "kind": kind,
+        "key": key,
+        "revoked_at": now,
+        # Only needs to outlive the access tokens it covers
+        "expires_at": now + timedelta(seconds=settings.JWT_EXPIRES_IN),
+        **fields,
+    }
+    revocations.add(revocation)
+    if db is not None:
+        await db.token_revocations.update_one({"_id": f"{kind}:{key}"}, {"$set": revocation}, upsert=True)
+
+
+async def revoke_session(db, session_id: str):
+    """End one login: its refresh tokens stop working and its access tokens are rejected"""
+    await _record_revocation(db, "session", session_id, {})
+    if db is not None:
+        await db.refresh_tokens.delete_many({"session_id": session_id})
+
+
+async def revoke_user(db, email: str):
+    """End every login of a user, including access tokens issued before this call"""
+    await _record_revocation(db, "user", email, {"not_before": time.time()})
+    if db is not None:
+        await db.refresh_tokens.delete_many({"email": email})
+
+
+class RevocationIndex:
+    """
+    Revoked sessions and users, mirrored from the token_revocations
+    collection so verifying an access token never queries MongoDB.
+    Revocations made here apply at once; those made by other instances
+    arrive with the next sync, every TOKEN_REVOCATION_SYNC_SECONDS.
+    Entries are dropped once the access tokens they cover have expired,
+    so the index stays small when access tokens are short-lived.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, datetime] = {}  # session id -> entry expiry
+        self._users: Dict[str, Tuple[float, datetime]] = {}  # email -> (revoked before, entry expiry)
+        self._synced_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, claims: dict) -> bool:
+        session_id = claims.get("sid")
+        if session_id is not None and session_id in self._sessions:
+            return True
+        user = self._users.get(claims.get("sub"))
+        # Tokens from before refresh tokens carry no iat and are covered by any user revocation
+        return user is not None and claims.get("iat", 0) < user[0]
+
+    def add(self, revocation: dict):
+        if revocation["kind"] == "session":
+            self._sessions[revocation["key"]] = revocation["expires_at"]
+        elif revocation["kind"] == "user":
+            previous = self._users.get(revocation["key"])
+            not_before = max(revocation["not_before"], previous[0] if previous else 0)
+            self._users[revocation["key"]] = (not_before, revocation["expires_at"])
+        self._count()
+
+    def _prune(self, now: datetime):
+        self._sessions = {key: expires for key, expires in self._sessions.items() if expires > now}
+        self._users = {key: entry for key, entry in self._users.items() if entry[1] > now}
+        self._count()
+
+    def _count(self):
+        token_stats["revoked_sessions"] = len(self._sessions)
+        token_stats["revoked_users"] = len(self._users)
+
+    async def load(self, db) -> bool:
+        """Merge revocations recorded since the last sync, or all unexpired ones on the first"""
+        if db is None:
+            return False
+        started = datetime.utcnow()
+        if self._synced_at is None:
+            query = {"expires_at": {"$gt": started}}
+        else:
+            # Overlap syncs so revocations written late by other instances are not missed
+            since = self._synced_at - timedelta(seconds=settings.TOKEN_REVOCATION_SYNC_SECONDS + 30)
+            query = {"revoked_at": {"$gte": since}}
+        try:
+            async for revocation in db.token_revocations.find(query, projection={"_id": 0}):
+                self.add(revocation)
+        except PyMongoError as e:
+            token_stats["sync_failures"] += 1
+            logger.error("Failed to sync token revocations: %s", e)
+            return False
+        self._synced_at = started
+        self._prune(started)
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
+            await self.load(await get_database())
+
+    def start(self):
+        """Start the periodic sync task"""
+        if self._task is None and settings.TOKEN_REVOCATION_SYNC_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic sync task"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+revocations = RevocationIndex()
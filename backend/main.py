@@ -1,21 +1,74 @@
+import asyncio
 import os
-import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.database.connection import connect_to_mongo, close_mongo_connection, ping_database
-from app.routers import auth, notes, billing
+from app.core.log import configure_logging, shutdown_logging, log_stats
+from app.database.connection import connect_to_mongo, close_mongo_connection, ping_database, on_connect, connection_status
+from app.routers import auth, notes, attachments, billing, admin
+from app.repositories.memory import memory_engine
+from app.repositories.mongo import ensure_repository_indexes, tiering_stats
+from app.services.autosave import autosave_buffer
+from app.services.revisions import ensure_revision_indexes
+from app.services.attachments import ensure_attachment_indexes
+from app.services.quotas import stats_reconciler
+from app.services.catalog import catalog
+from app.services.subscriptions import subscription_reconciler
+from app.services.tokens import ensure_token_indexes, revocations, token_stats
+from app.services.jobs import ensure_job_indexes, job_runner, job_stats
+from app.services.tiering import tiering_scheduler
+from app.middleware.rate_limit import RateLimitMiddleware, ensure_rate_limit_indexes
+from app.middleware.admission import AdmissionControlMiddleware, loop_lag_monitor
+from app.middleware.deadline import DeadlineMiddleware
+from app.middleware.request_id import RequestIdMiddleware
+from app.core.deadline import deadline_stats
+from app.database.routing import routing_stats
+
+# Before anything logs, so every record goes through the background writer
+configure_logging()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    configure_logging()
+    if settings.STORAGE_BACKEND == "memory":
+        await asyncio.to_thread(memory_engine.load)
+        memory_engine.start()
+    # MongoDB connects in the background; these run on every (re)connect
+    on_connect(ensure_repository_indexes)
+    on_connect(ensure_revision_indexes)
+    on_connect(ensure_attachment_indexes)
+    on_connect(catalog.load)
+    on_connect(ensure_rate_limit_indexes)
+    on_connect(ensure_token_indexes)
+    on_connect(revocations.load)
+    on_connect(ensure_job_indexes)
     await connect_to_mongo()
+    loop_lag_monitor.start()
+    autosave_buffer.start()
+    stats_reconciler.start()
+    catalog.start()
+    subscription_reconciler.start()
+    revocations.start()
+    job_runner.start()
+    tiering_scheduler.start()
     yield
     # Shutdown
+    await tiering_scheduler.stop()
+    await job_runner.stop()
+    await revocations.stop()
+    await subscription_reconciler.stop()
+    await loop_lag_monitor.stop()
+    await catalog.stop()
+    await stats_reconciler.stop()
+    await autosave_buffer.stop()
+    if settings.STORAGE_BACKEND == "memory":
+        await memory_engine.stop()
     await close_mongo_connection()
+    shutdown_logging()
 
 
 # Create FastAPI app with lifespan events
@@ -26,6 +79,13 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Rate limiting and load shedding run inside CORS so rejections still carry CORS headers
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+# Outside the limiters so rejected requests are logged with an id too
+app.add_middleware(RequestIdMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -38,7 +98,9 @@ app.add_middleware(
 # Include routers
 app.include_router(auth.router)
 app.include_router(notes.router)
+app.include_router(attachments.router)
 app.include_router(billing.router)
+app.include_router(admin.router)
 
 # Health check endpoint
 @app.get("/healthz")
@@ -49,10 +111,27 @@ async def health_check():
     return {
         "status": "healthy" if db_status else "unhealthy",
         "database": "connected" if db_status else "disconnected",
+        "connection": connection_status(),
+        "deadlines": deadline_stats,
+        "read_routing": routing_stats,
+        "tokens": token_stats,
+        "jobs": job_stats,
+        "tiering": tiering_stats,
+        "logging": log_stats,
         "service": "Galactic Archives API",
         "version": "1.0.0"
     }
 
+# Readiness endpoint for load balancers and orchestrators
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    """Ready once the background MongoDB connection is established, or at once with in-memory storage"""
+    connection = connection_status()
+    ready = settings.STORAGE_BACKEND == "memory" or connection["state"] == "connected"
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "not ready", "connection": connection}
+
 # API v1 router placeholder
 @app.get("/api/v1")
 async def api_info():
@@ -62,13 +141,17 @@ async def api_info():
         "version": "1.0.0",
         "endpoints": {
             "health": "/healthz",
+            "readiness": "/readyz",
             "auth": "/api/v1/auth/*",
             "notes": "/api/v1/notes/*",
-            "billing": "/api/v1/billing/*"
+            "billing": "/api/v1/billing/*",
+            "admin": "/api/v1/admin/*"
         }
     }
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
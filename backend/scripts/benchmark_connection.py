@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import bson
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+OP_REPLY = 1
+OP_QUERY = 2004
+OP_MSG = 2013
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StandInMongo:
+    """
+    Just enough of the MongoDB wire protocol (hello and ping over OP_QUERY
+    and OP_MSG) for the driver to see a writable standalone server
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self._server = None
+        self._writers = set()
+        self._loop = None
+
+    def hello(self) -> dict:
+        return {
+            "ismaster": True,
+            "isWritablePrimary": True,
+            "maxBsonObjectSize": 16 * 1024 * 1024,
+            "maxMessageSizeBytes": 48_000_000,
+            "maxWriteBatchSize": 100_000,
+            "localTime": datetime.utcnow(),
+            "logicalSessionTimeoutMinutes": 30,
+            "minWireVersion": 0,
+            "maxWireVersion": 21,
+            "readOnly": False,
+            "ok": 1.0,
+        }
+
+    def reply_to(self, command: dict) -> dict:
+        name = next(iter(command), "").lower()
+        if name in ("hello", "ismaster"):
+            return self.hello()
+        return {"ok": 1.0}
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(16)
+                length, request_id, _, op_code = struct.unpack("<iiii", header)
+                payload = await reader.readexactly(length - 16)
+
+                if op_code == OP_QUERY:
+                    # flags, collection cstring, skip, limit, query document
+                    offset = payload.index(b"\x00", 4) + 1 + 8
+                    command = bson.decode(payload[offset:offset + struct.unpack_from("<i", payload, offset)[0]])
+                    doc = bson.encode(self.reply_to(command))
+                    body = struct.pack("<iqii", 0, 0, 0, 1) + doc
+                    reply_op = OP_REPLY
+                elif op_code == OP_MSG:
+                    # flags, section kind 0, body document
+                    command = bson.decode(payload[5:5 + struct.unpack_from("<i", payload, 5)[0]])
+                    body = struct.pack("<i", 0) + b"\x00" + bson.encode(self.reply_to(command))
+                    reply_op = OP_MSG
+                else:
+                    break
+
+                writer.write(struct.pack("<iiii", 16 + len(body), 0, request_id, reply_op) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", self.port, reuse_address=True)
+
+    async def _stop(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _call(self, coro):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    async def start(self):
+        # Serve from a separate thread: the driver makes some blocking calls
+        # (e.g. endSessions on close) that would deadlock a same-loop server
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        await self._call(self._start())
+
+    async def stop(self):
+        if self._server is None:
+            return
+        await self._call(self._stop())
+
+
+class LocalMongod:
+    """A throwaway mongod process on a temporary data directory"""
+
+    def __init__(self, binary: str, port: int):
+        self.binary = binary
+        self.port = port
+        self.dbpath = tempfile.mkdtemp(prefix="benchmark-connection-")
+        self._process = None
+
+    async def start(self):
+        self._process = subprocess.Popen(
+            [self.binary, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    async def stop(self):
+        if self._process is None:
+            return
+        self._process.terminate()
+        await asyncio.to_thread(self._process.wait)
+
+    def cleanup(self):
+        shutil.rmtree(self.dbpath, ignore_errors=True)
+
+
+async def wait_for_state(db, wanted: str, timeout: float) -> float:
+    """Seconds until the connection manager reaches the wanted state"""
+    started = time.perf_counter()
+    while db.state != wanted:
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Connection state stayed {db.state!r}, expected {wanted!r}")
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - started
+
+
+async def run(server, outage: float, timeout: float) -> dict:
+    from app.database.connection import connect_to_mongo, close_mongo_connection, db
+
+    results = {}
+    try:
+        # Cold start with the database down: startup must not wait for it
+        started = time.perf_counter()
+        await connect_to_mongo()
+        results["startup_seconds"] = time.perf_counter() - started
+
+        await asyncio.sleep(outage)
+        await server.start()
+        results["cold_start_connect_seconds"] = await wait_for_state(db, "connected", timeout)
+
+        # Outage while serving: detect it, then recover once the server is back
+        await server.stop()
+        results["outage_detection_seconds"] = await wait_for_state(db, "reconnecting", timeout)
+        await asyncio.sleep(outage)
+        await server.start()
+        results["recovery_seconds"] = await wait_for_state(db, "connected", timeout)
+        results["reconnects"] = db.reconnects
+    finally:
+        await close_mongo_connection()
+        await server.stop()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start and outage recovery time of the MongoDB connection manager")
+    parser.add_argument("--mongod", help="path to a mongod binary; defaults to a wire-protocol stand-in")
+    parser.add_argument("--outage", type=float, default=2.0, help="seconds the database stays down")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["MONGODB_URI"] = f"mongodb://127.0.0.1:{port}/?directConnection=true"
+
+    from app.core.config import settings
+    settings.MONGODB_TLS = False
+
+    server = LocalMongod(args.mongod, port) if args.mongod else StandInMongo(port)
+    try:
+        results = asyncio.run(run(server, args.outage, args.timeout))
+    finally:
+        if isinstance(server, LocalMongod):
+            server.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Server: {'mongod' if args.mongod else 'stand-in'}, outage {args.outage:.1f}s")
+        print(f"Startup (connect_to_mongo):      {results['startup_seconds'] * 1000:8.1f} ms")
+        print(f"Connected after database start:  {results['cold_start_connect_seconds'] * 1000:8.1f} ms")
+        print(f"Outage detected after:           {results['outage_detection_seconds'] * 1000:8.1f} ms")
+        print(f"Recovered after database restart:{results['recovery_seconds'] * 1000:8.1f} ms")
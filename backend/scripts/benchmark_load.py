@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path to import app modules
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.core.auth import get_password_hash
+from benchmark_connection import LocalMongod, free_port
+
+USER_EMAIL = "bench-user-{}@loadtest.example.com"
+USER_PASSWORD = "benchmark-password"
+LOOKUP_KEY = "pro_monthly"
+WORDS = ["holocron", "jedi", "archive", "hyperspace", "kyber", "padawan", "senate", "droid"]
+
+# Relative weight of each operation in the mixed workload
+DEFAULT_MIX = "login=5,list=20,search=15,get=25,autosave=30,checkout=5"
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """Answers the handful of Stripe endpoints the API calls with canned objects"""
+
+    counts = defaultdict(int)
+
+    def _respond(self, body: dict, status: int = 200):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self, method: str):
+        path = urlparse(self.path).path
+        self.counts[f"{method} {path}"] += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        if path == "/v1/customers" and method == "GET":
+            return self._respond({"object": "list", "data": [], "has_more": False, "url": path})
+        if path == "/v1/customers":
+            return self._respond({"object": "customer", "id": f"cus_{uuid.uuid4().hex[:14]}"})
+        if path == "/v1/prices":
+            return self._respond({"object": "list", "data": [], "has_more": False, "url": path})
+        if path == "/v1/checkout/sessions":
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            return self._respond({"object": "checkout.session", "id": session_id, "url": f"https://checkout.example.com/{session_id}"})
+        if path == "/v1/billing_portal/sessions":
+            return self._respond({"object": "billing_portal.session", "id": f"bps_{uuid.uuid4().hex[:14]}", "url": "https://billing.example.com/session"})
+        self._respond({"error": {"type": "invalid_request_error", "message": f"Unknown path {path}"}}, 404)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_stripe(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeStripeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def note_body(size: int, rng: random.Random) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+async def seed(mongodb_uri: str, users: int, notes_per_user: int, note_size: int, rng: random.Random):
+    """Replace the benchmark users and their notes; other data is left alone"""
+    client = AsyncIOMotorClient(mongodb_uri)
+    db = client.galactic_archives
+    try:
+        emails = [USER_EMAIL.format(i) for i in range(users)]
+        existing = await db.users.find({"email": {"$regex": r"^bench-user-\d+@loadtest\.example\.com$"}}, {"_id": 1}).to_list(length=None)
+        existing_ids = [doc["_id"] for doc in existing]
+        await db.notes.delete_many({"user_id": {"$in": existing_ids}})
+        await db.users.delete_many({"_id": {"$in": existing_ids}})
+
+        # One hash for everyone; argon2 is deliberately slow
+        password_hash = get_password_hash(USER_PASSWORD)
+        now = datetime.utcnow()
+        user_docs = [
+            {
+                "email": email,
+                "password_hash": password_hash,
+                "stats": {"note_count": 0, "total_bytes": 0, "last_activity": None},
+                "created_at": now,
+                "updated_at": now,
+            }
+            for email in emails
+        ]
+        result = await db.users.insert_many(user_docs)
+
+        for user_id in result.inserted_ids:
+            notes = []
+            for n in range(notes_per_user):
+                content = note_body(note_size, rng)
+                notes.append({
+                    "title": f"Benchmark note {n} {rng.choice(WORDS)}",
+                    "content": content,
+                    "user_id": user_id,
+                    "version": 1,
+                    "created_at": now - timedelta(minutes=n),
+                    "updated_at": now - timedelta(minutes=n),
+                })
+            if notes:
+                await db.notes.insert_many(notes)
+            await db.users.update_one({"_id": user_id}, {"$set": {"stats": {
+                "note_count": len(notes),
+                "total_bytes": sum(len(note["title"].encode("utf-8")) + len(note["content"].encode("utf-8")) for note in notes),
+                "last_activity": now,
+            }}})
+
+        await db.products.update_one(
+            {"lookup_key": LOOKUP_KEY},
+            {"$set": {
+                "lookup_key": LOOKUP_KEY,
+                "price_id": "price_benchmark_pro_monthly",
+                "product_id": "prod_benchmark_pro",
+                "name": "Pro",
+                "amount": 500,
+                "currency": "usd",
+                "interval": "month",
+            }},
+            upsert=True,
+        )
+        await db.users.create_index("email", unique=True)
+        await db.notes.create_index([("user_id", 1), ("updated_at", -1)])
+    finally:
+        client.close()
+
+
+def start_api(port: int, mongodb_uri: str, stripe_port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        MONGODB_URI=mongodb_uri,
+        MONGODB_TLS="false",
+        STRIPE_SECRET_KEY="sk_test_benchmark",
+        STRIPE_API_BASE=f"http://127.0.0.1:{stripe_port}",
+        # Measure the service, not the limiters
+        RATE_LIMIT_ENABLED="false",
+        LOG_LEVEL="WARNING",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise TimeoutError("API did not become ready in time")
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Session:
+    """One benchmark user: credentials, token and the ids of their notes"""
+
+    def __init__(self, email: str):
+        self.email = email
+        self.token = None
+        self.note_ids = []
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def op_login(client, session, rng):
+    response = await client.post("/api/v1/auth/login", json={"email": session.email, "password": USER_PASSWORD})
+    if response.status_code == 200:
+        session.token = response.json()["access_token"]
+    return response
+
+
+async def op_list(client, session, rng):
+    return await client.get("/api/v1/notes/", headers=session.headers)
+
+
+async def op_search(client, session, rng):
+    return await client.get("/api/v1/notes/", params={"search": rng.choice(WORDS)}, headers=session.headers)
+
+
+async def op_get(client, session, rng):
+    return await client.get(f"/api/v1/notes/{rng.choice(session.note_ids)}", headers=session.headers)
+
+
+async def op_autosave(client, session, rng):
+    body = {"content": note_body(rng.randint(200, 2000), rng)}
+    return await client.put(f"/api/v1/notes/{rng.choice(session.note_ids)}/autosave", json=body, headers=session.headers)
+
+
+async def op_checkout(client, session, rng):
+    return await client.post("/api/v1/billing/create-checkout-session", json={"lookup_key": LOOKUP_KEY}, headers=session.headers)
+
+
+OPERATIONS = {
+    "login": op_login,
+    "list": op_list,
+    "search": op_search,
+    "get": op_get,
+    "autosave": op_autosave,
+    "checkout": op_checkout,
+}
+
+
+async def drive(client, sessions, mix, concurrency: int, duration: float, warmup: float, seed_value: int):
+    """Run the mixed workload at fixed concurrency; returns per-operation samples"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    measuring_from = time.perf_counter() + warmup
+    stop_at = measuring_from + duration
+
+    async def worker(index: int):
+        rng = random.Random(seed_value + index)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            session = rng.choice(sessions)
+            started = time.perf_counter()
+            try:
+                status_code = (await OPERATIONS[name](client, session, rng)).status_code
+            except httpx.HTTPError as e:
+                status_code = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if started >= measuring_from:
+                samples[name].append(elapsed)
+                statuses[name][str(status_code)] += 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples, statuses
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, statuses, duration: float) -> dict:
+    endpoints = {}
+    for name, values in sorted(samples.items()):
+        ordered = sorted(values)
+        errors = sum(count for code, count in statuses[name].items() if not code.startswith(("2", "3")))
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": len(values) / duration,
+            "mean_ms": statistics.fmean(values) * 1000,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+            "status_codes": dict(statuses[name]),
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "requests": total,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "throughput_rps": total / duration,
+        "endpoints": endpoints,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+
+    mongod = None
+    mongodb_uri = args.mongodb_uri
+    if args.mongod:
+        mongod = LocalMongod(args.mongod, free_port())
+        await mongod.start()
+        mongodb_uri = f"mongodb://127.0.0.1:{mongod.port}/?directConnection=true"
+
+    stripe_server = start_fake_stripe(free_port())
+    api = None
+    try:
+        await seed(mongodb_uri, args.users, args.notes_per_user, args.note_size, rng)
+
+        api_port = free_port()
+        api = start_api(api_port, mongodb_uri, stripe_server.server_address[1])
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", limits=limits, timeout=30) as client:
+            await wait_until_ready(client, args.ready_timeout)
+
+            sessions = [Session(USER_EMAIL.format(i)) for i in range(args.users)]
+            for session in sessions:
+                await op_login(client, session, rng)
+                notes = (await client.get("/api/v1/notes/", headers=session.headers)).json()
+                session.note_ids = [note.get("_id", note.get("id")) for note in notes]
+            sessions = [session for session in sessions if session.token and session.note_ids]
+            if not sessions:
+                raise RuntimeError("No benchmark user could log in and list notes")
+
+            samples, statuses = await drive(client, sessions, mix, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        stripe_server.shutdown()
+        if mongod is not None:
+            await mongod.stop()
+            mongod.cleanup()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": {
+            "users": args.users,
+            "notes_per_user": args.notes_per_user,
+            "note_size": args.note_size,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        **summarize(samples, statuses, args.duration),
+        "stripe_requests": dict(FakeStripeHandler.counts),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive a mixed workload against the API and report throughput and latency percentiles")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongodb-uri", help="a disposable MongoDB deployment to seed and run against")
+    target.add_argument("--mongod", help="path to a mongod binary to start on a temporary data directory")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes-per-user", type=int, default=50)
+    parser.add_argument("--note-size", type=int, default=2000, help="approximate note content size in bytes")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        endpoints = report["endpoints"]
+        print(f"{'operation':<10}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stats in endpoints.items():
+            print(f"{name:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>10.1f}"
+                  f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        print(f"{'total':<10}{report['requests']:>10}{report['errors']:>8}{report['throughput_rps']:>10.1f}")
+    else:
+        print(json.dumps(report, indent=2))
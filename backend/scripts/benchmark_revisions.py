@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.services.revisions import ensure_revision_indexes, list_revisions, materialize_revision, record_revision
+from benchmark_connection import LocalMongod, free_port
+
+
+def generate_note(lines: int, width: int) -> str:
+    """Generate a note with the given number of lines"""
+    words = ["holocron", "jedi", "archive", "hyperspace", "kyber", "padawan", "senate", "droid"]
+    return "".join(
+        " ".join(random.choice(words) for _ in range(width // 8)) + "\n"
+        for _ in range(lines)
+    )
+
+
+def edit_note(content: str) -> str:
+    """Simulate a small editor change: rewrite, insert or delete one line"""
+    lines = content.splitlines(keepends=True)
+    index = random.randrange(len(lines))
+    action = random.random()
+    if action < 0.6:
+        lines[index] = lines[index].rstrip("\n") + " edited\n"
+    elif action < 0.85:
+        lines.insert(index, "a freshly inserted line\n")
+    elif len(lines) > 1:
+        del lines[index]
+    return "".join(lines)
+
+
+async def run(args):
+    versions = [generate_note(args.lines, args.width)]
+    for _ in range(args.revisions):
+        versions.append(edit_note(versions[-1]))
+
+    settings.REVISIONS_SNAPSHOT_INTERVAL = args.snapshot_interval
+    # Keep every revision so each version can be reconstructed and checked
+    settings.REVISIONS_MAX_PER_NOTE = 0
+
+    mongod = None
+    mongodb_uri = args.mongodb_uri
+    if args.mongod:
+        mongod = LocalMongod(args.mongod, free_port())
+        await mongod.start()
+        mongodb_uri = f"mongodb://127.0.0.1:{mongod.port}/?directConnection=true"
+
+    client = AsyncIOMotorClient(mongodb_uri, serverSelectionTimeoutMS=30000)
+    try:
+        db = client[args.database]
+        await client.drop_database(args.database)
+        await ensure_revision_indexes(db)
+
+        note = {"_id": ObjectId(), "user_id": ObjectId(), "title": "benchmark", "version": 0}
+        start = time.perf_counter()
+        for version, (old, new) in enumerate(zip(versions, versions[1:])):
+            previous = {**note, "content": old, "version": version, "updated_at": datetime.utcnow()}
+            await record_revision(db, previous, new)
+        record_ms = (time.perf_counter() - start) * 1000 / args.revisions
+        note.update(content=versions[-1], version=args.revisions)
+
+        stored = await list_revisions(db, note["_id"])
+        if len(stored) != args.revisions:
+            raise AssertionError(f"Expected {args.revisions} stored revisions, found {len(stored)}")
+        full_bytes = sum(len(v) for v in versions[:-1])
+        stored_bytes = sum(revision["size"] for revision in stored)
+        snapshots = sum(1 for revision in stored if revision["kind"] == "snapshot")
+
+        latencies = []
+        for target in range(args.revisions):
+            start = time.perf_counter()
+            revision = await materialize_revision(db, note, target)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if revision is None or revision["content"] != versions[target]:
+                raise AssertionError(f"Reconstruction mismatch at version {target}")
+    finally:
+        client.close()
+        if mongod is not None:
+            await mongod.stop()
+            mongod.cleanup()
+
+    latencies.sort()
+    print(f"note size:            {len(versions[0]) / 1024:.1f} KiB ({args.lines} lines)")
+    print(f"revisions:            {args.revisions} ({snapshots} snapshots, interval {args.snapshot_interval})")
+    print(f"full copies:          {full_bytes / 1024:.1f} KiB")
+    print(f"stored:               {stored_bytes / 1024:.1f} KiB "
+          f"({100 * stored_bytes / full_bytes:.1f}% of full copies)")
+    print(f"record latency:       {record_ms:.2f} ms/revision")
+    print(f"reconstruct p50/max:  {latencies[len(latencies) // 2]:.2f} / {latencies[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark revision storage overhead and reconstruction latency")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongodb-uri", help="a disposable MongoDB deployment to run against")
+    target.add_argument("--mongod", help="path to a mongod binary to start on a temporary data directory")
+    parser.add_argument("--database", default="revisions_benchmark")
+    parser.add_argument("--revisions", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--snapshot-interval", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asyncio.run(run(args))
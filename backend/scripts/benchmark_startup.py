@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Run in a fresh interpreter each time so nothing is already imported or cached
+IMPORT_PROBE = """
+import time
+started = time.perf_counter()
+import main
+print(time.perf_counter() - started)
+"""
+
+LAZY_INIT_PROBE = """
+import json, time
+import main
+from app.core.auth import get_password_hash
+from app.core.stripe_client import get_stripe
+
+timings = {}
+started = time.perf_counter()
+main.app.openapi()
+timings["openapi_seconds"] = time.perf_counter() - started
+started = time.perf_counter()
+get_password_hash("benchmark-password")
+timings["first_password_hash_seconds"] = time.perf_counter() - started
+started = time.perf_counter()
+get_stripe()
+timings["stripe_init_seconds"] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def probe(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout.strip().splitlines()[-1]
+
+
+def time_to_first_response(timeout: float) -> float:
+    """Seconds from spawning uvicorn until /healthz answers"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1):
+                    return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise TimeoutError("Server did not answer /healthz in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(samples) -> dict:
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples)}
+
+
+def run(runs: int, timeout: float) -> dict:
+    return {
+        "runs": runs,
+        "import_seconds": summarize([float(probe(IMPORT_PROBE)) for _ in range(runs)]),
+        "first_response_seconds": summarize([time_to_first_response(timeout) for _ in range(runs)]),
+        # Costs moved off the startup path and onto the first call that needs them
+        "deferred": json.loads(probe(LAZY_INIT_PROBE)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-response of the API server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.timeout)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Runs: {results['runs']} (median, min-max)")
+        for label, key in (("Import main", "import_seconds"), ("Time to first response", "first_response_seconds")):
+            stats = results[key]
+            print(f"{label:<24}{stats['median'] * 1000:8.1f} ms  ({stats['min'] * 1000:.1f}-{stats['max'] * 1000:.1f})")
+        print("Deferred to first use:")
+        for key, seconds in results["deferred"].items():
+            print(f"  {key:<30}{seconds * 1000:8.1f} ms")
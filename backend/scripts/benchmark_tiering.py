@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.repositories.mongo import ARCHIVE_COLLECTION, MongoNotesRepository, tiering_stats
+from app.services.jobs import enqueue_job, ensure_job_indexes, job_runner
+from app.services.tiering import _cold_notes
+from benchmark_connection import LocalMongod, free_port
+from benchmark_load import WORDS, note_body, percentile
+
+
+async def seed(db, users: int, notes_per_user: int, note_size: int, cold_fraction: float,
+               archive_after_days: int, rng: random.Random):
+    """Users whose notes are mostly untouched for longer than the tiering threshold"""
+    now = datetime.utcnow()
+    user_ids = [ObjectId() for _ in range(users)]
+    for user_id in user_ids:
+        notes = []
+        for index in range(notes_per_user):
+            if rng.random() < cold_fraction:
+                updated_at = now - timedelta(days=archive_after_days + rng.uniform(1, 3 * 365))
+            else:
+                updated_at = now - timedelta(days=rng.uniform(0, archive_after_days - 1))
+            notes.append({
+                "user_id": user_id,
+                "title": f"{rng.choice(WORDS)} {index}",
+                "content": note_body(note_size, rng),
+                "tags": rng.sample(WORDS, 2),
+                "version": rng.randrange(5),
+                "created_at": updated_at - timedelta(days=rng.uniform(0, 30)),
+                "updated_at": updated_at,
+            })
+        await db.notes.insert_many(notes)
+    return user_ids
+
+
+async def collection_sizes(db) -> dict:
+    sizes = {}
+    for name in ("notes", ARCHIVE_COLLECTION):
+        stats = await db.command("collStats", name)
+        sizes[name] = {
+            "count": stats.get("count", 0),
+            "size_bytes": stats.get("size", 0),
+            "storage_bytes": stats.get("storageSize", 0),
+            "index_bytes": stats.get("totalIndexSize", 0),
+        }
+    return sizes
+
+
+async def list_latency(notes: MongoNotesRepository, user_ids, page_size: int, requests: int, rng: random.Random) -> dict:
+    latencies = []
+    for _ in range(requests):
+        user_id = rng.choice(user_ids)
+        started = time.perf_counter()
+        await notes.list_for_user(user_id, limit=page_size)
+        latencies.append(time.perf_counter() - started)
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+    }
+
+
+async def walk_pages(notes: MongoNotesRepository, user_id: ObjectId, page_size: int) -> list:
+    listed, before = [], None
+    while True:
+        page = await notes.list_for_user(user_id, limit=page_size, before=before)
+        listed += [note["_id"] for note in page]
+        if len(page) < page_size:
+            return listed
+        before = page[-1]["updated_at"]
+
+
+async def verify(db, notes: MongoNotesRepository, user_ids, expected: dict, page_size: int) -> dict:
+    """Both tiers must list exactly as the hot collection did, and lookups must promote"""
+    for user_id in user_ids:
+        listed = [note["_id"] for note in await notes.list_for_user(user_id)]
+        if listed != expected[user_id]:
+            raise AssertionError(f"Listing of user {user_id} changed after tiering")
+        if await walk_pages(notes, user_id, page_size) != expected[user_id]:
+            raise AssertionError(f"Paging over both tiers lost or repeated notes of user {user_id}")
+
+    archived = await db[ARCHIVE_COLLECTION].find_one({}, projection={"user_id": 1})
+    if archived is None:
+        return {"promoted": False}
+    note = await notes.get(archived["user_id"], archived["_id"])
+    in_hot = await db.notes.count_documents({"_id": archived["_id"]})
+    in_archive = await db[ARCHIVE_COLLECTION].count_documents({"_id": archived["_id"]})
+    if note is None or in_hot != 1 or in_archive != 0:
+        raise AssertionError("Reading an archived note must move it back to the hot collection")
+    return {"promoted": True}
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    mongod = None
+    mongodb_uri = args.mongodb_uri
+    if args.mongod:
+        mongod = LocalMongod(args.mongod, free_port())
+        await mongod.start()
+        mongodb_uri = f"mongodb://127.0.0.1:{mongod.port}/?directConnection=true"
+
+    client = AsyncIOMotorClient(mongodb_uri, serverSelectionTimeoutMS=30000)
+    try:
+        db = client[args.database]
+        await client.drop_database(args.database)
+        notes = MongoNotesRepository(db)
+        await notes.ensure_indexes()
+        await ensure_job_indexes(db)
+
+        user_ids = await seed(db, args.users, args.notes_per_user, args.note_size,
+                              args.cold_fraction, args.archive_after_days, rng)
+        expected = {user_id: [note["_id"] for note in await notes.list_for_user(user_id)] for user_id in user_ids}
+        cold = await db.notes.count_documents(_cold_notes({"older_than_days": args.archive_after_days}))
+
+        report = {"cold_notes": cold, "before": {}, "after": {}}
+        report["before"]["collections"] = await collection_sizes(db)
+        report["before"]["list"] = await list_latency(notes, user_ids, args.page_size, args.requests, rng)
+
+        started = time.perf_counter()
+        await enqueue_job(db, "tier_notes", {"older_than_days": args.archive_after_days},
+                          throttle={"docs_per_second": 0})
+        while await job_runner.run_once(db):
+            pass
+        report["tiering_seconds"] = time.perf_counter() - started
+        if args.compact:
+            # Deleted space is only returned to the OS by compact
+            await db.command("compact", "notes")
+
+        report["after"]["collections"] = await collection_sizes(db)
+        report["after"]["list"] = await list_latency(notes, user_ids, args.page_size, args.requests, rng)
+        report["verification"] = await verify(db, notes, user_ids, expected, args.page_size)
+        report["tiering"] = dict(tiering_stats)
+        return report
+    finally:
+        client.close()
+        if mongod is not None:
+            await mongod.stop()
+            mongod.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure hot collection size and list latency before and after tiering cold notes")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongodb-uri", help="a disposable MongoDB deployment to seed and run against")
+    target.add_argument("--mongod", help="path to a mongod binary to start on a temporary data directory")
+    parser.add_argument("--database", default="tiering_benchmark")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notes-per-user", type=int, default=400)
+    parser.add_argument("--note-size", type=int, default=2000, help="approximate note content size in bytes")
+    parser.add_argument("--cold-fraction", type=float, default=0.8, help="share of notes older than the threshold")
+    parser.add_argument("--archive-after-days", type=int, default=365)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="list requests measured before and after")
+    parser.add_argument("--compact", action="store_true", help="compact the hot collection after tiering")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import monitoring
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Routing is configured at import time; route every class this harness exercises
+os.environ.setdefault("MONGODB_READ_ROUTING", "list=secondaryPreferred,search=secondaryPreferred,stats=secondaryPreferred")
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.database.routing import read_router, routing_stats, user_last_write
+from app.repositories.conformance import ConformanceError, expect
+from app.repositories.mongo import MongoNotesRepository
+from benchmark_connection import free_port
+
+
+class ReadTracker(monitoring.CommandListener):
+    """Records which server answered each read of the scratch database"""
+
+    def __init__(self, database: str):
+        self.database = database
+        self.reads = []
+
+    def started(self, event):
+        if event.database_name == self.database and event.command_name in ("find", "aggregate"):
+            self.reads.append(event.connection_id)
+
+    def succeeded(self, event): pass
+    def failed(self, event): pass
+
+    def last(self):
+        return self.reads[-1] if self.reads else None
+
+
+class LocalReplicaSet:
+    """A throwaway three-member replica set of local mongod processes"""
+
+    def __init__(self, binary: str, name: str = "rs0"):
+        self.binary = binary
+        self.name = name
+        self.ports = [free_port() for _ in range(3)]
+        self.dbpaths = [tempfile.mkdtemp(prefix="check-read-routing-") for _ in self.ports]
+        self._processes = []
+
+    @property
+    def uri(self) -> str:
+        hosts = ",".join(f"127.0.0.1:{port}" for port in self.ports)
+        return f"mongodb://{hosts}/?replicaSet={self.name}"
+
+    async def start(self, timeout: float):
+        for port, dbpath in zip(self.ports, self.dbpaths):
+            self._processes.append(subprocess.Popen(
+                [self.binary, "--replSet", self.name, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            ))
+
+        seed = AsyncIOMotorClient(f"mongodb://127.0.0.1:{self.ports[0]}/?directConnection=true",
+                                  serverSelectionTimeoutMS=int(timeout * 1000))
+        await seed.admin.command("replSetInitiate", {
+            "_id": self.name,
+            "members": [
+                # Only the first member may become primary, so "primary" is stable for the run
+                {"_id": i, "host": f"127.0.0.1:{port}", "priority": 1 if i == 0 else 0}
+                for i, port in enumerate(self.ports)
+            ],
+        })
+        seed.close()
+
+        client = AsyncIOMotorClient(self.uri, serverSelectionTimeoutMS=int(timeout * 1000))
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = await client.admin.command("replSetGetStatus")
+            states = sorted(member["stateStr"] for member in status["members"])
+            if states == ["PRIMARY", "SECONDARY", "SECONDARY"]:
+                client.close()
+                return
+            await asyncio.sleep(0.5)
+        client.close()
+        raise RuntimeError("Replica set did not elect a primary with two secondaries in time")
+
+    async def stop(self):
+        for process in self._processes:
+            process.terminate()
+            process.wait()
+        for dbpath in self.dbpaths:
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+
+def _note(user_id: ObjectId, index: int) -> dict:
+    now = datetime.utcnow()
+    return {"user_id": user_id, "title": f"note {index}", "content": f"routing check {index}", "tags": [],
+            "version": 1, "created_at": now, "updated_at": now}
+
+
+async def check_routing(uri: str, database: str, iterations: int) -> int:
+    tracker = ReadTracker(database)
+    client = AsyncIOMotorClient(uri, event_listeners=[tracker], serverSelectionTimeoutMS=10000)
+    db = client[database]
+    notes = MongoNotesRepository(db)
+    primary = (await client.admin.command("hello"))["primary"]
+
+    def served_by_primary() -> bool:
+        host, port = tracker.last()
+        return f"{host}:{port}" == primary
+
+    checks = []
+
+    async def no_recent_write():
+        user_id = ObjectId()
+        await notes.list_for_user(user_id)
+        expect(not served_by_primary(), "a user without recent writes must be listed from a secondary")
+        await notes.list_for_user(user_id, "routing")
+        expect(not served_by_primary(), "searches must be routed to a secondary")
+    checks.append(("secondary routing", no_recent_write))
+
+    async def read_your_writes():
+        user_id = ObjectId()
+        on_secondary = 0
+        for index in range(iterations):
+            note = await notes.insert(_note(user_id, index))
+            listed = await notes.list_for_user(user_id)
+            expect(any(n["_id"] == note["_id"] for n in listed), f"write {index} was not visible to its own user")
+            on_secondary += not served_by_primary()
+        expect(on_secondary > 0, "causal reads never used a secondary")
+        print(f"      {on_secondary}/{iterations} read-your-writes listings served by a secondary")
+    checks.append(("read your writes", read_your_writes))
+
+    async def other_instance_write():
+        user_id = ObjectId()
+        await notes.insert(_note(user_id, 0))
+        # Another instance holds the causal marker; only the user document says they wrote
+        read_router._markers.pop(user_id, None)
+        token = user_last_write.set(datetime.utcnow())
+        try:
+            await notes.list_for_user(user_id)
+        finally:
+            user_last_write.reset(token)
+        expect(served_by_primary(), "a recent write made elsewhere must send the user's reads to the primary")
+    checks.append(("recent write fallback", other_instance_write))
+
+    async def stale_reads_without_session():
+        # Shows the harness can observe lag: plain secondary reads right after a write may miss it
+        user_id = ObjectId()
+        secondary_notes = db.notes.with_options(read_preference=read_router.read_preference("list"))
+        missed = 0
+        for index in range(iterations):
+            await db.notes.insert_one(_note(user_id, index))
+            found = await secondary_notes.count_documents({"user_id": user_id})
+            missed += found < index + 1
+        print(f"      {missed}/{iterations} unsessioned secondary reads missed the preceding write")
+    checks.append(("unsessioned baseline", stale_reads_without_session))
+
+    failures = 0
+    try:
+        for name, check in checks:
+            try:
+                await check()
+                print(f"ok    {name}")
+            except ConformanceError as e:
+                failures += 1
+                print(f"FAIL  {name}: {e}")
+        print(f"      routing decisions: {routing_stats}")
+    finally:
+        await client.drop_database(database)
+        client.close()
+    return failures
+
+
+async def run(args) -> int:
+    replica_set = None
+    uri = args.mongodb_uri
+    if args.mongod:
+        replica_set = LocalReplicaSet(args.mongod)
+        await replica_set.start(args.timeout)
+        uri = replica_set.uri
+    try:
+        return await check_routing(uri, args.database, args.iterations)
+    finally:
+        if replica_set is not None:
+            await replica_set.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify read routing to secondaries and read-your-writes on a replica set")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--mongod", help="path to a mongod binary; starts a local three-member replica set")
+    source.add_argument("--mongodb-uri", help="an existing replica set with at least one secondary")
+    parser.add_argument("--database", default=f"read_routing_check_{ObjectId()}", help="scratch database, dropped afterwards")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the replica set to form")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from bson import ObjectId
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.repositories.conformance import CHECKS, ConformanceError, expect
+from app.repositories.memory import MemoryEngine
+
+
+async def check_snapshot_round_trip():
+    """A snapshot written by one engine must restore the same data in another"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "storage.bson")
+        engine = MemoryEngine(path)
+        user_id = await engine.users_repository.create({"email": "snapshot@example.com", "hashed_password": "x"})
+        now = datetime.utcnow()
+        note = await engine.notes_repository.insert({
+            "user_id": user_id, "title": "Yavin", "content": "Rebel base",
+            "version": 1, "created_at": now, "updated_at": now,
+        })
+        expect(await engine.snapshot(), "a changed engine must write a snapshot")
+        expect(not await engine.snapshot(), "an unchanged engine must skip the snapshot")
+
+        restored = MemoryEngine(path)
+        restored.load()
+        loaded = await restored.notes_repository.get(user_id, note["_id"])
+        expect(loaded is not None and loaded["content"] == "Rebel base", "notes must survive a snapshot")
+        expect(await restored.users_repository.get_by_email("snapshot@example.com") is not None,
+               "users must survive a snapshot")
+        expect(len(await restored.notes_repository.list_for_user(user_id)) == 1, "the list index must be rebuilt")
+
+
+async def run(engine: str, mongodb_uri: str, database: str) -> int:
+    client = None
+    if engine == "memory":
+        memory = MemoryEngine()
+        notes, users = memory.notes_repository, memory.users_repository
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from app.repositories.mongo import MongoNotesRepository, MongoUsersRepository
+
+        client = AsyncIOMotorClient(mongodb_uri, serverSelectionTimeoutMS=5000)
+        db = client[database]
+        notes, users = MongoNotesRepository(db), MongoUsersRepository(db)
+
+    checks = list(CHECKS)
+    if engine == "memory":
+        checks.append(("snapshots", lambda notes, users: check_snapshot_round_trip()))
+
+    failures = 0
+    try:
+        for name, check in checks:
+            try:
+                await check(notes, users)
+                print(f"ok    {name}")
+            except ConformanceError as e:
+                failures += 1
+                print(f"FAIL  {name}: {e}")
+    finally:
+        if client is not None:
+            await client.drop_database(database)
+            client.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a storage engine against the repository contract")
+    parser.add_argument("--engine", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--mongodb-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default=f"repository_check_{ObjectId()}",
+                        help="scratch database, dropped afterwards")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args.engine, args.mongodb_uri, args.database))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
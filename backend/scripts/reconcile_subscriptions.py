@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import stripe
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.database.connection import client_options
+from app.services.subscriptions import reconcile_subscriptions
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+if settings.STRIPE_API_BASE:
+    stripe.api_base = settings.STRIPE_API_BASE
+
+
+async def main(dry_run: bool, as_json: bool):
+    """Reconcile user subscription fields with Stripe"""
+    client = AsyncIOMotorClient(settings.MONGODB_URI, **client_options())
+    db = client.galactic_archives
+
+    try:
+        report = await reconcile_subscriptions(db, dry_run=dry_run)
+    finally:
+        client.close()
+
+    if as_json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+
+    mode = "Dry run" if dry_run else "Reconciliation"
+    print(f"{mode} finished in {report['duration_seconds']}s")
+    print(f"  Subscriptions scanned: {report['subscriptions_scanned']}")
+    print(f"  Customers:             {report['customers']}")
+    print(f"  Users checked:         {report['users_checked']}")
+    print(f"  Corrections:           {report['corrections']}")
+    print(f"  Changed during scan:   {report['skipped_newer']}")
+    if not dry_run:
+        print(f"  Applied:               {report['applied']}")
+    for correction in report["sample"]:
+        print(f"\n  {correction['user_id']} ({correction['stripe_customer_id']})")
+        for field, value in correction["after"].items():
+            print(f"    {field}: {correction['before'][field]!r} -> {value!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile stripe_subscription_* fields with Stripe")
+    parser.add_argument("--dry-run", action="store_true", help="Report corrections without applying them")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not stripe.api_key:
+        print("❌ Error: STRIPE_SECRET_KEY not configured")
+        print("Please set STRIPE_SECRET_KEY in your .env file")
+        sys.exit(1)
+
+    if not settings.MONGODB_URI:
+        print("❌ Error: MONGODB_URI not configured")
+        print("Please set MONGODB_URI in your .env file")
+        sys.exit(1)
+
+    asyncio.run(main(args.dry_run, args.json))
@@ -1,8 +1,12 @@
 import stripe
 import os
 import sys
+import json
 import asyncio
+import argparse
+from typing import Dict, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateMany, UpdateOne
 import certifi
 
 # Add parent directory to path to import app modules
@@ -11,124 +15,282 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app.core.config import settings
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+if settings.STRIPE_API_BASE:
+    stripe.api_base = settings.STRIPE_API_BASE
 
+DEFAULT_CATALOG = os.path.join(os.path.dirname(__file__), "catalog.json")
 
-async def seed_products():
-    """Seed Stripe products and prices, and store them in MongoDB"""
-    
-    # Connect to MongoDB
-    client = AsyncIOMotorClient(settings.MONGODB_URI, tlsCAFile=certifi.where())
-    db = client.galactic_archives
+# Stripe accepts at most 10 lookup keys per Price.list call
+LOOKUP_KEY_CHUNK = 10
 
-    products = [
-        {
-            "name": "Pro",
-            "description": "Perfect for power users who need more",
-            "prices": [
-                {
-                    "unit_amount": 900,  # $9.00
-                    "currency": "usd",
-                    "interval": "month",
-                    "lookup_key": "pro_monthly",
-                }
-            ],
-        },
-        {
-            "name": "Pro+",
-            "description": "Ultimate productivity for teams",
-            "prices": [
-                {
-                    "unit_amount": 1900,  # $19.00
-                    "currency": "usd",
-                    "interval": "month",
-                    "lookup_key": "pro_plus_monthly",
-                }
-            ],
-        },
-    ]
-
-    print("Starting Stripe product seeding...")
-
-    for p_data in products:
-        product_name = p_data["name"]
-        print(f"\nProcessing product: {product_name}")
-
-        # Search for existing product in Stripe
-        existing_products = stripe.Product.search(
-            query=f"name:'{product_name}' AND active:'true'"
-        )
 
-        if existing_products.data:
-            product = existing_products.data[0]
-            print(f"  ✓ Found existing product: {product.id}")
-        else:
-            # Create new product
-            product = stripe.Product.create(
-                name=product_name,
-                description=p_data["description"],
-            )
-            print(f"  ✓ Created new product: {product.id}")
+def load_catalog(path: str) -> List[dict]:
+    """Load and validate the declarative catalog file"""
+    with open(path) as f:
+        products = json.load(f)["products"]
+
+    seen = set()
+    for product in products:
+        for field in ("name", "description", "prices"):
+            if field not in product:
+                raise ValueError(f"Product {product.get('name', '?')!r} is missing {field!r}")
+        for price in product["prices"]:
+            for field in ("lookup_key", "unit_amount", "currency", "interval"):
+                if field not in price:
+                    raise ValueError(f"Price in {product['name']!r} is missing {field!r}")
+            if price["lookup_key"] in seen:
+                raise ValueError(f"Duplicate lookup_key {price['lookup_key']!r}")
+            seen.add(price["lookup_key"])
+    return products
+
+
+async def call_stripe(semaphore: asyncio.Semaphore, fn, *args, **params):
+    """Run a blocking Stripe call in a worker thread, bounded by the semaphore"""
+    async with semaphore:
+        return await asyncio.to_thread(fn, *args, **params)
+
+
+async def fetch_products(semaphore: asyncio.Semaphore) -> Dict[str, object]:
+    """All active Stripe products, keyed by name"""
+    products = {}
+    starting_after = None
+    while True:
+        params = {"active": True, "limit": 100}
+        if starting_after:
+            params["starting_after"] = starting_after
+        page = await call_stripe(semaphore, stripe.Product.list, **params)
+        for product in page.data:
+            products.setdefault(product.name, product)
+        if not page.has_more or not page.data:
+            return products
+        starting_after = page.data[-1].id
+
+
+async def fetch_prices(semaphore: asyncio.Semaphore, lookup_keys: List[str]) -> Dict[str, object]:
+    """Active Stripe prices for the given lookup keys, fetched concurrently"""
+    chunks = [lookup_keys[i:i + LOOKUP_KEY_CHUNK] for i in range(0, len(lookup_keys), LOOKUP_KEY_CHUNK)]
+    pages = await asyncio.gather(*[
+        call_stripe(semaphore, stripe.Price.list, lookup_keys=chunk, active=True, limit=LOOKUP_KEY_CHUNK)
+        for chunk in chunks
+    ])
+    return {price.lookup_key: price for page in pages for price in page.data}
+
+
+def price_matches(price, wanted: dict) -> bool:
+    recurring = price.recurring or {}
+    return (
+        price.unit_amount == wanted["unit_amount"]
+        and price.currency == wanted["currency"]
+        and recurring.get("interval") == wanted["interval"]
+    )
+
+
+def compute_plan(catalog: List[dict], stripe_products: dict, stripe_prices: dict, mongo_docs: dict) -> List[dict]:
+    """Diff the catalog file against Stripe and MongoDB into a list of changes"""
+    changes = []
+    wanted_keys = set()
+    wanted_names = set()
+
+    for p_data in catalog:
+        name = p_data["name"]
+        wanted_names.add(name)
+        product = stripe_products.get(name)
+        if product is None:
+            changes.append({"action": "create_product", "target": name, "product": p_data})
+        elif (product.description or "") != p_data["description"]:
+            changes.append({"action": "update_product", "target": name, "product": p_data, "id": product.id})
 
-        # Process prices
         for price_data in p_data["prices"]:
             lookup_key = price_data["lookup_key"]
-            print(f"  Processing price with lookup_key: {lookup_key}")
+            wanted_keys.add(lookup_key)
+            price = stripe_prices.get(lookup_key)
+            if price is None:
+                changes.append({"action": "create_price", "target": lookup_key,
+                                "product_name": name, "price": price_data})
+            elif not price_matches(price, price_data):
+                # Prices are immutable in Stripe: create a new one and move the lookup key
+                changes.append({"action": "replace_price", "target": lookup_key,
+                                "product_name": name, "price": price_data, "id": price.id})
+
+    # Only entries this tool manages (present in MongoDB) are ever archived
+    for lookup_key, doc in mongo_docs.items():
+        if lookup_key not in wanted_keys:
+            changes.append({"action": "archive_price", "target": lookup_key, "id": doc.get("price_id")})
+    stale_products = {
+        doc["name"]: doc.get("product_id")
+        for doc in mongo_docs.values()
+        if doc.get("name") and doc["name"] not in wanted_names
+    }
+    for name, product_id in stale_products.items():
+        product = stripe_products.get(name)
+        changes.append({"action": "archive_product", "target": name,
+                        "id": product.id if product else product_id})
+
+    return changes
 
-            # Search for existing price with this lookup_key
-            existing_prices = stripe.Price.list(
-                lookup_keys=[lookup_key],
-                limit=1,
-            )
 
-            if existing_prices.data:
-                price = existing_prices.data[0]
-                print(f"    ✓ Found existing price: {price.id}")
-            else:
-                # Create new price
-                price = stripe.Price.create(
-                    product=product.id,
-                    unit_amount=price_data["unit_amount"],
-                    currency=price_data["currency"],
-                    recurring={"interval": price_data["interval"]},
-                    lookup_key=lookup_key,
-                )
-                print(f"    ✓ Created new price: {price.id}")
-
-            # Upsert into MongoDB products collection
+def describe(change: dict) -> str:
+    action = change["action"]
+    if action == "create_product":
+        return f"+ create product {change['target']!r}"
+    if action == "update_product":
+        return f"~ update product {change['target']!r} description"
+    if action in ("create_price", "replace_price"):
+        price = change["price"]
+        verb = "+ create" if action == "create_price" else "~ replace"
+        return (f"{verb} price {change['target']!r} "
+                f"({price['unit_amount']} {price['currency']}/{price['interval']}) on {change['product_name']!r}")
+    return f"- archive {action.split('_')[1]} {change['target']!r}"
+
+
+def mongo_operations(catalog: List[dict], product_ids: Dict[str, str], price_ids: Dict[str, str],
+                     mongo_docs: dict) -> list:
+    """Upserts for changed catalog entries; replaced and stale ones are marked inactive"""
+    operations = []
+    wanted_keys = set()
+    for p_data in catalog:
+        for price_data in p_data["prices"]:
+            lookup_key = price_data["lookup_key"]
+            wanted_keys.add(lookup_key)
             product_doc = {
-                "name": product_name,
+                "name": p_data["name"],
                 "description": p_data["description"],
-                "price_id": price.id,
+                "product_id": product_ids.get(p_data["name"]),
+                "price_id": price_ids.get(lookup_key),
                 "lookup_key": lookup_key,
                 "amount": price_data["unit_amount"],
                 "currency": price_data["currency"],
                 "interval": price_data["interval"],
             }
+            existing = mongo_docs.get(lookup_key, {})
+            if existing.get("price_id") and existing["price_id"] != product_doc["price_id"]:
+                # Subscribers on the replaced price keep their plan through the inactive row
+                operations.append(UpdateOne({"price_id": existing["price_id"]}, {"$set": {"active": False}}))
+            if any(existing.get(field) != value for field, value in product_doc.items()):
+                operations.append(UpdateOne(
+                    {"price_id": product_doc["price_id"]}, {"$set": {**product_doc, "active": True}}, upsert=True
+                ))
+
+    for lookup_key in mongo_docs:
+        if lookup_key not in wanted_keys:
+            operations.append(UpdateMany({"lookup_key": lookup_key}, {"$set": {"active": False}}))
+    return operations
+
+
+async def apply_plan(semaphore: asyncio.Semaphore, changes: List[dict], stripe_products: dict,
+                     stripe_prices: dict) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Apply Stripe changes, returning the resulting product and price ids"""
+    product_ids = {name: product.id for name, product in stripe_products.items()}
+    price_ids = {key: price.id for key, price in stripe_prices.items()}
+
+    async def apply_product(change):
+        p_data = change["product"]
+        if change["action"] == "create_product":
+            product = await call_stripe(semaphore, stripe.Product.create,
+                                        name=p_data["name"], description=p_data["description"])
+        else:
+            product = await call_stripe(semaphore, stripe.Product.modify, change["id"],
+                                        description=p_data["description"])
+        product_ids[p_data["name"]] = product.id
+        print(f"  ✓ {describe(change)[2:]}: {product.id}")
+
+    async def apply_price(change):
+        price_data = change["price"]
+        price = await call_stripe(
+            semaphore, stripe.Price.create,
+            product=product_ids[change["product_name"]],
+            unit_amount=price_data["unit_amount"],
+            currency=price_data["currency"],
+            recurring={"interval": price_data["interval"]},
+            lookup_key=change["target"],
+            transfer_lookup_key=True,
+        )
+        if change["action"] == "replace_price":
+            await call_stripe(semaphore, stripe.Price.modify, change["id"], active=False)
+        price_ids[change["target"]] = price.id
+        print(f"  ✓ {describe(change)[2:]}: {price.id}")
+
+    async def apply_archive(change):
+        if change["id"]:
+            resource = stripe.Price if change["action"] == "archive_price" else stripe.Product
+            await call_stripe(semaphore, resource.modify, change["id"], active=False)
+        print(f"  ✓ {describe(change)[2:]}")
+
+    by_action = lambda *actions: [c for c in changes if c["action"] in actions]
+    # Products must exist before their prices can be created
+    await asyncio.gather(*[apply_product(c) for c in by_action("create_product", "update_product")])
+    await asyncio.gather(*[apply_price(c) for c in by_action("create_price", "replace_price")])
+    await asyncio.gather(*[apply_archive(c) for c in by_action("archive_price")])
+    await asyncio.gather(*[apply_archive(c) for c in by_action("archive_product")])
+    return product_ids, price_ids
+
+
+async def sync_catalog(catalog_path: str, plan_only: bool, concurrency: int):
+    """Sync Stripe products and prices with the catalog file, and mirror them in MongoDB"""
+    catalog = load_catalog(catalog_path)
+    semaphore = asyncio.Semaphore(concurrency)
 
-            result = await db.products.update_one(
-                {"lookup_key": lookup_key},
-                {"$set": product_doc},
-                upsert=True,
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(settings.MONGODB_URI, tlsCAFile=certifi.where())
+    db = client.galactic_archives
+
+    try:
+        print("Reading current catalog from Stripe and MongoDB...")
+        lookup_keys = [price["lookup_key"] for product in catalog for price in product["prices"]]
+        stripe_products, stripe_prices, mongo_list = await asyncio.gather(
+            fetch_products(semaphore),
+            fetch_prices(semaphore, lookup_keys),
+            db.products.find({"active": {"$ne": False}}, projection={"_id": 0}).to_list(length=None),
+        )
+        mongo_docs = {doc["lookup_key"]: doc for doc in mongo_list if doc.get("lookup_key")}
+
+        changes = compute_plan(catalog, stripe_products, stripe_prices, mongo_docs)
+
+        if plan_only:
+            print(f"\nPlan: {len(changes)} Stripe change(s)")
+            for change in changes:
+                print(f"  {describe(change)}")
+            # Ids of entries still to be created are unknown until applied
+            operations = mongo_operations(
+                catalog,
+                {name: product.id for name, product in stripe_products.items()},
+                {key: price.id for key, price in stripe_prices.items()},
+                mongo_docs,
             )
+            print(f"  MongoDB: {len(operations)} write(s)")
+            return
+
+        print(f"\nApplying {len(changes)} Stripe change(s)...")
+        product_ids, price_ids = await apply_plan(semaphore, changes, stripe_products, stripe_prices)
 
-            if result.upserted_id:
-                print(f"    ✓ Inserted into MongoDB: {result.upserted_id}")
-            else:
-                print(f"    ✓ Updated in MongoDB")
+        operations = mongo_operations(catalog, product_ids, price_ids, mongo_docs)
+        if operations:
+            result = await db.products.bulk_write(operations, ordered=False)
+            print(f"  ✓ MongoDB: {result.upserted_count} inserted, "
+                  f"{result.modified_count} updated or archived")
+        else:
+            print("  ✓ MongoDB already up to date")
 
-    print("\n✅ Stripe product seeding completed successfully!")
-    client.close()
+        print("\n✅ Stripe catalog sync completed successfully!")
+    finally:
+        client.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync Stripe products and prices with a declarative catalog")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="Path to the catalog JSON file")
+    parser.add_argument("--plan", action="store_true", help="Show the changes without applying them")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent Stripe requests")
+    args = parser.parse_args()
+
     if not stripe.api_key:
         print("❌ Error: STRIPE_SECRET_KEY not configured")
         print("Please set STRIPE_SECRET_KEY in your .env file")
         sys.exit(1)
-    
+
     if not settings.MONGODB_URI:
         print("❌ Error: MONGODB_URI not configured")
         print("Please set MONGODB_URI in your .env file")
         sys.exit(1)
 
-    asyncio.run(seed_products())
\ No newline at end of file
+    asyncio.run(sync_catalog(args.catalog, args.plan, max(args.concurrency, 1)))
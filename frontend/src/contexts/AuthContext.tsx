@@ -11,6 +11,7 @@ import {
   getAuthToken,
   setAuthToken,
   removeAuthToken,
+  logoutUser,
 } from "@/utils/api";
 
 interface AuthContextType {
@@ -71,7 +72,7 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
   };
 
   const logout = () => {
-    removeAuthToken();
+    void logoutUser();
     setUser(null);
   };
 
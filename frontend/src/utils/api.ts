@@ -11,6 +11,8 @@ export interface User {
 export interface AuthResponse {
   access_token: string;
   token_type: string;
+  expires_in: number;
+  refresh_token: string | null;
 }
 
 export interface ApiNote {
@@ -47,12 +49,53 @@ export const setAuthToken = (token: string): void => {
 
 export const removeAuthToken = (): void => {
   localStorage.removeItem("auth_token");
+  localStorage.removeItem("refresh_token");
+};
+
+const setRefreshToken = (token: string | null): void => {
+  if (token) {
+    localStorage.setItem("refresh_token", token);
+  } else {
+    localStorage.removeItem("refresh_token");
+  }
+};
+
+// Shared by concurrent requests: a refresh token can only be used once
+let refreshing: Promise<boolean> | null = null;
+
+const refreshAuthToken = (): Promise<boolean> => {
+  if (!refreshing) {
+    refreshing = (async () => {
+      const refreshToken = localStorage.getItem("refresh_token");
+      if (!refreshToken) {
+        return false;
+      }
+      const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      });
+      if (!response.ok) {
+        return false;
+      }
+      const data: AuthResponse = await response.json();
+      setAuthToken(data.access_token);
+      setRefreshToken(data.refresh_token);
+      return true;
+    })()
+      .catch(() => false)
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
 };
 
 // API request helper with auth
 const apiRequest = async (
   endpoint: string,
-  options: RequestInit = {}
+  options: RequestInit = {},
+  retry = true
 ): Promise<Response> => {
   const token = getAuthToken();
   const headers: Record<string, string> = {
@@ -70,7 +113,10 @@ const apiRequest = async (
   });
 
   if (response.status === 401) {
-    // Token expired or invalid, remove it
+    // Access tokens are short-lived; renew once before giving up
+    if (token && retry && (await refreshAuthToken())) {
+      return apiRequest(endpoint, options, false);
+    }
     removeAuthToken();
     throw new Error("Authentication required");
   }
@@ -106,7 +152,25 @@ export const loginUser = async (data: LoginRequest): Promise<AuthResponse> => {
     throw new Error(error.error || "Login failed");
   }
 
-  return response.json();
+  const data: AuthResponse = await response.json();
+  setRefreshToken(data.refresh_token);
+  return data;
+};
+
+export const logoutUser = async (): Promise<void> => {
+  const token = getAuthToken();
+  removeAuthToken();
+  if (!token) {
+    return;
+  }
+  try {
+    await fetch(`${API_BASE_URL}/auth/logout`, {
+      method: "POST",
+      headers: { Authorization: `Bearer ${token}` },
+    });
+  } catch (error) {
+    // The access token expires shortly anyway
+  }
 };
 
 export const getCurrentUser = async (): Promise<User> => {